@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+__doc__="""Benchmarks of the vtimshow compute paths.
+
+The suite follows the conventions of asv_.  Run it from the top of the
+repository with::
+
+    $ asv run
+
+The HDF5 files used by the benchmarks are generated on the fly by
+:mod:`benchmarks.fixtures`.  The sizes are controlled through the
+``VTIMSHOW_BENCH_SCALE`` environment variable which multiplies the
+number of frames in every fixture.
+
+.. _asv: https://asv.readthedocs.io
+
+"""
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+__doc__="""Throughput and peak memory of the compute paths."""
+
+import numpy
+
+from vtimshow.chunks import chunk_reader
+from vtimshow.core import FrameSource, read_frame, resolve_axes
+from vtimshow.filters import load_filters
+from vtimshow.filters.scaledhumaneye import apply_spectrum
+from vtimshow.lazy import LazyCube
+from vtimshow.preferences import Preferences
+from vtimshow.temporal import SlidingWindow
+from vtimshow.utils import divide
+
+from .fixtures import Fixture, scaled
+
+_SHAPES = {
+    "2D": (1024, 1024),
+    "3D": (64, 512, 512),
+    "4D": (16, 256, 256, 3),
+}
+
+class Divide:
+    """:func:`utils.divide` on a pair of frames."""
+    params = (["uint16", "float32", "float64"], ["native", "float64"])
+    param_names = ["dtype", "precision"]
+
+    def setup(self, dtype, precision):
+        rng = numpy.random.RandomState(0)
+        self.A = (rng.random_sample((2048, 2048)) *1000).astype(dtype)
+        self.B = (rng.random_sample((2048, 2048)) *1000).astype(dtype)
+        self.B[::7, ::7] = 0
+
+    def time_divide(self, dtype, precision):
+        divide(self.A, self.B, precision=precision)
+
+    def peakmem_divide(self, dtype, precision):
+        divide(self.A, self.B, precision=precision)
+
+class ApplySpectrum:
+    """:func:`filters.scaledhumaneye.apply_spectrum` on a cube."""
+    params = (["uint16", "float32"],)
+    param_names = ["dtype"]
+
+    def setup(self, dtype):
+        rng = numpy.random.RandomState(0)
+        shape = scaled((64, 512, 512))
+        self.array = (rng.random_sample(shape) *1000).astype(dtype)
+
+    def time_apply_spectrum(self, dtype):
+        apply_spectrum(self.array, "red")
+
+    def peakmem_apply_spectrum(self, dtype):
+        apply_spectrum(self.array, "red")
+
+class GetFrame:
+    """The reads behind :meth:`ColorRow.get_frame`."""
+    params = (
+        ["2D", "3D", "4D"],
+        ["contiguous", "chunked", "zlib", "blosc"],
+    )
+    param_names = ["dims", "storage"]
+    timeout = 240
+
+    def setup(self, dims, storage):
+        kwargs = {"layout": "chunked"}
+        if storage == "contiguous":
+            kwargs["layout"] = "contiguous"
+        elif storage != "chunked":
+            kwargs["complib"] = storage
+
+        self.fixture = Fixture(_SHAPES[dims], **kwargs)
+        self.order = Preferences()
+
+    def teardown(self, dims, storage):
+        self.fixture.close()
+
+    def time_read_node(self, dims, storage):
+        node = self.fixture.node
+        node.read().transpose(resolve_axes(node.shape, self.order)[0])
+
+    def peakmem_read_node(self, dims, storage):
+        node = self.fixture.node
+        node.read().transpose(resolve_axes(node.shape, self.order)[0])
+
+    def time_read_frame(self, dims, storage):
+        node = self.fixture.node
+        if node.ndim == 2:
+            raise NotImplementedError("2D nodes have a single frame")
+
+        read_frame(node, node.shape[0] //2, self.order[dims])
+
+    def time_lazy_cube(self, dims, storage):
+        node = self.fixture.node
+        axes, _ = resolve_axes(node.shape, self.order)
+        cube = LazyCube(node).transpose(axes)
+        cube[len(cube) //2, ::2, ::2].read()
+
+    def time_chunk_reader(self, dims, storage):
+        node = self.fixture.node
+        reader = chunk_reader(node)
+        if reader is node:
+            raise NotImplementedError("Chunks are decoded by PyTables")
+
+        axes, _ = resolve_axes(node.shape, self.order)
+        LazyCube(reader).transpose(axes)[:node.shape[0] //2].read()
+
+    def time_frame_source(self, dims, storage):
+        source = FrameSource(self.fixture.node, self.order)
+        source.get_frame(source.frame_count() //2 if dims != "2D" else 0)
+        source.close()
+
+class Transpose:
+    """The :class:`Preferences` driven transposes of :class:`ImageWindow`.
+
+    ``pyqtgraph`` makes the transposed view contiguous when it renders,
+    so the copy is included.
+
+    """
+    params = (["2D", "3D", "4D"], [False, True])
+    param_names = ["dims", "swapped"]
+
+    def setup(self, dims, swapped):
+        rng = numpy.random.RandomState(0)
+        self.order = Preferences()
+        if swapped:
+            # Store the data width first to force a real reordering.
+            for section in ("2D", "3D", "4D"):
+                height = self.order[section]["Height"]
+                self.order[section]["Height"] = \
+                    self.order[section]["Width"]
+                self.order[section]["Width"] = height
+
+        shape = scaled(_SHAPES[dims])
+        self.array = rng.randint(0, 4096, shape).astype("uint16")
+
+    def time_transpose(self, dims, swapped):
+        axes, _ = resolve_axes(self.array.shape, self.order)
+        numpy.ascontiguousarray(self.array.transpose(axes))
+
+class MovingWindow:
+    """:class:`temporal.SlidingWindow` stepping through a cube."""
+    params = (["Mean", "Median", "Max"], [3, 15])
+    param_names = ["statistic", "size"]
+
+    def setup(self, statistic, size):
+        rng = numpy.random.RandomState(0)
+        shape = scaled((64, 512, 512))
+        self.array = rng.randint(0, 4096, shape).astype("uint16")
+
+    def time_sequential(self, statistic, size):
+        window = SlidingWindow(
+            lambda start, stop: self.array[start:stop], len(self.array),
+            statistic, size
+        )
+        for idx in range(len(window)):
+            window[idx]
+
+    def time_read(self, statistic, size):
+        SlidingWindow(
+            lambda start, stop: self.array[start:stop], len(self.array),
+            statistic, size
+        ).read()
+
+class FindFilters:
+    """Discovery of the ``vtimshow.filters`` entry points."""
+
+    def time_load_filters(self):
+        load_filters()
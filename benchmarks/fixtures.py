@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+__doc__="""Generate synthetic HDF5 files for the benchmarks.
+
+Each file holds a single node ``/data`` filled with smooth noise so the
+compressors have realistic work to do.  The node may be contiguous,
+chunked by frame, or chunked and compressed with any library supported
+by PyTables.  The module may also be run as a script to write a file
+for manual profiling::
+
+    $ python -m benchmarks.fixtures cube.h5 --shape 200 512 512 \\
+        --complib blosc
+
+"""
+import argparse
+import os
+import tempfile
+
+import numpy
+import tables
+
+SCALE = float(os.environ.get("VTIMSHOW_BENCH_SCALE", "1"))
+"""The multiplier applied to the number of frames of every fixture."""
+
+def scaled(shape):
+    """Scale the leading (depth) dimension of a 3D or 4D shape."""
+    if len(shape) < 3:
+        return tuple(shape)
+
+    return (max(int(shape[0] *SCALE), 1),) +tuple(shape[1:])
+
+def make_file(path, shape, dtype="uint16", layout="chunked",
+              complib=None, complevel=4, seed=0):
+    """Write a synthetic dataset to ``path``.
+
+    Parameters
+    ----------
+
+    path : string
+        The file to create.  It is overwritten if it exists.
+    shape : tuple
+        The shape of ``/data``.
+    dtype : string, optional
+        The dtype of ``/data``.
+    layout : string, optional
+        Either 'contiguous' or 'chunked'.  Chunked nodes hold one
+        frame per chunk.
+    complib : string, optional
+        The compression library of a chunked node.  ``None`` disables
+        compression.
+    complevel : int, optional
+        The compression level.
+    seed : int, optional
+        The seed of the random generator.
+
+    Returns
+    -------
+
+    path : string
+        The path of the file.
+
+    """
+    rng = numpy.random.RandomState(seed)
+    dtype = numpy.dtype(dtype)
+    frame_shape = tuple(shape[1:]) if len(shape) > 2 else tuple(shape)
+    count = shape[0] if len(shape) > 2 else 1
+    with tables.open_file(path, "w") as h5:
+        atom = tables.Atom.from_dtype(dtype)
+        if layout == "contiguous":
+            node = h5.create_array("/", "data", atom=atom, shape=shape)
+        elif layout == "chunked":
+            filters = None
+            if complib is not None:
+                filters = tables.Filters(
+                    complevel=complevel, complib=complib, shuffle=True
+                )
+
+            chunkshape = (1,) +frame_shape if len(shape) > 2 else shape
+            node = h5.create_carray(
+                "/", "data", atom=atom, shape=shape,
+                chunkshape=chunkshape, filters=filters
+            )
+        else:
+            raise ValueError("Unknown layout {0!s}".format(layout))
+
+        # A smooth background plus noise compresses like real data.
+        yy, xx = numpy.mgrid[0:frame_shape[0], 0:frame_shape[1]]
+        base = numpy.sin(xx /17.0) +numpy.cos(yy /23.0)
+        if len(frame_shape) > 2:
+            base = base[..., None]
+
+        limit = numpy.iinfo(dtype).max /4 if dtype.kind in "iu" else 1.0
+        for idx in range(count):
+            frame = (base +2 +0.1 *rng.standard_normal(frame_shape)) \
+                *limit /4
+            if len(shape) > 2:
+                node[idx] = frame.astype(dtype)
+            else:
+                node[...] = frame.astype(dtype)
+
+    return path
+
+class Fixture:
+    """A temporary file created by :func:`make_file`."""
+
+    def __init__(self, shape, **kwargs):
+        fid, self.path = tempfile.mkstemp(suffix=".h5")
+        os.close(fid)
+        make_file(self.path, scaled(shape), **kwargs)
+        self.h5 = tables.open_file(self.path, "r")
+        self.node = self.h5.root.data
+
+    def close(self):
+        """Close and remove the file."""
+        self.h5.close()
+        os.remove(self.path)
+
+def _main():
+    """Write a fixture from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("path")
+    parser.add_argument("--shape", type=int, nargs="+",
+                        default=[100, 512, 512])
+    parser.add_argument("--dtype", default="uint16")
+    parser.add_argument("--layout", default="chunked",
+                        choices=["contiguous", "chunked"])
+    parser.add_argument("--complib", default=None)
+    parser.add_argument("--complevel", type=int, default=4)
+    args = parser.parse_args()
+    make_file(
+        args.path, tuple(args.shape), dtype=args.dtype,
+        layout=args.layout, complib=args.complib,
+        complevel=args.complevel
+    )
+
+if __name__ == "__main__":
+    _main()
@@ -25,17 +25,27 @@ setup(
     license = "MIT",
 
     install_requires = ["ViTables >2.1", "pyqtgraph"],
+    extras_require = {
+        "memmap": ["h5py"],
+        "blosc": ["blosc"],
+    },
     dependency_links = [
         "https://github.com/uvemas/ViTables@f6cb68227e10bf0658fd11b8daa56b76452b0341#egg=project-version"
     ],
 
     entry_points = {
         "vitables.plugins" : "vtimshow = vtimshow:VtImageViewer",
+        "console_scripts" : [
+            "vtimshow-batch = vtimshow.batch:main",
+        ],
         "vtimshow.filters" : [
             "nofilter = vtimshow.filters.nofilter",
             "visred = vtimshow.filters.scaledhumaneye:Red",
             "visgreen = vtimshow.filters.scaledhumaneye:Green",
             "visblue = vtimshow.filters.scaledhumaneye:Blue",
+            "pc1 = vtimshow.filters.pca:PC1",
+            "pc2 = vtimshow.filters.pca:PC2",
+            "pc3 = vtimshow.filters.pca:PC3",
         ]
     },
 
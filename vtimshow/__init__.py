@@ -27,7 +27,21 @@ logger = logging.getLogger(__name__).addHandler(logging.NullHandler())
 __docformat__ = "restructuredtext"
 __version__ = dist.version
 
-from vtimshow.vtimageviewer import VtImageViewer
+def __getattr__(name):
+    """Import :class:`VtImageViewer` only when ViTables asks for it.
+
+    The plugin class pulls in PyQt4 and ViTables, so it is not imported
+    with the package.  This keeps :mod:`vtimshow.core` and the headless
+    tools importable without the GUI stack.
+
+    """
+    if name == "VtImageViewer":
+        from .vtimageviewer import VtImageViewer
+        return VtImageViewer
+
+    raise AttributeError(
+        "module {0!r} has no attribute {1!r}".format(__name__, name)
+    )
 
 from .utils import setup_logger as _setup_logger
 _setup_logger(__name__)
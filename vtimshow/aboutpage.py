@@ -7,6 +7,8 @@ import pkg_resources
 from PyQt4 import QtGui
 from PyQt4 import uic
 
+from .diskcache import disk_cache
+from .memory import budget
 from .preferences import Preferences
 
 class AboutPage(QtGui.QWidget):
@@ -18,7 +20,9 @@ class AboutPage(QtGui.QWidget):
     and comment.  It adds combo boxes to allow the user to define the
     preferred orientation of the datasets in the files.  By default, the
     arrays are assumed to be row-major order.  This places the index of
-    the time series as the first index of a 3D or 4D array.
+    the time series as the first index of a 3D or 4D array.  Further
+    boxes set the memory budget shared by all of the windows, the size
+    of the filter cache on disk, and the precision of the image math.
 
     """
 
@@ -68,6 +72,14 @@ class AboutPage(QtGui.QWidget):
         self.depth_4d.setCurrentIndex(int(self.config["4D"]["Depth"]))
         self.rgba_4d.setCurrentIndex(int(self.config["4D"]["RGB(A)"]))
 
+        self.budget_sb.setValue(int(self.config["Memory"]["Budget"]))
+        self.diskcache_sb.setValue(
+            int(self.config["Memory"]["DiskCache"])
+        )
+        self.precision_cb.setCurrentIndex(self.precision_cb.findText(
+            self.config["Math"]["Precision"]
+        ))
+
         self.height_2d.currentIndexChanged.connect(self.update_config)
         self.width_2d.currentIndexChanged.connect(self.update_config)
         self.rgba_2d.currentIndexChanged.connect(self.update_config)
@@ -81,6 +93,10 @@ class AboutPage(QtGui.QWidget):
         self.depth_4d.currentIndexChanged.connect(self.update_config)
         self.rgba_4d.currentIndexChanged.connect(self.update_config)
 
+        self.budget_sb.valueChanged.connect(self.update_config)
+        self.diskcache_sb.valueChanged.connect(self.update_config)
+        self.precision_cb.currentIndexChanged.connect(self.update_config)
+
         self.saveButton.clicked.connect(self.save)
 
     def update_config(self):
@@ -98,6 +114,12 @@ class AboutPage(QtGui.QWidget):
         self.config["4D"]["Depth"] = self.depth_4d.currentText()
         self.config["4D"]["RGB(A)"] = self.rgba_4d.currentText()
 
+        self.config["Memory"]["Budget"] = str(self.budget_sb.value())
+        budget.limit = self.budget_sb.value() *1024**2
+        self.config["Memory"]["DiskCache"] = str(self.diskcache_sb.value())
+        disk_cache.limit = self.diskcache_sb.value() *1024**2
+        self.config["Math"]["Precision"] = self.precision_cb.currentText()
+
     def save(self):
         """Write the configuration to file."""
         logger = logging.getLogger(__name__ +".AboutPage.save")
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+__doc__="""Estimate the background frame of a cube in one streaming pass.
+
+The background is the per pixel mean, median, or percentile of a range
+of frames.  :func:`background` reads the range once in blocks bounded
+by a number of bytes, so cubes larger than memory can be used:
+
+* the mean keeps a running sum of the frames,
+* the exact median and percentiles read all of the frames of a band of
+  rows at a time, and
+* the approximate median and percentiles stream the frames through a
+  :class:`P2Quantile` estimator that holds five markers per pixel no
+  matter how many frames there are.
+
+"""
+import numpy
+
+from .core import Cancelled
+
+STATISTICS = ("Mean", "Median", "Percentile")
+"""The statistics :func:`background` can compute."""
+
+class P2Quantile:
+    """The P² estimate of a quantile of every pixel of a stream of frames.
+
+    This is the algorithm of Jain and Chlamtac (1985) applied to every
+    pixel at once.  Five markers per pixel track the minimum, the
+    maximum, the quantile, and the two quantiles halfway to the ends.
+    Each frame moves the markers towards their ideal positions with a
+    piecewise parabolic interpolation.
+
+    """
+
+    def __init__(self, quantile):
+        """Prepare the estimator.
+
+        Parameters
+        ----------
+
+        quantile : float
+            The quantile between 0 and 1.
+
+        """
+        self.quantile = quantile
+        self.count = 0
+        self._first = []
+        self._heights = None
+        self._positions = None
+        self._desired = numpy.array(
+            [0, 2 *quantile, 4 *quantile, 2 +2 *quantile, 4]
+        )
+        self._increments = numpy.array(
+            [0, quantile /2, quantile, (1 +quantile) /2, 1]
+        )
+
+    def update(self, frame):
+        """Add a frame to the estimate."""
+        frame = numpy.asarray(frame, dtype=numpy.float64)
+        self.count += 1
+        if self._heights is None:
+            self._first.append(frame)
+            if len(self._first) == 5:
+                self._heights = numpy.sort(numpy.stack(self._first), axis=0)
+                self._positions = numpy.empty_like(self._heights)
+                for idx in range(5):
+                    self._positions[idx] = idx
+
+                self._first = None
+
+            return
+
+        q = self._heights
+        n = self._positions
+        numpy.minimum(q[0], frame, out=q[0])
+        numpy.maximum(q[4], frame, out=q[4])
+
+        # The cell of each value shifts the markers above it.
+        cell = (frame >= q[1:4]).sum(axis=0)
+        for idx in range(1, 5):
+            n[idx] += cell < idx
+
+        self._desired += self._increments
+        for idx in (1, 2, 3):
+            offset = self._desired[idx] -n[idx]
+            up = (offset >= 1) & (n[idx +1] -n[idx] > 1)
+            down = (offset <= -1) & (n[idx -1] -n[idx] < -1)
+            move = up | down
+            if not move.any():
+                continue
+
+            step = numpy.where(up, 1.0, -1.0)
+            parabolic = q[idx] +step /(n[idx +1] -n[idx -1]) *(
+                (n[idx] -n[idx -1] +step) *(q[idx +1] -q[idx])
+                /(n[idx +1] -n[idx])
+                +(n[idx +1] -n[idx] -step) *(q[idx] -q[idx -1])
+                /(n[idx] -n[idx -1])
+            )
+            linear = q[idx] +step *(
+                numpy.where(up, q[idx +1], q[idx -1]) -q[idx]
+            ) /(numpy.where(up, n[idx +1], n[idx -1]) -n[idx])
+            inside = (q[idx -1] < parabolic) & (parabolic < q[idx +1])
+            q[idx] = numpy.where(
+                move, numpy.where(inside, parabolic, linear), q[idx]
+            )
+            n[idx] += numpy.where(move, step, 0.0)
+
+    def value(self):
+        """The current estimate.
+
+        Fewer than five frames give the exact quantile.
+
+        """
+        if self._heights is None:
+            return numpy.percentile(
+                numpy.stack(self._first), 100 *self.quantile, axis=0
+            )
+
+        return self._heights[2].copy()
+
+def background(frames, statistic="Mean", percentile=50.0, start=0,
+               stop=None, exact=True, block=2**24, progress=None,
+               cancelled=None):
+    """Compute the background frame of a cube.
+
+    >>> cube = numpy.arange(24.0).reshape(6, 2, 2)
+    >>> background(cube, "Median")
+    array([[10., 11.],
+           [12., 13.]])
+
+    Parameters
+    ----------
+
+    frames : array_like
+        The (N,H,W) cube.  Any object sliced like a
+        :class:`numpy.ndarray`, such as a :class:`lazy.LazyCube`, is
+        read one block at a time.
+    statistic : string, optional
+        One of :data:`STATISTICS`.
+    percentile : float, optional
+        The percentile between 0 and 100 used by 'Percentile'.
+    start, stop : int, optional
+        The range of frames.
+    exact : bool, optional
+        Compute the exact median or percentile.  Otherwise, they are
+        estimated with :class:`P2Quantile`.  The mean is always exact.
+    block : int, optional
+        The number of bytes read at once.
+    progress : callable, optional
+        Called with the work done and the total after each block.
+    cancelled : callable, optional
+        Checked after each block.  :class:`core.Cancelled` is raised
+        if it returns ``True``.
+
+    Returns
+    -------
+
+    ret : :class:`numpy.ndarray`
+        The (H,W) background in ``float64``.
+
+    """
+    if statistic not in STATISTICS:
+        raise ValueError("Unknown statistic {0!s}".format(statistic))
+
+    indexes = range(len(frames))[start:stop]
+    if len(indexes) == 0:
+        raise ValueError("The range of frames is empty")
+
+    start, stop = indexes.start, indexes.stop
+    shape = tuple(frames.shape[1:])
+    framebytes = int(numpy.prod(shape)) *numpy.dtype(frames.dtype).itemsize
+    quantile = 0.5 if statistic == "Median" else percentile /100.0
+
+    if statistic != "Mean" and exact:
+        # Read bands of rows across the depth so each fits in a block.
+        rows = max(1, block *shape[0] //(framebytes *len(indexes)))
+        ret = numpy.empty(shape, dtype=numpy.float64)
+        for first in range(0, shape[0], rows):
+            last = min(first +rows, shape[0])
+            band = numpy.asarray(frames[start:stop, first:last])
+            ret[first:last] = numpy.percentile(band, 100 *quantile, axis=0)
+            if progress is not None:
+                progress(last, shape[0])
+
+            if cancelled is not None and cancelled():
+                raise Cancelled()
+
+        return ret
+
+    estimator = None if statistic == "Mean" else P2Quantile(quantile)
+    total = numpy.zeros(shape, dtype=numpy.float64)
+    step = max(1, block //max(framebytes, 1))
+    for first in range(start, stop, step):
+        last = min(first +step, stop)
+        chunk = numpy.asarray(frames[first:last])
+        if estimator is None:
+            total += chunk.sum(axis=0, dtype=numpy.float64)
+        else:
+            for frame in chunk:
+                estimator.update(frame)
+
+        if progress is not None:
+            progress(last -start, stop -start)
+
+        if cancelled is not None and cancelled():
+            raise Cancelled()
+
+    if estimator is None:
+        return total /len(indexes)
+
+    return estimator.value()
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+__doc__="""The headless batch processor installed as ``vtimshow-batch``.
+
+This applies the frame math of :class:`framemath.FrameMath` or one of
+the ``vtimshow.filters`` plugins to many datasets without the GUI.  Each
+source is given as ``FILE:NODE`` and is read in the order defined by the
+:class:`preferences.Preferences`.  The work is split into one task per
+frame selection (or per cube for filters) and distributed across a
+process pool.  The results are streamed into the output HDF5 file as
+they complete under ``/<file_name>/<node path>/<operation>``, and the
+throughput of each source is reported to the logger.
+
+For example, to compute :math:`(R - G) / B` with the red, green, and
+blue channels stepping through frames 0-99, 1-100, and 2-101::
+
+    $ vtimshow-batch out.h5 data.h5:/cube --operation "(R - G) / B" \\
+        --frames 0:100,1:101,2:102
+
+"""
+import argparse
+import concurrent.futures
+import logging
+import os
+import re
+import time
+
+import tables
+
+from .core import CHANNELS, OPERATIONS, apply_filter
+from .core import read_frame, resolve_axes
+from .export import create_frame_node
+from .filters import load_filters
+from .preferences import Preferences
+from .utils import PRECISIONS
+
+def parse_source(text):
+    """Split a ``FILE:NODE`` source into the file and node path."""
+    filename, sep, nodepath = text.rpartition(":")
+    if not sep or not nodepath.startswith("/"):
+        raise argparse.ArgumentTypeError(
+            "Source must be FILE:/NODE not {0!s}".format(text)
+        )
+
+    return filename, nodepath
+
+def parse_frames(text):
+    """Expand a frame selection into channel index tuples.
+
+    The selection is a comma separated list with one item per channel.
+    Each item is either a single index or a ``start:stop[:step]``
+    range.  All ranges must have the same length; single indexes are
+    repeated.
+
+    >>> parse_frames("0:3,5")
+    [(0, 5), (1, 5), (2, 5)]
+
+    """
+    channels = []
+    for item in text.split(","):
+        if ":" in item:
+            channels.append(range(*[int(x) for x in item.split(":")]))
+        else:
+            channels.append(int(item))
+
+    lengths = set(len(ch) for ch in channels if isinstance(ch, range))
+    if len(lengths) > 1:
+        raise argparse.ArgumentTypeError(
+            "Ranges in {0!s} differ in length".format(text)
+        )
+
+    count = lengths.pop() if lengths else 1
+    return list(zip(*[
+        ch if isinstance(ch, range) else [ch] *count for ch in channels
+    ]))
+
+def _slug(text):
+    """Turn ``text`` into a valid node name."""
+    text = text.replace("/", " by ").replace("-", " minus ")
+    return re.sub(r"\W+", "_", text).strip("_").lower()
+
+def _frame_task(filename, nodepath, frames, operation, precision):
+    """Read the frames of one selection and apply ``operation``."""
+    start = time.perf_counter()
+    with tables.open_file(filename, "r") as h5:
+        node = h5.get_node(nodepath)
+        order = Preferences()["3D" if node.ndim == 3 else "4D"]
+        channels = [read_frame(node, idx, order) for idx in frames]
+
+    nbytes = sum(ch.nbytes for ch in channels)
+    channels += [None] *(3 -len(channels))
+    result = OPERATIONS[operation](*channels, precision=precision)
+    return result, nbytes, time.perf_counter() -start
+
+_plugins = {}
+"""The filters loaded by this worker process by name."""
+
+def _plugin(name):
+    """Load the filters once per worker process and return ``name``."""
+    if not _plugins:
+        _plugins.update(load_filters())
+
+    return _plugins[name]
+
+def _filter_task(filename, nodepath, name):
+    """Read a (N,H,W) cube and apply the filter ``name``."""
+    start = time.perf_counter()
+    with tables.open_file(filename, "r") as h5:
+        node = h5.get_node(nodepath)
+        axes, has_depth = resolve_axes(node.shape, Preferences())
+        if not has_depth or node.ndim != 3:
+            raise ValueError("{0:s} is not a (N,H,W) cube".format(nodepath))
+
+        array = node.read().transpose(axes)
+
+    result = apply_filter(name, _plugin(name), array)
+    return result, array.nbytes, time.perf_counter() -start
+
+def check_source(filename, nodepath, frames=(), filter_name=None):
+    """Check that a source can be processed before any work starts.
+
+    Parameters
+    ----------
+
+    filename, nodepath : string
+        The source.
+    frames : list, optional
+        The channel index tuples of a frame operation.
+    filter_name : string, optional
+        The filter applied instead of a frame operation.
+
+    Returns
+    -------
+
+    ret : string or ``None``
+        Why the source cannot be processed or ``None`` if it can.
+
+    """
+    try:
+        with tables.open_file(filename, "r") as h5:
+            shape = h5.get_node(nodepath).shape
+    except (OSError, tables.HDF5ExtError, tables.NoSuchNodeError) as err:
+        return str(err)
+
+    try:
+        axes, has_depth = resolve_axes(shape, Preferences())
+    except ValueError as err:
+        return str(err)
+
+    if filter_name is not None:
+        if not has_depth or len(shape) != 3:
+            return "{0:s} is not a (N,H,W) cube".format(nodepath)
+
+        return None
+
+    if not has_depth:
+        return "{0:s} has no frames".format(nodepath)
+
+    depth = shape[axes[0]]
+    bad = [
+        idx for selection in frames for idx in selection
+        if not -depth <= idx < depth
+    ]
+    if bad:
+        return "Frame {0:d} is out of range for {1:d} frames".format(
+            bad[0], depth
+        )
+
+    return None
+
+class _Output:
+    """Create output nodes lazily and write results into them."""
+
+    def __init__(self, h5, overwrite):
+        self.h5 = h5
+        self.overwrite = overwrite
+        self.nodes = {}
+
+    @staticmethod
+    def where(key):
+        """The group and name of the output node of ``key``."""
+        (filename, nodepath), name = key
+        stem = re.sub(r"\W+", "_", os.path.basename(filename))
+        return "/" +stem +nodepath.rstrip("/"), name
+
+    def exists(self, key):
+        """Check if the output node of ``key`` would be replaced."""
+        where, name = self.where(key)
+        return where +"/" +name in self.h5
+
+    def write(self, key, row, count, result):
+        """Write ``result`` as row ``row`` of the node for ``key``."""
+        if key not in self.nodes:
+            where, name = self.where(key)
+            self.nodes[key] = create_frame_node(
+                self.h5, where, name, count, result.shape, result.dtype,
+                overwrite=self.overwrite
+            )
+
+        self.nodes[key][row] = result
+
+    def discard(self, key):
+        """Remove the partial output node of ``key``, if any."""
+        node = self.nodes.pop(key, None)
+        if node is not None:
+            node.remove()
+
+def run(output, sources, operation=None, frames=(), filter_name=None,
+        precision="native", processes=None, overwrite=False):
+    """Process all sources and stream the results into ``output``.
+
+    Parameters
+    ----------
+
+    output : string
+        The path of the output HDF5 file.  It is appended to if it
+        exists.
+    sources : list
+        The ``(filename, nodepath)`` of each source.
+    operation : string, optional
+        A key of :data:`core.OPERATIONS`.
+    frames : list, optional
+        The channel index tuples to apply ``operation`` to.
+    filter_name : string, optional
+        The name of a filter plugin to apply instead of ``operation``.
+    precision : string, optional
+        The precision policy passed to the operation.
+    processes : int, optional
+        The number of worker processes.  Defaults to the CPU count.
+    overwrite : bool, optional
+        Replace existing output nodes.
+
+    Returns
+    -------
+
+    ret : dict
+        The ``(items, bytes read, seconds)`` processed per source.  The
+        seconds are the sum of the durations of its tasks, so the
+        throughput is that of one worker.  Sources that fail the
+        :func:`check_source` or whose output node exists without
+        ``overwrite`` are logged and skipped.  A source with a failing
+        task is logged and its partial output node is removed while
+        the other sources continue.
+
+    """
+    logger = logging.getLogger(__name__ +".run")
+    processes = processes or os.cpu_count() or 1
+    stats = {source: [0, 0, 0.0] for source in sources}
+    with tables.open_file(output, "a") as h5:
+        out = _Output(h5, overwrite)
+        tasks = []
+        for source in sources:
+            name = operation if filter_name is None else filter_name
+            key = (source, _slug(name))
+            error = check_source(
+                *source, frames=frames, filter_name=filter_name
+            )
+            if error is None and out.exists(key) and not overwrite:
+                error = "{0:s}/{1:s} exists; use --overwrite".format(
+                    *out.where(key)
+                )
+
+            if error is not None:
+                logger.error("Skipping {0:s}:{1:s}.  {2:s}".format(
+                    source[0], source[1], error
+                ))
+                continue
+
+            if filter_name is not None:
+                tasks.append((key, 0, 1, _filter_task,
+                              source +(filter_name,)))
+            else:
+                for row, selection in enumerate(frames):
+                    tasks.append((key, row, len(frames), _frame_task,
+                                  source +(selection, operation, precision)))
+
+        failed = set()
+        with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+            pending = {}
+
+            def drain(when):
+                done, _ = concurrent.futures.wait(pending, return_when=when)
+                for future in done:
+                    key, row, count = pending.pop(future)
+                    if key in failed:
+                        continue
+
+                    try:
+                        result, nbytes, seconds = future.result()
+                        if result is None:
+                            logger.warning(
+                                "{0!s} produced nothing".format(key)
+                            )
+                            continue
+
+                        out.write(key, row, count, result)
+                    except Exception as err:
+                        # One bad source must not stop the others.
+                        logger.error("{0:s}:{1:s} failed.  {2!s}".format(
+                            key[0][0], key[0][1], err
+                        ))
+                        failed.add(key)
+                        out.discard(key)
+                        stats[key[0]] = [0, 0, 0.0]
+                        continue
+
+                    stats[key[0]][0] += 1
+                    stats[key[0]][1] += nbytes
+                    stats[key[0]][2] += seconds
+
+            # Bound the results in flight so the output is streamed.
+            for key, row, count, function, args in tasks:
+                if key in failed:
+                    continue
+
+                pending[pool.submit(function, *args)] = (key, row, count)
+                if len(pending) >= 2 *processes:
+                    drain(concurrent.futures.FIRST_COMPLETED)
+
+            while pending:
+                drain(concurrent.futures.ALL_COMPLETED)
+
+    for source, (items, nbytes, seconds) in stats.items():
+        seconds = max(seconds, 1e-9)
+        logger.info(
+            "{0:s}:{1:s} {2:d} items in {3:.2f} s "
+            "({4:.1f} items/s, {5:.1f} MB/s)".format(
+                source[0], source[1], items, seconds, items /seconds,
+                nbytes /1024**2 /seconds
+            )
+        )
+
+    return {source: tuple(val) for source, val in stats.items()}
+
+def main(argv=None):
+    """The ``vtimshow-batch`` console entry point."""
+    parser = argparse.ArgumentParser(
+        prog="vtimshow-batch",
+        description="Apply vtimshow frame math or filters to HDF5 nodes."
+    )
+    parser.add_argument("output", help="The output HDF5 file")
+    parser.add_argument(
+        "sources", nargs="+", type=parse_source, help="FILE:/NODE"
+    )
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--operation", choices=list(OPERATIONS))
+    group.add_argument("--filter", dest="filter_name")
+    parser.add_argument(
+        "--frames", action="append", type=parse_frames, default=[],
+        help="Channel frames like 0:10,10:20 (repeatable)"
+    )
+    parser.add_argument(
+        "--precision", choices=PRECISIONS,
+        default=Preferences()["Math"]["Precision"]
+    )
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--overwrite", action="store_true")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(levelname)s %(message)s"
+    )
+    frames = [selection for item in args.frames for selection in item]
+    if args.operation is not None:
+        if not frames:
+            parser.error("--operation requires --frames")
+
+        if any(len(sel) != CHANNELS[args.operation] for sel in frames):
+            parser.error("{0:s} needs {1:d} channel(s) per frame".format(
+                args.operation, CHANNELS[args.operation]
+            ))
+
+    elif args.filter_name not in load_filters():
+        parser.error("Unknown filter {0!s}".format(args.filter_name))
+
+    run(
+        args.output, args.sources, operation=args.operation,
+        frames=frames, filter_name=args.filter_name,
+        precision=args.precision, processes=args.processes,
+        overwrite=args.overwrite
+    )
+    return 0
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
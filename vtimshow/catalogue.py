@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+__doc__="""A catalogue of the nodes of a file that can be shown as images.
+
+ViTables only creates the tree items of a group once it is expanded, so
+the nodes of a large file with a deep hierarchy cannot be found from
+the tree alone.  :func:`catalogue` instead walks the whole file with
+:meth:`tables.File.walk_nodes`, which only touches the metadata of the
+nodes, and keeps every numeric leaf with 2 to 4 dimensions.  The result
+is cached by file and modification time, so it is only rebuilt when the
+file changes.  :func:`search` selects the entries matching a query.
+
+"""
+import collections
+import logging
+import os
+
+import tables
+
+from .utils import hdf5_lock
+
+class Entry(collections.namedtuple(
+        "Entry", ("filename", "path", "shape", "dtype"))):
+    """A node that can be shown as an image."""
+    __slots__ = ()
+
+    @property
+    def label(self):
+        """The text identifying the entry in a combo box."""
+        return "{0:s} {1:s}".format(
+            os.path.split(self.filename)[-1], self.path
+        )
+
+_catalogues = {}
+"""The cached catalogues by file name."""
+
+def _stamp(filename):
+    """Identify the version of ``filename`` on disk."""
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+
+    return stat.st_mtime_ns, stat.st_size
+
+def is_image(node):
+    """Check if ``node`` is a numeric leaf with 2 to 4 dimensions."""
+    return isinstance(node, tables.Leaf) \
+        and getattr(node, "dtype", None) is not None \
+        and node.dtype.kind in "iuf" and len(node.shape) in (2, 3, 4)
+
+def catalogue(h5file):
+    """List the nodes of an open file that can be shown as images.
+
+    Parameters
+    ----------
+
+    h5file : :class:`tables.File`
+        The open file.
+
+    Returns
+    -------
+
+    ret : list
+        An :class:`Entry` for every image node in the order of
+        :meth:`tables.File.walk_nodes`.
+
+    """
+    logger = logging.getLogger(__name__ +".catalogue")
+    filename = os.path.realpath(h5file.filename)
+    stamp = _stamp(filename)
+    cached = _catalogues.get(filename)
+    if stamp is not None and cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    with hdf5_lock:
+        ret = [
+            Entry(h5file.filename, node._v_pathname, node.shape, node.dtype)
+            for node in h5file.walk_nodes("/", classname="Leaf")
+            if is_image(node)
+        ]
+    logger.debug("Found {0:d} images in {1:s}".format(len(ret), filename))
+    if stamp is not None:
+        _catalogues[filename] = (stamp, ret)
+
+    return ret
+
+def search(entries, text):
+    """Select the entries matching ``text``.
+
+    Every word of ``text`` must appear in the label of an entry,
+    ignoring case.
+
+    >>> entries = [
+    ...     Entry("a.h5", "/scan/red", (4, 4), None),
+    ...     Entry("a.h5", "/scan/blue", (4, 4), None),
+    ... ]
+    >>> [entry.path for entry in search(entries, "SCAN re")]
+    ['/scan/red']
+
+    Parameters
+    ----------
+
+    entries : iterable
+        The :class:`Entry` objects to search.
+    text : string
+        The query.
+
+    Returns
+    -------
+
+    ret : list
+        The matching entries in their original order.
+
+    """
+    words = text.lower().split()
+    return [
+        entry for entry in entries
+        if all(word in entry.label.lower() for word in words)
+    ]
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+__doc__="""Decode the chunks of compressed nodes on a thread pool.
+
+Reading a compressed node with PyTables decompresses every chunk on the
+calling thread.  :class:`ChunkReader` instead fetches the raw chunks
+covering a request with ``read_chunk`` (PyTables 3.8 or later), which
+is quick, and decompresses them on a shared thread pool.  Zlib and
+Blosc release the GIL while they work, so a frame or a region of
+interest is decoded on every core.  Only the calling thread touches the
+file, and only while it holds :data:`utils.hdf5_lock`, so the decoding
+overlaps the reads of other threads.
+
+Zlib chunks are decoded with :mod:`zlib` followed by the HDF5 byte
+unshuffle.  Blosc chunks need the python-blosc_ package, which is run
+with one thread per chunk so the pool is not oversubscribed.  Any other
+filter pipeline is read by PyTables as usual.
+
+.. _python-blosc: http://python-blosc.blosc.org
+
+"""
+import concurrent.futures
+import itertools
+import logging
+import os
+import threading
+import zlib
+
+import numpy
+import tables
+
+try:
+    import blosc
+except ImportError:
+    blosc = None
+
+from .utils import hdf5_lock
+
+WORKERS = os.cpu_count() or 1
+"""The number of threads decoding chunks."""
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _executor():
+    """The thread pool shared by every :class:`ChunkReader`."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            if blosc is not None:
+                blosc.set_nthreads(1)
+
+            _pool = concurrent.futures.ThreadPoolExecutor(WORKERS)
+
+    return _pool
+
+def _decompressor(filters):
+    """Select the function decompressing one chunk.
+
+    Returns ``None`` if the pipeline cannot be decoded here.
+
+    """
+    if filters.complevel == 0 or filters.fletcher32:
+        return None
+    elif filters.complib == "zlib" and not filters.bitshuffle:
+        return zlib.decompress
+    elif filters.complib.split(":")[0] == "blosc" and blosc is not None:
+        # The shuffle of Blosc is part of its own format.
+        return blosc.decompress
+
+    return None
+
+def chunk_reader(node):
+    """Wrap ``node`` in a :class:`ChunkReader` when it helps.
+
+    Parameters
+    ----------
+
+    node : :class:`tables.Array`
+        The node to read.
+
+    Returns
+    -------
+
+    ret : :class:`ChunkReader` or :class:`tables.Array`
+        The reader or ``node`` itself if its chunks cannot be decoded
+        here or there is a single worker.
+
+    """
+    if WORKERS < 2 or not isinstance(node, tables.Array):
+        return node
+    elif node.chunkshape is None or not hasattr(node, "read_chunk"):
+        return node
+    elif _decompressor(node.filters) is None:
+        return node
+
+    return ChunkReader(node)
+
+class ChunkReader:
+    """Read hyperslabs of a chunked node decoding chunks in parallel.
+
+    The reader is indexed with integers and slices with positive steps
+    like the node itself.
+
+    """
+
+    def __init__(self, node):
+        """Prepare to read ``node``.
+
+        Parameters
+        ----------
+
+        node : :class:`tables.Array`
+            A chunked node with a pipeline accepted by
+            :func:`chunk_reader`.
+
+        """
+        self.node = node
+        self._decompress = _decompressor(node.filters)
+        self._unshuffle = node.filters.shuffle \
+            and node.filters.complib == "zlib"
+        dtype = node.dtype
+        if node.byteorder == "little":
+            dtype = dtype.newbyteorder("<")
+        elif node.byteorder == "big":
+            dtype = dtype.newbyteorder(">")
+
+        self._dtype = dtype
+
+    @property
+    def shape(self):
+        return self.node.shape
+
+    @property
+    def ndim(self):
+        return self.node.ndim
+
+    @property
+    def dtype(self):
+        return self.node.dtype
+
+    @property
+    def chunkshape(self):
+        return self.node.chunkshape
+
+    def __repr__(self):
+        return "ChunkReader({0!s})".format(self.node)
+
+    def _decode(self, raw):
+        """Decompress one raw chunk into an array of the chunk shape."""
+        data = self._decompress(bytes(raw))
+        if self._unshuffle:
+            data = numpy.frombuffer(data, dtype=numpy.uint8).reshape(
+                self._dtype.itemsize, -1
+            ).T.tobytes()
+
+        return numpy.frombuffer(data, dtype=self._dtype).reshape(
+            self.node.chunkshape
+        )
+
+    def _ranges(self, key):
+        """Turn a basic index into one ``range`` per dimension."""
+        if not isinstance(key, tuple):
+            key = (key,)
+
+        key = key +(slice(None),) *(self.ndim -len(key))
+        ranges = []
+        for item, length in zip(key, self.shape):
+            if isinstance(item, slice):
+                indexes = range(length)[item]
+                if indexes.step < 0:
+                    raise ValueError("Negative steps are not supported")
+            else:
+                indexes = range(length)[int(item)]
+                indexes = range(indexes, indexes +1)
+
+            ranges.append(indexes)
+
+        return key, ranges
+
+    def __getitem__(self, key):
+        """Read the region selected by ``key``.
+
+        The chunks are fetched in order on the calling thread while the
+        pool decodes the chunks already fetched.
+
+        """
+        key, ranges = self._ranges(key)
+        ret = numpy.empty([len(r) for r in ranges], dtype=self.dtype)
+        if ret.size == 0:
+            return ret[tuple(
+                slice(None) if isinstance(item, slice) else 0
+                for item in key
+            )]
+
+        chunks = [
+            sorted({idx //size for idx in indexes})
+            for indexes, size in zip(ranges, self.node.chunkshape)
+        ]
+        pool = _executor()
+        pending = set()
+        try:
+            for coords in itertools.product(*chunks):
+                start = tuple(
+                    idx *size for idx, size in
+                    zip(coords, self.node.chunkshape)
+                )
+                with hdf5_lock:
+                    info = self.node.chunk_info(start)
+                    if info.filter_mask != 0:
+                        # A filter was skipped when writing this chunk.
+                        raise ValueError("Partially filtered chunk")
+
+                    raw = None
+                    if info.offset is not None:
+                        raw = self.node.read_chunk(start)
+
+                pending.add(pool.submit(self._fill, ret, ranges, start, raw))
+                if len(pending) >= 2 *WORKERS:
+                    done, pending = concurrent.futures.wait(
+                        pending,
+                        return_when=concurrent.futures.FIRST_COMPLETED
+                    )
+                    for future in done:
+                        future.result()
+
+            for future in concurrent.futures.as_completed(pending):
+                future.result()
+        except ValueError as err:
+            logger = logging.getLogger(__name__ +".ChunkReader")
+            logger.debug("Reading {0!s} directly.  {1!s}".format(
+                self.node, err
+            ))
+            for future in pending:
+                future.cancel()
+
+            concurrent.futures.wait(pending)
+            with hdf5_lock:
+                return self.node[key]
+
+        return ret[tuple(
+            slice(None) if isinstance(item, slice) else 0 for item in key
+        )]
+
+    def _fill(self, out, ranges, start, raw):
+        """Decode a chunk and copy its part of the selection to ``out``.
+
+        A chunk that was never written holds the default of the atom.
+
+        """
+        chunk = None if raw is None else self._decode(raw)
+        src = []
+        dst = []
+        for indexes, first, size in zip(
+            ranges, start, self.node.chunkshape
+        ):
+            # The positions in ``indexes`` that fall in this chunk.
+            lo = max(0, -((indexes.start -first) //indexes.step))
+            hi = min(
+                len(indexes),
+                -((indexes.start -first -size) //indexes.step)
+            )
+            dst.append(slice(lo, hi))
+            src.append(slice(
+                indexes[lo] -first, indexes[hi -1] -first +1,
+                indexes.step
+            ))
+
+        if chunk is None:
+            out[tuple(dst)] = self.node.atom.dflt
+        else:
+            out[tuple(dst)] = chunk[tuple(src)]
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 __doc__="""The module defining :class:`ColorRow`."""
+import itertools
 import logging
 import os
 
@@ -12,21 +13,52 @@ import tables
 import vitables
 from vitables.vtapp import translate as _translate
 
+from . import plugin_class
+from .catalogue import catalogue, is_image, search
+from .core import FrameSource
 from .preferences import Preferences
+from .temporal import STATISTICS
+from .utils import hdf5_lock
 from .filters import Filters
 from .filters.nofilter import name as _no_filter_name
+from .loader import Loader
+
+_generations = itertools.count()
+"""Unique identities of the node and filter selections of the rows."""
+
+_detached = set()
+"""The loaders left running a filter after their row was closed."""
+
+def _detach(loader):
+    """Keep ``loader`` alive without its row until it finishes.
+
+    A closed row cannot wait for a filter that is slow to notice the
+    cancel, so the loader is disconnected from the row and released
+    once its thread ends.
+
+    """
+    for signal in (
+            loader.progress, loader.loaded, loader.failed, loader.finished
+    ):
+        signal.disconnect()
+
+    loader.setParent(None)
+    _detached.add(loader)
+    loader.finished.connect(lambda: _detached.discard(loader))
 
 class ColorRow(QtGui.QGroupBox):
     """A class to hold a row for assigning the color channels.
 
     This is a Qt group divided into four columns.  The first is a combo
-    box listing all of the available leaf nodes open in the application.
-    The middle column is a PyQtGraph horizontal axis analogous to the
+    box listing all of the image nodes of the files open in the
+    application with a search box below it.  The middle column is a
+    PyQtGraph horizontal axis analogous to the
     :class:`pyqtgraph.ImageView.roiPlot` with a vertical line for
     selecting the frame.  The third column is a spin box connected to
     the horizontal selector in the middle.  The fourth column is a combo
     box to select an extension to apply a ``vtimshow.filters`` filter to
-    the dataset.
+    the dataset.  While a node is read on a worker thread, a progress
+    bar and a cancel button are shown after the filters.
 
     ..  note::  The current implementation does not allow for reshaping
                 the datasets.  The *must* be stored in the order listed
@@ -61,12 +93,42 @@ class ColorRow(QtGui.QGroupBox):
         self._combo_box.addItem("")
         self._layout.addWidget(self._combo_box, 0, 0, 1, 1)
 
+        self._search = QtGui.QLineEdit(self)
+        self._search.setPlaceholderText(
+            _translate(plugin_class, "Search nodes", "Placeholder")
+        )
+        self._layout.addWidget(self._search, 1, 0, 1, 1)
+
+        self._window_size = QtGui.QSpinBox(self)
+        self._window_size.setRange(2, 999)
+        self._window_size.setValue(5)
+        self._window_size.setSuffix(
+            _translate(plugin_class, " frames", "Spin box suffix")
+        )
+        self._window_size.setEnabled(False)
+        self._layout.addWidget(self._window_size, 1, 2, 1, 1)
+
+        self._window = QtGui.QComboBox(self)
+        self._window.addItem(
+            _translate(plugin_class, "No window", "Combo box"), None
+        )
+        for statistic in STATISTICS:
+            self._window.addItem(_translate(
+                plugin_class, "Moving {0:s}".format(statistic.lower()),
+                "Combo box"
+            ), statistic)
+
+        self._window.setEnabled(False)
+        self._layout.addWidget(self._window, 1, 3, 1, 1)
+
         self._plot = pyqtgraph.PlotWidget(self)
         self._line = pyqtgraph.InfiniteLine(0, movable=True)
         self._line.setPen(color)
         self._plot.hideAxis("left")
         self._plot.addItem(self._line)
+        self._plot.scene().sigMouseClicked.connect(self._plot_clicked)
         self._layout.addWidget(self._plot, 0, 1, 1, 1)
+        self._curves = []
 
         self._spin_box = QtGui.QSpinBox(self)
         self._layout.addWidget(self._spin_box, 0, 2, 1, 1)
@@ -75,6 +137,17 @@ class ColorRow(QtGui.QGroupBox):
         self._filters.setEnabled(False)
         self._layout.addWidget(self._filters, 0, 3, 1, 1)
 
+        self._progress = QtGui.QProgressBar(self)
+        self._progress.setRange(0, 100)
+        self._progress.hide()
+        self._layout.addWidget(self._progress, 0, 4, 1, 1)
+
+        self._cancel = QtGui.QPushButton(
+            _translate(plugin_class, "Cancel", "Button"), self
+        )
+        self._cancel.hide()
+        self._layout.addWidget(self._cancel, 0, 5, 1, 1)
+
         self._layout.setColumnStretch(0, 2)
         self._layout.setColumnStretch(1, 3)
         self._layout.setColumnStretch(2, 1)
@@ -84,9 +157,20 @@ class ColorRow(QtGui.QGroupBox):
         self._line.sigPositionChanged.connect(self._line_moved)
         self._spin_box.valueChanged.connect(self._spin_changed)
         self._filters.currentIndexChanged.connect(self._filter_changed)
+        self._cancel.clicked.connect(self._cancel_clicked)
+        self._window.currentIndexChanged.connect(self._window_changed)
+        self._window_size.valueChanged.connect(self._window_changed)
+        self._search.textChanged.connect(
+            lambda text: self._update_combobox()
+        )
 
         self._order = Preferences()
-        self.cached = False
+        self.index = None
+        self.data = None
+        self.source = None
+        self._generation = next(_generations)
+        self._loader = None
+        self._loaders = {}
 
         self._update_combobox()
         if index is None:
@@ -105,18 +189,16 @@ class ColorRow(QtGui.QGroupBox):
         logger.debug("Index type {0!s}".format(index))
 
     def _update_combobox(self):
-        """Update the combo box with the currently expanded groups.
+        """Fill the combo box with the image nodes of the open files.
 
-        Traverse the tree model and populate the dataset combo box with
-        the leaf names of the leaf datasets that are currently open or
-        have been opened and placed into the ViTables index model.  We
-        do this because ViTables does not establish the
+        The nodes are listed from the :func:`catalogue.catalogue` of
+        every open file, so the groups do not need to be expanded in
+        the tree viewer.  ViTables does not establish the
         :class:`PyQt4.QtCore.QModelIndex` of a leaf node until it has
-        been expanded in the tree viewer.  This is reasonable because
-        the users will most likely want to compare datasets from
-        closely related groups.  The down side is the user must expand
-        the group tree out to the leafs before it will be populated in
-        the combo box.
+        been expanded, so the tree model is traversed as well and the
+        index is stored with the nodes that have one.  The other nodes
+        store their file name and path.  Only the nodes matching the
+        search box are listed, but the current node is always kept.
 
         """
         # The open files can be found from the database tree model in
@@ -130,6 +212,8 @@ class ColorRow(QtGui.QGroupBox):
         # Put the root objects onto the stack.  These represent the file
         # objects in the tree.  We also include a boolean to flag that
         # this item has not been touched.
+        files = []
+        indexes = {}
         stack = [
             (index, False) for index in
             databases.indexChildren(QtCore.QModelIndex())
@@ -143,8 +227,10 @@ class ColorRow(QtGui.QGroupBox):
                 # Ignore the query results.
                 continue
 
+            if isinstance(node.node, tables.group.RootGroup) and not seen:
+                files.append(node.node._v_file)
+
             if seen or not databases.hasChildren(index):
-                #logger.debug("Node type {0!s}".format(node))
                 # If the index does not have children or we have already
                 # seen this item, process it.
                 if isinstance(node.node, groups):
@@ -152,22 +238,11 @@ class ColorRow(QtGui.QGroupBox):
                     # reviewed the children.
                     continue
 
-                if node.node.dtype.kind not in "iuf":
-                    # It must be a numeric array
-                    continue
+                if is_image(node.node):
+                    indexes[
+                        node.node._v_file.filename, node.node._v_pathname
+                    ] = index
 
-                if node.node.ndim not in (2,3,4):
-                    # Make sure it can be an image.
-                    continue
-
-                label = "{0:s} {1:s}".format(
-                    os.path.split(node.node._v_file.filename)[-1],
-                    node.node._v_pathname
-                )
-                if self._combo_box.findText(label) == -1:
-                    self._combo_box.addItem(label, index)
-
-                #logger.debug("Node: {0!s}".format(node.name))
             else:
                 # Before we process this index, mark it as seen and
                 # process its children.
@@ -175,6 +250,68 @@ class ColorRow(QtGui.QGroupBox):
                 for idx in databases.indexChildren(index):
                     stack.append((idx, False))
 
+        entries = []
+        for h5file in files[::-1]:
+            for entry in catalogue(h5file):
+                entries.append((
+                    entry, indexes.get((entry.filename, entry.path), entry)
+                ))
+
+        current = self._combo_box.currentText()
+        matches = set(search(
+            [entry for entry, _ in entries], self._search.text()
+        ))
+        self._combo_box.blockSignals(True)
+        try:
+            self._combo_box.clear()
+            self._combo_box.addItem("")
+            for entry, data in entries:
+                if entry in matches or entry.label == current:
+                    self._combo_box.addItem(entry.label, data)
+
+            idx = self._combo_box.findText(current)
+            self._combo_box.setCurrentIndex(max(idx, 0))
+        finally:
+            self._combo_box.blockSignals(False)
+
+        logger.debug("Listed {0:d} of {1:d} nodes".format(
+            self._combo_box.count() -1, len(entries)
+        ))
+        if current and idx == -1:
+            # The file of the current node was closed.
+            self._node_changed()
+
+    def _find_node(self, data):
+        """Look up the node stored with a combo box item.
+
+        Parameters
+        ----------
+
+        data : :class:`PyQt4.QtCore.QModelIndex`, :class:`catalogue.Entry`
+            The data of the item.
+
+        Returns
+        -------
+
+        ret : :class:`tables.Leaf` or ``None``
+            The node or ``None`` if its file is no longer open.
+
+        """
+        databases = vitables.utils.getGui().dbs_tree_model
+        if isinstance(data, QtCore.QModelIndex):
+            return databases.nodeFromIndex(data).node
+
+        for index in databases.indexChildren(QtCore.QModelIndex()):
+            h5file = databases.nodeFromIndex(index).node._v_file
+            if h5file.filename == data.filename and h5file.isopen:
+                try:
+                    with hdf5_lock:
+                        return h5file.get_node(data.path)
+                except tables.NoSuchNodeError:
+                    return None
+
+        return None
+
     def _node_changed(self):
         """Update the current node.
 
@@ -184,14 +321,22 @@ class ColorRow(QtGui.QGroupBox):
 
         """
         logger = logging.getLogger(__name__ +".ColorRow._node_changed")
-        databases = vitables.utils.getGui().dbs_tree_model
         index = self._combo_box.currentIndex()
-        self.index = self._combo_box.itemData(index)
+        item = self._combo_box.itemData(index)
+        self.index = item if isinstance(item, QtCore.QModelIndex) else None
         #logger.debug("Index type {0!s}".format(self.index))
-        if self.index is None:
-            self.data = None
+        self._cancel_load()
+        if self.source is not None:
+            self.source.close()
+
+        self.data = None if item is None else self._find_node(item)
+        if self.data is None:
+            self.source = None
         else:
-            self.data = databases.nodeFromIndex(self.index).node
+            self.source = FrameSource(self.data, self._order, owner=self)
+            self.source.set_filter(*self._filters.current_filter())
+
+        self._generation = next(_generations)
 
         #logger.debug("Node type {0!s}".format(self.data))
         self._spin_box.setValue(0)
@@ -206,9 +351,11 @@ class ColorRow(QtGui.QGroupBox):
             if self.node_is_2d():
                 self._plot.setEnabled(False)
                 self._spin_box.setEnabled(False)
+                self._window.setEnabled(False)
             else:
                 self._plot.setEnabled(True)
                 self._spin_box.setEnabled(True)
+                self._window.setEnabled(True)
                 self._plot.setXRange(0, self.data.shape[depth])
                 self._spin_box.setMaximum(self.data.shape[depth])
 
@@ -221,20 +368,63 @@ class ColorRow(QtGui.QGroupBox):
             self._plot.setEnabled(False)
             self._spin_box.setEnabled(False)
             self._filters.setEnabled(False)
+            self._window.setEnabled(False)
 
-        self.cached = False
+        self._apply_window()
         self.frame_changed.emit()
 
     def _line_moved(self):
         """Make the line and combo box track each other."""
         self._spin_box.setValue(int(self._line.value()))
-        self.cached = False
         self.frame_changed.emit()
 
     def _spin_changed(self):
         """Make the line and combo box track each other."""
         self._line.setValue(self._spin_box.value())
 
+    def _plot_clicked(self, event):
+        """Jump to the frame under a double click on the plot."""
+        if not event.double() or not self._spin_box.isEnabled():
+            return
+
+        view = self._plot.getPlotItem().getViewBox()
+        point = view.mapSceneToView(event.scenePos())
+        self._spin_box.setValue(int(round(point.x())))
+
+    def show_curves(self, curves):
+        """Draw curves over the frames in the plot.
+
+        Double clicking the plot selects the frame under the cursor, so
+        the curves can be used to find frames of interest.
+
+        Parameters
+        ----------
+
+        curves : dict
+            The (N,) values of each curve by name.  An empty dict
+            removes the curves.
+
+        """
+        for curve in self._curves:
+            self._plot.removeItem(curve)
+
+        self._curves = []
+        legend = self._plot.getPlotItem().legend
+        if legend is not None:
+            legend.scene().removeItem(legend)
+            self._plot.getPlotItem().legend = None
+
+        if not curves:
+            self._plot.hideAxis("left")
+            return
+
+        self._plot.addLegend()
+        self._plot.showAxis("left")
+        colors = ("y", "c", "m", "w")
+        for (name, values), color in zip(sorted(curves.items()), colors):
+            curve = self._plot.plot(values, pen=color, name=name)
+            self._curves.append(curve)
+
     def _filter_changed(self):
         """"Disable the band selection if a filter is selected."""
         self._line.setEnabled(
@@ -246,9 +436,131 @@ class ColorRow(QtGui.QGroupBox):
         self._spin_box.setEnabled(
             self._filters.currentText() == _no_filter_name
         )
-        self.cached = False
+        self._window.setEnabled(
+            self._filters.currentText() == _no_filter_name
+        )
+        self._cancel_load()
+        if self.source is not None:
+            self.source.set_filter(*self._filters.current_filter())
+
+        self._apply_window()
+        self._generation = next(_generations)
+        self.frame_changed.emit()
+
+    def _apply_window(self):
+        """Pass the sliding window selection to the source."""
+        statistic = self._window.itemData(self._window.currentIndex())
+        self._window_size.setEnabled(
+            statistic is not None and self._window.isEnabled()
+        )
+        if self.source is not None:
+            self.source.set_window(statistic, self._window_size.value())
+
+    def _window_changed(self):
+        """Apply a new sliding window to the frames."""
+        self._apply_window()
+        self._generation = next(_generations)
+        self.frame_changed.emit()
+
+    @property
+    def loading(self):
+        """``True`` while the node is read on a worker thread."""
+        return self._loader is not None
+
+    def _start_load(self):
+        """Read the current node on a worker thread."""
+        source = self.source
+        loader = Loader(source.compute_array, self)
+        loader.progress.connect(self._progress.setValue)
+        loader.loaded.connect(
+            lambda result: self._loaded(loader, source, result)
+        )
+        loader.failed.connect(
+            lambda message: self._failed(loader, message)
+        )
+        loader.finished.connect(lambda: self._loaders.pop(loader, None))
+        self._loaders[loader] = source._filter_key() is not None
+        self._loader = loader
+        self._progress.setValue(0)
+        self._progress.show()
+        self._cancel.show()
+        loader.start()
+
+    def _cancel_load(self):
+        """Abandon the read in progress, if any."""
+        if self._loader is not None:
+            self._loader.cancel()
+            self._loader = None
+
+        self._progress.hide()
+        self._cancel.hide()
+
+    def _cancel_clicked(self):
+        """Cancel the read and clear the selected dataset."""
+        self._cancel_load()
+        self._combo_box.setCurrentIndex(0)
+
+    def _loaded(self, loader, source, result):
+        """Install the array read by the worker.
+
+        Only the current ``loader`` is installed.  A filter change
+        keeps the source but starts a new loader, so the result of the
+        old one is stale even though ``source`` is still selected.
+
+        """
+        if loader is not self._loader:
+            return
+
+        self._loader = None
+        self._progress.hide()
+        self._cancel.hide()
+        source.install(*result)
         self.frame_changed.emit()
 
+    def _failed(self, loader, message):
+        """Report a failed read of the current node.
+
+        A loader of a node or filter that is no longer selected may
+        still fail after the selection changed.  Only a failure of the
+        current ``loader`` is reported, so a newer read is not
+        cancelled.
+
+        """
+        logger = logging.getLogger(__name__ +".ColorRow._failed")
+        if loader is not self._loader:
+            logger.debug("Ignoring a stale failure.  {0:s}".format(message))
+            return
+
+        self._cancel_load()
+        logger.error(_translate(
+            plugin_class,
+            "Unable to read {0:s}.  {1:s}".format(
+                self._combo_box.currentText(), message
+            ),
+            "Plugin error message"
+        ))
+
+    def close_source(self):
+        """Stop any read and release the current node.
+
+        Reads stop at the next block, so the loaders reading a node are
+        waited for.  The loaders applying a filter are detached instead
+        of blocking the GUI until the filter checks the cancel.
+
+        """
+        self._cancel_load()
+        for loader, filtering in list(self._loaders.items()):
+            loader.cancel()
+            if filtering:
+                _detach(loader)
+            else:
+                loader.wait()
+
+        self._loaders.clear()
+
+        if self.source is not None:
+            self.source.close()
+
     def node_is_2d(self):
         """Determine if the node is a 2D image.
 
@@ -267,68 +579,90 @@ class ColorRow(QtGui.QGroupBox):
         else:
             return False
 
-    def get_frame(self):
-        """Return the currently selected frame.
+    @property
+    def timings(self):
+        """The last duration of each stage of the current node."""
+        return {} if self.source is None else self.source.timings
+
+    def frame_count(self):
+        """The number of frames that can be selected.
 
-        Load the dataset into memory from file if it is not currently
-        cached.  If the array is a monochrome or RGB(A) 2D image, simply
-        return it.  If the image is 4D, select the frame from the spin
-        box and return that frame.  Otherwise, if the image is a (N,H,W)
-        array, apply the selected filter.  If the filter returns
-        ``None``, get the index from the spin box and return that frame.
+        Returns
+        -------
+
+        ret : int or ``None``
+            The depth of a (N,H,W) or (N,H,W,3) node that is not being
+            reduced by a filter or ``None`` for single images.
 
         """
-        logger = logging.getLogger(__name__ +".ColorRow.get_frame")
-        if self.data is None:
+        if self.source is None:
             return None
 
-        idx = self._spin_box.value()
-        if not self.cached:
-            logger.debug("Recomputing the array")
-            self.filtered = False
-            if self.data.ndim == 2:
-                self._array = self.data.read().transpose((
-                    int(self._order["2D"]["Height"]),
-                    int(self._order["2D"]["Width"])
-                ))
-                logger.debug("Found 2D array!")
-            elif self.data.ndim == 3:
-                if self.node_is_2d():
-                    self._array = self.data.read().transpose((
-                        int(self._order["2D"]["Height"]),
-                        int(self._order["2D"]["Width"]),
-                        int(self._order["2D"]["RGB(A)"])
-                    ))
-                    self.filtered = True
-                    logger.debug("Found 2D array!")
-                else:
-                    self._array = self.data.read().transpose((
-                        int(self._order["3D"]["Depth"]),
-                        int(self._order["3D"]["Height"]),
-                        int(self._order["3D"]["Width"])
-                    ))
-                    ret = self._filters.apply(self._array)
-                    if ret is not None:
-                        self._array = ret
-                        self.filtered = True
-                    logger.debug("Found 3D array!")
-            else:
-                self._array = self.data.read().transpose((
-                    int(self._order["4D"]["Depth"]),
-                    int(self._order["4D"]["Height"]),
-                    int(self._order["4D"]["Width"]),
-                    int(self._order["4D"]["RGB(A)"])
-                ))
-                logger.debug("Found 4D array!")
+        return self.source.frame_count()
 
-            self.cached = True
+    def frame_key(self, idx=None):
+        """Identify the frame :meth:`get_frame` would return.
 
-        if self.data.ndim == 4:
-            ret = self._array[idx,:,:,:]
-        elif self.data.ndim == 3 and not self.filtered:
-            ret = self._array[idx,:,:]
-        else:
-            ret = self._array
+        The key changes whenever the node, the filter, or the selected
+        frame changes, so the frame and anything computed from it may
+        be reused while it stays the same.
+
+        Parameters
+        ----------
+
+        idx : int, optional
+            The frame instead of the one in the spin box.
 
-        return ret
+        Returns
+        -------
+
+        ret : tuple or ``None``
+            The key or ``None`` if no node is selected.
+
+        """
+        if self.source is None:
+            return None
+        elif self.frame_count() is None:
+            idx = None
+        elif idx is None:
+            idx = self._spin_box.value()
+
+        return (self._generation, idx)
+
+    def get_frame(self, idx=None, block=False):
+        """Return the currently selected frame.
+
+        The frame is extracted by the :class:`core.FrameSource` of the
+        current node.  If the array is a monochrome or RGB(A) 2D image,
+        it is simply returned.  If the image is 4D, select the frame
+        from the spin box and return that frame.  Otherwise, if the
+        image is a (N,H,W) array, apply the selected filter.  If there
+        is no filter, get the index from the spin box and return that
+        frame.
+
+        If the node has to be read first, the read is started on a
+        worker thread and ``None`` is returned unless ``block`` is set.
+        :attr:`frame_changed` is emitted once the read finishes.
+
+        Parameters
+        ----------
+
+        idx : int, optional
+            The frame to return instead of the one in the spin box.
+        block : bool, optional
+            Read the node on the calling thread if needed.
+
+        """
+        if self.source is None:
+            return None
+
+        if idx is None:
+            idx = self._spin_box.value()
+
+        if self.source.needs_read and not block:
+            if self._loader is None:
+                self._start_load()
+
+            return None
 
+        return self.source.get_frame(idx)
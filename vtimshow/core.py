@@ -0,0 +1,927 @@
+#!/usr/bin/env python3
+__doc__="""The compute core shared by the widgets and the batch tools.
+
+Nothing in this module touches a Qt widget, so it may be used from
+worker threads, worker processes, tests, and benchmarks without a
+``QApplication``.  The widgets only translate their spin boxes and
+combo boxes into calls to the functions and classes defined here:
+
+* :func:`resolve_axes` turns the :class:`preferences.Preferences` into
+  the transpose of a node,
+* :func:`read_frame`, :func:`read_block`, and :class:`FrameSource`
+  extract frames,
+* :func:`apply_filter` runs a ``vtimshow.filters`` plugin, which
+  :class:`FrameSource` does in a worker process,
+* :data:`OPERATIONS` holds the frame math which :func:`iter_cube`
+  applies to whole cubes and :class:`FramePipeline` recomputes
+  incrementally, and
+* :func:`frame_metrics` compares two cubes frame by frame.
+
+Every read holds :data:`utils.hdf5_lock`, so the loaders of several
+widgets never call into HDF5 at the same time.
+
+"""
+import collections
+import logging
+
+import numpy
+
+from .chunks import chunk_reader
+from .diskcache import disk_cache
+from .lazy import LazyCube
+from .memmap import memmap_node
+from .memory import budget
+from .temporal import SlidingWindow
+from .utils import divide, hdf5_lock, reciprocal, result_dtype
+from .utils import subtract, timed
+from .worker import run_filter, run_lazy_filter
+
+def resolve_axes(shape, order):
+    """Find the transpose that puts a node in the preferred order.
+
+    Parameters
+    ----------
+
+    shape : tuple
+        The shape of the node as stored.
+    order : :class:`preferences.Preferences`
+        The preferred order of the dimensions.
+
+    Returns
+    -------
+
+    axes : tuple
+        The axes to pass to ``transpose``.  The result is (H,W),
+        (H,W,3), (N,H,W), or (N,H,W,3).
+    has_depth : bool
+        ``True`` if the first transposed axis is the depth.
+
+    Raises
+    ------
+
+    ValueError
+        If the node is not 2D, 3D, or 4D.
+
+    """
+    ndim = len(shape)
+    if ndim == 2:
+        dims, section = ("Height", "Width"), "2D"
+    elif ndim == 3 and shape[int(order["2D"]["RGB(A)"])] in (3,4):
+        dims, section = ("Height", "Width", "RGB(A)"), "2D"
+    elif ndim == 3:
+        dims, section = ("Depth", "Height", "Width"), "3D"
+    elif ndim == 4:
+        dims, section = ("Depth", "Height", "Width", "RGB(A)"), "4D"
+    else:
+        raise ValueError("Array must be 2D, 3D, or 4D")
+
+    axes = tuple(int(order[section][dim]) for dim in dims)
+    return axes, dims[0] == "Depth"
+
+def read_frame(node, index, order):
+    """Read one frame of a 3D or 4D node.
+
+    Only the requested frame is read from the file.  It is then
+    transposed to (H,W) or (H,W,3) following the preferences.
+
+    Parameters
+    ----------
+
+    node : :class:`tables.Array`
+        The (N,H,W) or (N,H,W,3) node in any order.
+    index : int
+        The index along the depth dimension.
+    order : mapping
+        The '3D' or '4D' section of :class:`preferences.Preferences`
+        matching ``node.ndim``.
+
+    Returns
+    -------
+
+    ret : :class:`numpy.ndarray`
+        The frame.
+
+    """
+    depth = int(order["Depth"])
+    axes = [
+        int(order[dim]) for dim in ("Height", "Width", "RGB(A)")
+        if dim in order
+    ]
+    select = [slice(None)] *node.ndim
+    select[depth] = index
+    with hdf5_lock:
+        frame = node[tuple(select)]
+
+    # Dropping the depth shifts the trailing axes down by one.
+    return frame.transpose([axis -(axis > depth) for axis in axes])
+
+def read_block(node, start, stop, order):
+    """Read a block of frames of a 3D or 4D node.
+
+    Parameters
+    ----------
+
+    node : :class:`tables.Array`
+        The (N,H,W) or (N,H,W,3) node in any order.
+    start, stop : int
+        The range of indexes along the depth dimension.
+    order : :class:`preferences.Preferences`
+        The preferred order of the dimensions.
+
+    Returns
+    -------
+
+    ret : :class:`numpy.ndarray`
+        The (n,H,W) or (n,H,W,3) block.
+
+    """
+    axes, _ = resolve_axes(node.shape, order)
+    return LazyCube(chunk_reader(node)).transpose(axes)[start:stop].read()
+
+class Cancelled(Exception):
+    """Raised when a read is cancelled."""
+
+def read_node(node, progress=None, cancelled=None, block=2**24):
+    """Read a full node in blocks along its first dimension.
+
+    Reading in blocks lets a long read report its progress and stop
+    early.  The blocks are aligned to the chunks of chunked nodes and
+    hold about ``block`` bytes.  The chunks of compressed nodes are
+    decoded in parallel by :func:`chunks.chunk_reader`.
+
+    Parameters
+    ----------
+
+    node : :class:`tables.Array`
+        The node to read.
+    progress : callable, optional
+        Called as ``progress(done, total)`` in bytes after each block.
+    cancelled : callable, optional
+        Called before each block.  If it returns ``True``, the read
+        stops by raising :class:`Cancelled`.
+    block : int, optional
+        The target size of a block in bytes.
+
+    Returns
+    -------
+
+    ret : :class:`numpy.ndarray`
+        The contents of the node.
+
+    """
+    ret = numpy.empty(node.shape, dtype=node.dtype)
+    if ret.size == 0:
+        return ret
+
+    reader = chunk_reader(node)
+    rows = node.shape[0]
+    rowbytes = ret.nbytes //rows
+    step = max(block //max(rowbytes, 1), 1)
+    chunk = (node.chunkshape or (1,))[0]
+    step = max(step //chunk, 1) *chunk
+    for start in range(0, rows, step):
+        if cancelled is not None and cancelled():
+            raise Cancelled()
+
+        stop = min(start +step, rows)
+        if reader is node:
+            with hdf5_lock:
+                node.read(start, stop, out=ret[start:stop])
+        else:
+            ret[start:stop] = reader[start:stop]
+        if progress is not None:
+            progress(stop *rowbytes, ret.nbytes)
+
+    return ret
+
+def apply_filter(name, compute, array):
+    """Apply a filter plugin to a (N,H,W) array.
+
+    If the plugin raises a ``RuntimeError``, it is reported to the
+    logger as a warning and ``None`` is returned.
+
+    Parameters
+    ----------
+
+    name : string
+        The name of the filter for the log.
+    compute : callable
+        The ``compute`` method of the plugin.
+    array : :class:`numpy.ndarray`
+        The 3D image array to pass to the filter.
+
+    Returns
+    -------
+
+    ret : :class:`numpy.ndarray` or ``None``
+        The filtered array or ``None``
+
+    """
+    logger = logging.getLogger(__name__ +".apply_filter")
+    try:
+        ret = compute(array)
+    except RuntimeError as err:
+        logger.warning("Error applying {0:s}.  Message {1!s}".format(
+            name, err
+        ))
+        ret = None
+
+    return ret
+
+def _rgb(R, G, B, precision="native"):
+    """Stack the channels into an (H,W,3) image."""
+    return numpy.stack(numpy.broadcast_arrays(R, G, B), axis=-1)
+
+OPERATIONS = collections.OrderedDict((
+    ("R", lambda R, G, B, precision="native": R),
+    ("RGB", _rgb),
+    ("R - G", lambda R, G, B, precision="native":
+        subtract(R, G, precision)),
+    ("R / G", lambda R, G, B, precision="native":
+        divide(R, G, precision=precision)),
+    ("(R - G) / B", lambda R, G, B, precision="native":
+        divide(
+            subtract(R, G, precision), B, precision=precision,
+            sources=(R.dtype, G.dtype, B.dtype)
+        )),
+))
+"""The frame math operations accessed by label.
+
+Each operation is called as ``operation(R, G, B, precision)`` where the
+channels not used by the operation may be ``None``.
+"""
+
+CHANNELS = {"R": 1, "RGB": 3, "R - G": 2, "R / G": 2, "(R - G) / B": 3}
+"""The number of leading channels used by each operation."""
+
+def _iter_blocks(channels, count, block, progress, cancelled,
+                 expansion=0):
+    """Read matching depth blocks of the channels.
+
+    See :func:`iter_cube` for the parameters.  The progress is reported
+    once the consumer asks for the next block.  The consumer may hold
+    ``expansion`` bytes of temporaries per element of a frame, which
+    count against ``block`` together with the frames read.
+
+    """
+    cubes = [
+        channel for channel in channels
+        if isinstance(channel, FrameSource)
+    ]
+    framebytes = sum(cube.nbytes //cube.frame_count() for cube in cubes)
+    if cubes and expansion > 0:
+        framebytes += expansion *max(
+            cube.nbytes //cube.frame_count() //cube.node.dtype.itemsize
+            for cube in cubes
+        )
+
+    step = max(block //max(framebytes, 1), 1)
+    for start in range(0, count, step):
+        if cancelled is not None and cancelled():
+            raise Cancelled()
+
+        stop = min(start +step, count)
+        yield start, [
+            channel.read_block(start, stop)
+            if isinstance(channel, FrameSource) else channel
+            for channel in channels
+        ]
+        if progress is not None:
+            progress(stop, count)
+
+def iter_cube(label, channels, count, precision="native", block=2**24,
+              progress=None, cancelled=None):
+    """Apply the operation ``label`` to every frame in depth blocks.
+
+    Each channel is either a :class:`FrameSource` of a cube, which is
+    read ``block`` bytes at a time, or a single image broadcast against
+    every frame, so only one block of each cube is in memory at once.
+
+    Parameters
+    ----------
+
+    label : string
+        The key of the operation in :data:`OPERATIONS`.
+    channels : sequence
+        The R, G, and B channels.  Each is a :class:`FrameSource` with
+        frames, a :class:`numpy.ndarray`, or ``None`` if unused.
+    count : int
+        The number of frames to compute.
+    precision : string, optional
+        The precision policy of :func:`utils.result_dtype`.
+    block : int, optional
+        The target size in bytes of the frames read per block.
+    progress : callable, optional
+        Called as ``progress(done, count)`` after each block.
+    cancelled : callable, optional
+        Called before each block.  If it returns ``True``, the
+        iteration raises :class:`Cancelled`.
+
+    Yields
+    ------
+
+    start : int
+        The index of the first frame of the block.
+    result : :class:`numpy.ndarray`
+        The (n,H,W) or (n,H,W,3) result of the block.
+
+    """
+    for start, (R, G, B) in _iter_blocks(
+            channels, count, block, progress, cancelled):
+        yield start, OPERATIONS[label](R, G, B, precision=precision)
+
+METRICS = ("RMSE", "Correlation", "Max abs difference")
+"""The frame comparisons computed by :func:`frame_metrics`."""
+
+_METRICS_EXPANSION = 6 *8
+"""The bytes :func:`_block_metrics` holds per element of a frame.
+
+Both cubes are converted to ``float64`` and, at the peak, the
+difference, the centered cubes, and one product are held as well.
+
+"""
+
+def _block_metrics(A, B):
+    """Compare the frames of two (n,...) blocks."""
+    A, B = numpy.broadcast_arrays(
+        numpy.asarray(A, dtype=numpy.float64),
+        numpy.asarray(B, dtype=numpy.float64)
+    )
+    A = A.reshape(len(A), -1)
+    B = B.reshape(len(B), -1)
+    difference = A -B
+    rmse = numpy.sqrt(numpy.mean(difference *difference, axis=1))
+    largest = numpy.abs(difference, out=difference).max(axis=1)
+
+    A = A -A.mean(axis=1, keepdims=True)
+    B = B -B.mean(axis=1, keepdims=True)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        # Flat frames have no correlation and give NaN.
+        correlation = numpy.sum(A *B, axis=1) /numpy.sqrt(
+            numpy.sum(A *A, axis=1) *numpy.sum(B *B, axis=1)
+        )
+
+    return rmse, correlation, largest
+
+def frame_metrics(A, B, count, block=2**24, progress=None,
+                  cancelled=None):
+    """Compare two cubes frame by frame in depth blocks.
+
+    Matching blocks of both cubes are read together, like
+    :func:`iter_cube`, and every metric of :data:`METRICS` is computed
+    for all of the frames of the block at once.
+
+    Parameters
+    ----------
+
+    A, B : :class:`FrameSource` or :class:`numpy.ndarray`
+        The cubes, or a single image compared with every frame.
+    count : int
+        The number of frames to compare.
+    block, progress, cancelled : optional
+        As for :func:`iter_cube`.  The ``block`` also covers the
+        ``float64`` temporaries of the comparison, so fewer frames are
+        read at once.
+
+    Returns
+    -------
+
+    ret : dict
+        A (count,) ``float64`` array for each name in :data:`METRICS`.
+
+    """
+    ret = {name: numpy.empty(count) for name in METRICS}
+    for start, (A_block, B_block) in _iter_blocks(
+            (A, B), count, block, progress, cancelled,
+            expansion=_METRICS_EXPANSION):
+        metrics = _block_metrics(A_block, B_block)
+        stop = start +len(metrics[0])
+        for name, values in zip(METRICS, metrics):
+            ret[name][start:stop] = values
+
+    return ret
+
+def compute(label, R, G, B, precision="native", rgb=None):
+    """Apply the operation ``label`` of :data:`OPERATIONS`.
+
+    Parameters
+    ----------
+
+    label : string
+        The key of the operation.
+    R, G, B : :class:`numpy.ndarray` or ``None``
+        The channels.
+    precision : string, optional
+        The precision policy of :func:`utils.result_dtype`.
+    rgb : :class:`memory.RGBBuffer`, optional
+        If given, the 'RGB' operation composes into this buffer
+        instead of allocating a new image.
+
+    Returns
+    -------
+
+    ret : :class:`numpy.ndarray`
+        The resulting image.
+
+    """
+    if label == "RGB" and rgb is not None:
+        return rgb.compose(R, G, B)
+
+    return OPERATIONS[label](R, G, B, precision=precision)
+
+class FramePipeline:
+    """Apply :data:`OPERATIONS` reusing the work on unchanged channels.
+
+    Each channel frame is identified by a key chosen by its owner, such
+    as the node and frame index.  A frame is only fetched when its key
+    changes, and the terms that depend only on unchanged channels, like
+    the reciprocal of the divisor or the difference :math:`R - G`, are
+    kept between calls.  Sweeping one channel against fixed others
+    then costs one fetch and the final kernel.
+
+    """
+
+    def __init__(self, precision="native", rgb=None):
+        """Start with no frames.
+
+        Parameters
+        ----------
+
+        precision : string, optional
+            The precision policy of :func:`utils.result_dtype`.
+        rgb : :class:`memory.RGBBuffer`, optional
+            The buffer to compose 'RGB' into.  Only the changed
+            channels are written to it.
+
+        """
+        self.precision = precision
+        self.rgb = rgb
+        self.reset()
+
+    def reset(self):
+        """Forget every frame and term."""
+        self.keys = [None, None, None]
+        self.frames = [None, None, None]
+        self._terms = {}
+        self._composed = [None, None, None]
+
+    def update(self, channel, key, fetch):
+        """Set the frame of a channel if its key changed.
+
+        Parameters
+        ----------
+
+        channel : int
+            0, 1, or 2 for R, G, or B.
+        key : hashable or ``None``
+            The identity of the frame.  ``None`` always fetches.
+        fetch : callable
+            Called without arguments to get the frame.  A frame of
+            ``None`` is not kept.
+
+        Returns
+        -------
+
+        ret : bool
+            ``True`` if the frame was fetched.
+
+        """
+        if key is not None and key == self.keys[channel]:
+            return False
+
+        frame = fetch()
+        self.keys[channel] = None if frame is None else key
+        self.frames[channel] = frame
+        return True
+
+    def _term(self, name, channels, function):
+        """Return the cached ``name`` unless ``channels`` changed."""
+        keys = tuple(self.keys[channel] for channel in channels)
+        cached = self._terms.get(name)
+        if cached is not None and cached[0] == keys and None not in keys:
+            return cached[1]
+
+        value = function()
+        self._terms[name] = (keys, value)
+        return value
+
+    def _quotient(self, A, B, channel, sources=None):
+        """Divide by ``B`` of ``channel`` through its cached reciprocal.
+
+        The ``sources`` are passed to :func:`utils.result_dtype`.
+
+        """
+        dtype = result_dtype("divide", A.dtype, B.dtype,
+                             precision=self.precision, sources=sources)
+        inverse = self._term(
+            ("reciprocal", channel, dtype), (channel,),
+            lambda: reciprocal(B, dtype)
+        )
+        C = numpy.multiply(A, inverse, dtype=dtype)
+        if A.dtype.kind == "f":
+            C[~numpy.isfinite(C)] = 0.0
+
+        return C
+
+    def compute(self, label):
+        """Apply the operation ``label`` to the current frames.
+
+        Parameters
+        ----------
+
+        label : string
+            The key of the operation in :data:`OPERATIONS`.
+
+        Returns
+        -------
+
+        ret : :class:`numpy.ndarray`
+            The resulting image.
+
+        """
+        R, G, B = self.frames
+        if label == "RGB" and self.rgb is not None:
+            changed = tuple(
+                key is None or key != old
+                for key, old in zip(self.keys, self._composed)
+            )
+            if self.rgb.array is None:
+                changed = (True, True, True)
+
+            self._composed = list(self.keys)
+            return self.rgb.compose(R, G, B, changed=changed)
+        elif label == "R / G":
+            return self._quotient(R, G, 1)
+        elif label == "(R - G) / B":
+            difference = self._term(
+                ("difference", self.precision), (0, 1),
+                lambda: subtract(R, G, self.precision)
+            )
+            return self._quotient(
+                difference, B, 2, sources=(R.dtype, G.dtype, B.dtype)
+            )
+
+        return OPERATIONS[label](R, G, B, precision=self.precision)
+
+class FrameSource:
+    """The frames of a node in the preferred order.
+
+    This holds the logic behind :meth:`ColorRow.get_frame`.  The node is
+    read and transposed on first use and the result is registered with
+    the :data:`memory.budget`.  A (N,H,W) node may be reduced to a
+    single image by a filter.  The result of each filter is cached next
+    to the cube under the filter name and version, and each is evicted
+    on its own, so switching back and forth between filters only
+    computes each result once.  The results are also kept across
+    sessions by the :data:`diskcache.disk_cache`.  If an unfiltered
+    cube can never fit in the budget, single frames are read directly
+    from the node instead through the :class:`lazy.LazyCube` view
+    :attr:`cube`.  Contiguous uncompressed nodes are served from the
+    read-only memory map :attr:`mapped` and are never copied or counted
+    in the budget.  The frames of a cube may be replaced by a
+    :class:`temporal.SlidingWindow` of them with :meth:`set_window`.
+
+    """
+
+    def __init__(self, node, order, owner=None):
+        """Wrap a node.
+
+        Parameters
+        ----------
+
+        node : :class:`tables.Array`
+            A 2D, 3D, or 4D numeric node.
+        order : :class:`preferences.Preferences`
+            The preferred order of the dimensions.
+        owner : object, optional
+            The object the cached arrays are accounted to in the
+            budget.  Defaults to the source itself.
+
+        """
+        self.node = node
+        self.order = order
+        self.axes, self.has_depth = resolve_axes(node.shape, order)
+        self.cube = LazyCube(chunk_reader(node)).transpose(self.axes)
+        self.mapped = memmap_node(node)
+        self._mapped_cube = None if self.mapped is None \
+            else self.mapped.transpose(self.axes)
+        self.filter_name = None
+        self.filter_version = None
+        self._compute = None
+        self.window = None
+        self.timings = {}
+        self._owner = id(self if owner is None else owner)
+        self._key = (self._owner, "array")
+        self._array = None
+        self._results = {}
+
+    @property
+    def nbytes(self):
+        """The size of the full node in memory."""
+        return int(numpy.prod(self.node.shape)) *self.node.dtype.itemsize
+
+    def _result_key(self, key):
+        """The budget key of the result of the filter ``key``."""
+        name, version = key
+        return (self._owner, "{0:s} filter".format(name), version)
+
+    def _release_array(self):
+        """Drop the cached cube so it is reloaded on demand."""
+        self._array = None
+
+    def _release_result(self, key):
+        """Drop the cached result of the filter ``key``."""
+        self._results.pop(key, None)
+
+    def release(self):
+        """Drop the cube and every filter result."""
+        self._release_array()
+        self._results.clear()
+
+    def close(self):
+        """Release the arrays and remove them from the budget."""
+        budget.unregister(self._key)
+        for key in self._results:
+            budget.unregister(self._result_key(key))
+
+        self.release()
+
+    def set_filter(self, name, compute, version=None):
+        """Select the filter applied to a (N,H,W) node.
+
+        Parameters
+        ----------
+
+        name : string or ``None``
+            The name of the filter.
+        compute : callable or ``None``
+            The ``compute`` method of the plugin.  ``None`` disables
+            filtering.
+        version : string, optional
+            The version of the filter identifying its cached results.
+
+        """
+        self.filter_name = name
+        self.filter_version = version
+        self._compute = compute
+
+    def set_window(self, statistic=None, size=1):
+        """Replace the frames of a cube by a sliding window statistic.
+
+        Parameters
+        ----------
+
+        statistic : string, optional
+            One of :data:`temporal.STATISTICS`.  ``None`` shows the
+            frames as stored.
+        size : int, optional
+            The number of frames in the window.
+
+        """
+        if statistic is None or not self.has_depth:
+            self.window = None
+        else:
+            self.window = SlidingWindow(
+                self._read_frames, self.node.shape[self.axes[0]],
+                statistic, size
+            )
+
+    @property
+    def window_spec(self):
+        """The statistic and size of the window or ``None``."""
+        if self.window is None:
+            return None
+
+        return self.window.statistic, self.window.size
+
+    def _filter_key(self):
+        """The cache key of the current filter or ``None``."""
+        if self.node.ndim != 3 or self._compute is None:
+            return None
+
+        return (self.filter_name, self.filter_version)
+
+    def frame_count(self):
+        """The number of frames or ``None`` for a single image."""
+        if not self.has_depth:
+            return None
+        elif self._filter_key() is not None:
+            return None
+
+        return self.node.shape[self.axes[0]]
+
+    @property
+    def needs_read(self):
+        """``True`` if the next frame requires reading the full node.
+
+        This includes computing a filter result that is not cached.
+
+        """
+        key = self._filter_key()
+        if key is not None and key not in self._results:
+            return True
+        elif key is not None and self._results[key] is not None:
+            return False
+
+        return self._cached_array() is None and not self._read_lazily()
+
+    def _cached_array(self):
+        """The cube in memory or in the memory map, if available."""
+        if self._array is not None:
+            return self._array
+        elif self.mapped is not None:
+            return self._mapped_cube
+
+        return None
+
+    def _read_lazily(self):
+        """Check if single frames should be read from the node."""
+        return self.has_depth and self.mapped is None \
+            and not budget.fits(self.nbytes)
+
+    def _read_array(self, progress=None, cancelled=None):
+        """Read the full node in the preferred order."""
+        with timed(self.timings, "read"):
+            array = read_node(self.node, progress, cancelled)
+
+        with timed(self.timings, "transpose"):
+            return array.transpose(self.axes)
+
+    def _disk_key(self, key):
+        """The :data:`diskcache.disk_cache` key of the filter ``key``."""
+        if key is None or disk_cache.limit <= 0:
+            return None
+
+        try:
+            return disk_cache.key(self.node, self.axes, *key)
+        except OSError:
+            # The node is not backed by a file on disk.
+            return None
+
+    def compute_array(self, progress=None, cancelled=None):
+        """Read, transpose, and filter the node.
+
+        The cube is only read if it is not already available.  This
+        does not change the state of the source, so it may run on a
+        worker thread while the result is passed to :meth:`install` on
+        the thread owning the source.
+
+        Parameters
+        ----------
+
+        progress, cancelled : callable, optional
+            Passed to :func:`read_node`.  The filter runs in a worker
+            process with :func:`worker.run_filter`, which checks
+            ``cancelled`` as well.  A ``compute`` function with a true
+            ``lazy`` attribute reads the cube in blocks itself, so it
+            is passed :attr:`cube` and run on the calling thread by
+            :func:`worker.run_lazy_filter`, which passes it
+            ``cancelled``.
+
+        Returns
+        -------
+
+        array : :class:`numpy.ndarray` or ``None``
+            The array in the preferred order.  It is ``None`` if the
+            filter result was found in the disk cache without reading
+            the node.
+        key : tuple or ``None``
+            The filter that was applied.
+        result : :class:`numpy.ndarray` or ``None``
+            The filtered image or ``None`` if the filter failed.
+
+        """
+        key = self._filter_key()
+        disk_key = self._disk_key(key)
+        if disk_key is not None:
+            with timed(self.timings, "disk cache"):
+                result = disk_cache.get(disk_key)
+
+            if result is not None:
+                return self._array, key, result
+
+        lazy = key is not None and getattr(self._compute, "lazy", False)
+        array = self._cached_array()
+        if array is None and not lazy:
+            array = self._read_array(progress, cancelled)
+
+        result = None
+        if lazy:
+            # The filter reads the cube in blocks itself, so it is not
+            # copied to a worker process.
+            with timed(self.timings, "filter"):
+                result = run_lazy_filter(
+                    self.filter_name, self._compute,
+                    self.cube if array is None else array, cancelled
+                )
+        elif key is not None:
+            # The filter reads a mapped cube through the page cache.
+            with timed(self.timings, "filter"):
+                result = run_filter(
+                    self.filter_name, self._compute, array, cancelled
+                )
+
+        if disk_key is not None and result is not None:
+            disk_cache.put(
+                disk_key, result, node=self.node._v_pathname,
+                filter=self.filter_name, version=self.filter_version or ""
+            )
+
+        return array, key, result
+
+    def install(self, array, key, result):
+        """Cache the results of :meth:`compute_array`."""
+        if array is not None and self._array is None \
+                and self.mapped is None \
+                and (not self.has_depth or budget.fits(array.nbytes)):
+            self._array = array
+            budget.register(self._key, array.nbytes, self._release_array)
+
+        if key is not None:
+            self._results[key] = result
+            if result is not None:
+                budget.register(
+                    self._result_key(key), result.nbytes,
+                    lambda: self._release_result(key)
+                )
+
+    def _read_frames(self, start, stop):
+        """Return frames ``start`` to ``stop`` as stored.
+
+        The frames are taken from the cached array if there is one.
+        Otherwise, only those frames are read from the node and they
+        are not cached.
+
+        """
+        array = self._cached_array()
+        if array is not None:
+            budget.touch(self._key)
+            return array[start:stop]
+
+        with timed(self.timings, "read"):
+            return self.cube[start:stop].read()
+
+    def read_block(self, start, stop):
+        """Return frames ``start`` to ``stop`` of a cube.
+
+        The frames are those of the sliding window, if one is set, and
+        otherwise those stored in the node.
+
+        Parameters
+        ----------
+
+        start, stop : int
+            The range of indexes along the depth.
+
+        """
+        if self.window is not None:
+            with timed(self.timings, "window"):
+                return self.window.read(start, stop)
+
+        return self._read_frames(start, stop)
+
+    def get_frame(self, idx=0):
+        """Return frame ``idx``.
+
+        Single images and filtered cubes are returned regardless of
+        ``idx``.
+
+        Parameters
+        ----------
+
+        idx : int, optional
+            The index along the depth.
+
+        """
+        logger = logging.getLogger(__name__ +".FrameSource.get_frame")
+        key = self._filter_key()
+        if key is not None:
+            if key in self._results:
+                result = self._results[key]
+                budget.touch(self._result_key(key))
+            else:
+                array, key, result = self.compute_array()
+                self.install(array, key, result)
+
+            if result is not None:
+                return result
+
+            # The filter failed, so show the frames instead.
+
+        array = self._cached_array()
+        if array is None and self._read_lazily():
+            logger.debug("Reading {0!s} lazily".format(self.node))
+        elif array is None:
+            array = self._read_array()
+            self.install(array, None, None)
+        else:
+            budget.touch(self._key)
+
+        if self.window is not None:
+            with timed(self.timings, "window"):
+                return self.window[idx]
+        elif array is None:
+            with timed(self.timings, "read"):
+                return self.cube[idx].read()
+
+        return array if not self.has_depth else array[idx]
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+__doc__="""The persistent cache of filter results.
+
+Filters can take minutes on large cubes, so their results are kept on
+disk between sessions.  Each result is stored in its own small HDF5
+file in the user cache directory, named by a hash of everything the
+result depends on: the identity and modification time of the source
+file, the node path, the axis order, and the filter name and version.
+Editing the source file or upgrading the filter therefore misses the
+cache instead of returning a stale result.  The files are evicted in
+least recently used order once their total size exceeds the limit set
+in the :class:`preferences.Preferences`.  The files are read and written
+on the loader threads while holding :data:`utils.hdf5_lock`.
+
+"""
+import hashlib
+import logging
+import os
+import tempfile
+
+import numpy
+import tables
+
+from .preferences import Preferences
+from .utils import hdf5_lock
+
+def default_directory():
+    """The directory holding the cache files.
+
+    This is ``$VTIMSHOW_CACHE_DIR`` if it is set and otherwise
+    ``vtimshow`` in ``$XDG_CACHE_HOME`` or ``~/.cache``.
+
+    """
+    if "VTIMSHOW_CACHE_DIR" in os.environ:
+        return os.environ["VTIMSHOW_CACHE_DIR"]
+
+    base = os.environ.get(
+        "XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")
+    )
+    return os.path.join(base, "vtimshow")
+
+class DiskCache:
+    """Store arrays in HDF5 files with LRU eviction by total size.
+
+    The last use of an entry is the modification time of its file.
+
+    """
+
+    def __init__(self, directory, limit=0):
+        """Initialize the cache.
+
+        Parameters
+        ----------
+
+        directory : string
+            The directory of the cache files.  It is created on the
+            first write.
+        limit : int, optional
+            The maximum total size in bytes.  A value of 0 disables
+            the cache.
+
+        """
+        self.directory = directory
+        self.limit = limit
+
+    def key(self, node, axes, name, version):
+        """Identify the result of a filter on a node.
+
+        Parameters
+        ----------
+
+        node : :class:`tables.Array`
+            The filtered node.
+        axes : tuple
+            The transpose applied before filtering.
+        name, version : string
+            The filter.
+
+        Returns
+        -------
+
+        ret : string
+            The hexadecimal key.
+
+        """
+        filename = os.path.realpath(node._v_file.filename)
+        stat = os.stat(filename)
+        parts = (
+            filename, stat.st_dev, stat.st_ino, stat.st_size,
+            stat.st_mtime_ns, node._v_pathname, tuple(axes), name,
+            version
+        )
+        return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        """The file holding ``key``."""
+        return os.path.join(self.directory, key +".h5")
+
+    def get(self, key):
+        """Load the array stored under ``key``.
+
+        Returns
+        -------
+
+        ret : :class:`numpy.ndarray` or ``None``
+            The array or ``None`` on a miss.
+
+        """
+        logger = logging.getLogger(__name__ +".DiskCache.get")
+        path = self._path(key)
+        if self.limit <= 0 or not os.path.exists(path):
+            return None
+
+        try:
+            with hdf5_lock, tables.open_file(path, "r") as h5:
+                ret = h5.root.result.read()
+
+            os.utime(path)
+        except (OSError, tables.HDF5ExtError, tables.NoSuchNodeError) \
+                as err:
+            # A truncated or corrupt file would fail on every attempt.
+            logger.warning("Discarding {0:s}.  {1!s}".format(path, err))
+            self._remove(path)
+            return None
+
+        logger.debug("Hit {0:s}".format(key))
+        return ret
+
+    def put(self, key, array, **attrs):
+        """Store ``array`` under ``key`` and evict old entries.
+
+        The file is written under a temporary name and then renamed, so
+        a reader never sees a partial file.
+
+        Parameters
+        ----------
+
+        key : string
+            The key from :meth:`key`.
+        array : :class:`numpy.ndarray`
+            The array to store.
+        attrs : dict
+            Descriptive attributes, such as the filter name, stored
+            with the array.
+
+        """
+        logger = logging.getLogger(__name__ +".DiskCache.put")
+        if self.limit <= 0 or array.nbytes > self.limit:
+            return
+
+        tmp = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fid, tmp = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+            os.close(fid)
+            with hdf5_lock, tables.open_file(tmp, "w") as h5:
+                node = h5.create_carray(
+                    "/", "result", obj=numpy.ascontiguousarray(array),
+                    filters=tables.Filters(complevel=1, complib="zlib")
+                )
+                for name, value in attrs.items():
+                    node.attrs[name] = value
+
+            os.replace(tmp, self._path(key))
+        except (OSError, tables.HDF5ExtError) as err:
+            logger.warning("Unable to cache {0:s}.  {1!s}".format(key, err))
+            if tmp is not None:
+                self._remove(tmp)
+
+            return
+
+        self.evict()
+
+    def entries(self):
+        """List the ``(mtime, size, path)`` of every cache file."""
+        ret = []
+        if not os.path.isdir(self.directory):
+            return ret
+
+        for name in os.listdir(self.directory):
+            if not name.endswith(".h5"):
+                continue
+
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+
+            ret.append((stat.st_mtime, stat.st_size, path))
+
+        return ret
+
+    @property
+    def used(self):
+        """The total size of the cache files in bytes."""
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """Remove the least recently used files above the limit."""
+        logger = logging.getLogger(__name__ +".DiskCache.evict")
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.limit:
+                break
+
+            logger.debug("Evicting {0:s}".format(path))
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        """Remove every cache file."""
+        for _, _, path in self.entries():
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        """Remove ``path`` ignoring races with other processes."""
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def _load_limit():
+    """Read the size of the cache from the preferences in bytes."""
+    try:
+        megabytes = int(Preferences()["Memory"]["DiskCache"])
+    except ValueError:
+        megabytes = 0
+
+    return max(megabytes, 0) *1024**2
+
+disk_cache = DiskCache(default_directory(), _load_limit())
+"""The filter cache shared by the plugin."""
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+__doc__="""Write derived frames and cubes back to HDF5.
+
+The functions here create a new PyTables node laid out for reading one
+frame at a time and stream frames into it in blocks of whole chunks.
+Only one block of frames is ever held in memory, so the exported cube
+does not have to fit in RAM.  The writes hold :data:`utils.hdf5_lock`
+like every other call into HDF5.
+
+"""
+import itertools
+import logging
+
+import numpy
+import tables
+
+from .utils import hdf5_lock
+
+def frame_filters():
+    """The compression used for exported nodes.
+
+    Blosc with byte shuffling is preferred because it decompresses
+    quickly.  Zlib is used if PyTables was built without Blosc.
+
+    """
+    if tables.which_lib_version("blosc") is not None:
+        return tables.Filters(complevel=4, complib="blosc", shuffle=True)
+
+    return tables.Filters(complevel=4, complib="zlib", shuffle=True)
+
+def frame_chunkshape(count, frame_shape, itemsize, target=2**20):
+    """Choose a chunk shape for frame by frame access.
+
+    A chunk holds a single frame unless the frames are so small that
+    several fit within ``target`` bytes.
+
+    >>> frame_chunkshape(100, (512, 512), 4)
+    (1, 512, 512)
+    >>> frame_chunkshape(100, (16, 16), 4)
+    (100, 16, 16)
+
+    Parameters
+    ----------
+
+    count : int
+        The number of frames.
+    frame_shape : tuple
+        The shape of one frame.
+    itemsize : int
+        The size of one element in bytes.
+    target : int, optional
+        The preferred maximum size of a chunk in bytes.
+
+    Returns
+    -------
+
+    ret : tuple
+        The chunk shape.
+
+    """
+    nbytes = max(int(numpy.prod(frame_shape)) *itemsize, 1)
+    frames = min(max(target //nbytes, 1), max(count, 1))
+    return (frames,) +tuple(frame_shape)
+
+def create_frame_node(h5, where, name, count, frame_shape, dtype,
+                      overwrite=False):
+    """Create a (count,) + frame_shape node chunked by frames.
+
+    Parameters
+    ----------
+
+    h5 : :class:`tables.File`
+        The file opened for writing.
+    where : string
+        The path of the parent group.  It is created if needed.
+    name : string
+        The name of the new node.
+    count : int
+        The number of frames.
+    frame_shape : tuple
+        The shape of one frame.
+    dtype : :class:`numpy.dtype`
+        The type of the frames.
+    overwrite : bool, optional
+        Remove an existing node of the same name first.
+
+    Returns
+    -------
+
+    ret : :class:`tables.CArray`
+        The new node.
+
+    """
+    dtype = numpy.dtype(dtype)
+    if overwrite and where.rstrip("/") +"/" +name in h5:
+        h5.remove_node(where, name)
+
+    return h5.create_carray(
+        where, name,
+        atom=tables.Atom.from_dtype(dtype),
+        shape=(count,) +tuple(frame_shape),
+        chunkshape=frame_chunkshape(count, frame_shape, dtype.itemsize),
+        filters=frame_filters(),
+        createparents=True
+    )
+
+def write_frames(node, frames):
+    """Stream ``frames`` into ``node`` one chunk of frames at a time.
+
+    Parameters
+    ----------
+
+    node : :class:`tables.CArray`
+        A node created by :func:`create_frame_node`.
+    frames : iterable
+        The frames in order.  Iteration may stop early.
+
+    Returns
+    -------
+
+    ret : int
+        The number of frames written.
+
+    """
+    block = numpy.empty(
+        (node.chunkshape[0],) +node.shape[1:], dtype=node.dtype
+    )
+    row = 0
+    fill = 0
+    for frame in frames:
+        block[fill] = frame
+        fill += 1
+        if fill == block.shape[0]:
+            with hdf5_lock:
+                node[row:row +fill] = block
+
+            row += fill
+            fill = 0
+
+    with hdf5_lock:
+        if fill > 0:
+            node[row:row +fill] = block[:fill]
+            row += fill
+
+        node.flush()
+
+    return row
+
+def export_frames(filename, nodepath, frames, count, overwrite=False):
+    """Export a sequence of frames to a new node.
+
+    The node is created from the shape and dtype of the first frame.  A
+    single image is exported by passing ``count=1``.  If ``frames``
+    raises, such as :class:`core.Cancelled`, or yields fewer than
+    ``count`` frames, the node is removed again and the error is
+    raised.
+
+    Parameters
+    ----------
+
+    filename : string
+        The HDF5 file.  It is created if it does not exist.
+    nodepath : string
+        The full path of the new node.
+    frames : iterable
+        The frames to write.
+    count : int
+        The number of frames expected from ``frames``.
+    overwrite : bool, optional
+        Replace an existing node.
+
+    Returns
+    -------
+
+    ret : int
+        The number of frames written.
+
+    Raises
+    ------
+
+    ValueError
+        If ``frames`` yields fewer than ``count`` frames.
+
+    """
+    logger = logging.getLogger(__name__ +".export_frames")
+    frames = iter(frames)
+    try:
+        first = numpy.asarray(next(frames))
+    except StopIteration:
+        return 0
+
+    where, _, name = nodepath.rstrip("/").rpartition("/")
+    # The lock is only held while writing, so the frames may be read
+    # from other files in between.
+    with hdf5_lock:
+        h5 = tables.open_file(filename, "a")
+
+    try:
+        with hdf5_lock:
+            node = create_frame_node(
+                h5, where or "/", name, count, first.shape, first.dtype,
+                overwrite=overwrite
+            )
+
+        try:
+            written = write_frames(node, itertools.chain([first], frames))
+            if written != count:
+                raise ValueError("Expected {0:d} frames, got {1:d}".format(
+                    count, written
+                ))
+        except Exception:
+            # Do not leave a node padded with zeros behind.
+            with hdf5_lock:
+                node.remove()
+
+            raise
+    finally:
+        with hdf5_lock:
+            h5.close()
+
+    logger.debug("Wrote {0:d} frames to {1:s}:{2:s}".format(
+        written, filename, nodepath
+    ))
+    return written
@@ -5,10 +5,22 @@ The primary item defined in this package is :class:`Filters` which is
 simply an extension of :class:`PyQt4.QtGui.QComboBox` that adds support
 for loading user defined filters along with those distributed with this
 package.  The default filters provided are a “Null” filter that does
-nothing and filters based on the red, green, and blue response of the 
-human eye.
+nothing, filters based on the red, green, and blue response of the
+human eye, and the first three principal components of the cube.
+:func:`load_filters` and the filters themselves do not need Qt, so
+:class:`Filters` is only imported on first use.
 
 """
 
-from .filters import Filters
+from .entrypoints import load_filters
+
+def __getattr__(name):
+    """Import the :class:`Filters` combo box on first use."""
+    if name == "Filters":
+        from .filters import Filters
+        return Filters
+
+    raise AttributeError(
+        "module {0!r} has no attribute {1!r}".format(__name__, name)
+    )
 
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+__doc__="""The module loading the filter plugins from their entry points.
+
+Nothing here needs Qt or ViTables, so the headless tools and the
+benchmarks load the filters from this module.
+
+"""
+import logging
+import pkg_resources
+
+from .. import plugin_class
+from ..utils import translate as _translate
+
+def load_filters(versions=None):
+    """Load all filters that pass a quick check.
+
+    To pass the quick check, a filter must define a ``name`` variable
+    and a ``compute`` method at the top scope of the object referenced
+    by an entry point in the ``vtimshow.filters`` group.  This does not
+    need a Qt application so it may be used by headless tools.
+
+    The version of a filter is its ``version`` attribute if it has one
+    and otherwise the version of the distribution providing it.  It
+    identifies cached results of the filter.
+
+    Parameters
+    ----------
+
+    versions : dict, optional
+        If given, it is filled with the version of each filter by name.
+
+    Returns
+    -------
+
+    ret : dict
+        The ``compute`` methods accessed by filter name.
+
+    Raises
+    ------
+
+    RuntimeError:
+        If two plugins have the same value in the ``name`` attribute.
+
+    """
+    logger = logging.getLogger(__name__ +".load_filters")
+    group = ".".join(__name__.split(".")[:-1])
+    ret = {}
+    for entry in pkg_resources.iter_entry_points(group):
+        loaded = entry.load()
+        try:
+            if loaded.name in ret:
+                msg = "{0:s} used twice!  Please contact the " \
+                    +"author(s) of the plugins to establish a " \
+                    +"unique name for each."
+                raise RuntimeError(_translate(
+                    plugin_class,
+                    msg.format(loaded.name),
+                    "Plugin error message"
+                ))
+
+            ret[loaded.name] = loaded.compute
+            if versions is not None:
+                versions[loaded.name] = str(getattr(
+                    loaded, "version",
+                    entry.dist.version if entry.dist is not None else ""
+                ))
+        except AttributeError as err:
+            miss = str(err).split()[-1][1:-1]
+            if miss in ("name", "compute"):
+                msg = "Skipping poorly formed filter {0!s}!  " \
+                    "{1:s} is missing"
+                logger.warn(_translate(
+                    plugin_class,
+                    msg.format(entry, miss),
+                    "Plugin error message"
+                ))
+            else:
+                raise
+
+    return ret
@@ -1,13 +1,12 @@
 #!/usr/bin/env python3
 __doc__="""The module defining the filter class."""
-import logging
-import pkg_resources
-
 from PyQt4 import QtGui
 
+from .entrypoints import load_filters
 from .nofilter import name as _no_filter_name
 
 from .. import plugin_class
+from ..worker import run_filter
 from vitables.vtapp import translate as _translate
 
 class Filters(QtGui.QComboBox):
@@ -39,14 +38,13 @@ class Filters(QtGui.QComboBox):
     def find_filters(self):
         """Find all filters that pass a quick check.
 
-        To pass the quick check, a filter must define a ``name``
-        variable and a ``compute`` method at the top scope of the object
-        referenced by the entry point.  All plugins that have both
-        attributes are then added to the internal combo box.  The first
-        item will be the :class:`nofilter` plugin because it is
-        distributed with this class.  The remaining filters will be
-        placed in alphabetical order.  If two plugins use the same value
-        for the ``name`` attribute, a RuntimeError is raised.
+        The plugins are loaded with :func:`load_filters`.  All plugins
+        that define both a ``name`` and ``compute`` are then added to
+        the internal combo box.  The first item will be the
+        :class:`nofilter` plugin because it is distributed with this
+        class.  The remaining filters will be placed in alphabetical
+        order.  If two plugins use the same value for the ``name``
+        attribute, a RuntimeError is raised.
 
         ..  note::  This method does not check if the plugin provides
                     the proper interface.  Specifically, it does not
@@ -62,59 +60,46 @@ class Filters(QtGui.QComboBox):
             attribute or it the default :class:`nofilter` is missing.
 
         """
-        logger = logging.getLogger(__name__ +".Filters.find_filters")
         self.clear()
-        group = ".".join(__name__.split(".")[:-1])
-        dist = group.split(".")[0]
-        self._plugins = {}
-        for entry in pkg_resources.iter_entry_points(group):
-            loaded = entry.load()
-            try:
-                if loaded.name in self._plugins:
-                    msg = "{0:s} used twice!  Please contact the " \
-                        +"author(s) of the plugins to establish a " \
-                        +"unique name for each."
-                    raise RuntimeError(_translate(
-                        plugin_class,
-                        msg.format(loaded.name),
-                        "Plugin error message"
-                    ))
-
-                self._plugins[loaded.name] = loaded.compute
-                if loaded.name == _no_filter_name:
-                    # Add the guaranteed no filter item.
-                    self.insertItem(0, loaded.name)
-
-            except AttributeError as err:
-                miss = str(err).split()[-1][1:-1]
-                if miss in ("name", "compute"):
-                    msg = "Skipping poorly formed filter {0!s}!  " \
-                        "{2:s} is missing"
-                    logger.warn(_translate(
-                        plugin_class,
-                        msg.format(entry, miss),
-                        "Plugin error message"
-                    ))
-                else:
-                    raise
-
-        if self.count() == 0:
+        self._versions = {}
+        self._plugins = load_filters(self._versions)
+        if _no_filter_name not in self._plugins:
             raise RuntimeError(_translate(
                 plugin_class,
                 "Required no filter plugin missing!",
                 "Plugin error message"
             ))
 
+        # Add the guaranteed no filter item first.
         items = sorted(self._plugins)
         items.pop(items.index(_no_filter_name))
+        self.insertItem(0, _no_filter_name)
         self.insertItems(1, items)
 
+    def current_filter(self):
+        """The name, ``compute`` method, and version of the filter.
+
+        Returns
+        -------
+
+        ret : tuple
+            ``(None, None, None)`` if the :class:`nofilter` is
+            selected.
+
+        """
+        filt = self.currentText()
+        if filt == _no_filter_name or filt not in self._plugins:
+            return None, None, None
+
+        return filt, self._plugins[filt], self._versions[filt]
+
     def apply(self, array):
         """Apply the current filter to the array.
 
         Get the current filter from the internal combo box and pass the
-        array to that filter.  If a ``RuntimeError`` is encountered, it
-        is reported to the logger as a warning and ``None`` is returned.
+        array to that filter with :func:`worker.run_filter`.  If the
+        filter fails or times out, it is reported to the logger as a
+        warning and ``None`` is returned.
 
         Parameters
         ----------
@@ -129,18 +114,5 @@ class Filters(QtGui.QComboBox):
             The filtered array or ``None``
 
         """
-        logger = logging.getLogger(__name__ +".Filters.apply")
         filt = self.currentText()
-        try:
-            ret = self._plugins[filt](array)
-        except RuntimeError as err:
-            msg = "Error applying {0:s}.  Message {1!s}"
-            logger.warning(_translate(
-                plugin_class,
-                msg.format(filt, err),
-                "Plugin error message"
-            ))
-            ret = None
-
-        return ret
-
+        return run_filter(filt, self._plugins[filt], array)
@@ -6,7 +6,7 @@ is to be used for the default selection in the :class:`Filters`
 selection.
 
 """
-from vitables.vtapp import translate as _translate
+from ..utils import translate as _translate
 
 from .. import plugin_class
 
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+__doc__="""The principal component filters.
+
+These filters project a (N,H,W) cube onto its leading principal
+components, treating every pixel as a sample of N bands.  The cube is
+read in bands of rows, so it never has to fit in memory:
+
+1.  One pass accumulates the sum and the N by N Gram matrix of the
+    bands, from which the band covariance follows.
+2.  The leading eigenvectors of the covariance are the components.
+3.  A second pass projects each band of rows onto the components.
+
+The filters are marked as ``lazy``, so :class:`core.FrameSource` passes
+them a :class:`lazy.LazyCube` of the node instead of reading it first.
+They check the ``cancelled`` hook passed by
+:func:`worker.run_lazy_filter` before each band of rows.
+The three projections are computed together and the last result is
+kept, so switching between PC1, PC2, and PC3 only decomposes the cube
+once.
+
+"""
+import weakref
+
+import numpy
+
+from .. import plugin_class
+from ..core import Cancelled
+from ..utils import translate as _translate
+
+COMPONENTS = 3
+"""The number of components computed at once."""
+
+_last = (lambda: None, None)
+"""A weak reference to the last cube and its projections."""
+
+def _lazy(function):
+    """Mark ``function`` as reading the cube itself in blocks."""
+    function.lazy = True
+    return function
+
+def _bands(array, block, cancelled=None):
+    """Yield the row ranges and (N,rows*W) samples of ``array``."""
+    depth, height, width = array.shape
+    rows = max(1, block //(depth *width *8))
+    for first in range(0, height, rows):
+        if cancelled is not None and cancelled():
+            raise Cancelled()
+
+        last = min(first +rows, height)
+        band = numpy.array(array[:, first:last], dtype=numpy.float64)
+        yield first, last, band.reshape(depth, -1)
+
+def principal_components(array, count=COMPONENTS, block=2**24,
+                         cancelled=None):
+    """Project a cube onto its leading principal components.
+
+    Parameters
+    ----------
+
+    array : array_like
+        The (N,H,W) cube.  Any object sliced like a
+        :class:`numpy.ndarray` is read one band of rows at a time.
+    count : int, optional
+        The number of components.
+    block : int, optional
+        The number of bytes of samples handled at once.
+    cancelled : callable, optional
+        Checked before each band of rows.  :class:`core.Cancelled` is
+        raised if it returns ``True``.
+
+    Returns
+    -------
+
+    ret : :class:`numpy.ndarray`
+        The (count,H,W) projections in order of decreasing variance.
+
+    Raises
+    ------
+
+    RuntimeError
+        If ``array`` is not 3D.
+
+    """
+    if len(array.shape) != 3:
+        raise RuntimeError(_translate(
+            plugin_class,
+            "Invalid array with dimension {0:d}".format(len(array.shape)),
+            "Plugin error message"
+        ))
+
+    depth, height, width = array.shape
+    count = min(count, depth)
+
+    # Accumulate about the mean of the first band to limit the
+    # cancellation in the covariance.
+    shift = None
+    total = numpy.zeros(depth)
+    gram = numpy.zeros((depth, depth))
+    samples = 0
+    for _, _, band in _bands(array, block, cancelled):
+        if shift is None:
+            shift = band.mean(axis=1, keepdims=True)
+
+        band -= shift
+        total += band.sum(axis=1)
+        gram += band @ band.T
+        samples += band.shape[1]
+
+    mean = total /samples
+    covariance = gram /samples -numpy.outer(mean, mean)
+    _, vectors = numpy.linalg.eigh(covariance)
+    vectors = vectors[:, ::-1][:, :count]
+
+    # Fix the arbitrary sign so the largest loading is positive.
+    largest = numpy.abs(vectors).argmax(axis=0)
+    vectors *= numpy.sign(vectors[largest, numpy.arange(count)])
+
+    center = shift +mean[:, None]
+    ret = numpy.empty((count, height, width))
+    for first, last, band in _bands(array, block, cancelled):
+        band -= center
+        ret[:, first:last] = (vectors.T @ band).reshape(count, -1, width)
+
+    return ret
+
+def component(array, index, cancelled=None):
+    """Return projection ``index`` of :func:`principal_components`.
+
+    The projections of the last cube are reused.
+
+    """
+    global _last
+    reference, projections = _last
+    if reference() is not array:
+        projections = principal_components(array, cancelled=cancelled)
+        _last = (weakref.ref(array), projections)
+
+    if index >= len(projections):
+        raise RuntimeError(_translate(
+            plugin_class,
+            "The cube has only {0:d} bands".format(len(projections)),
+            "Plugin error message"
+        ))
+
+    return projections[index]
+
+class PC1:
+    """The first principal component."""
+    name = "PC1"
+    """Filter name"""
+
+    @staticmethod
+    @_lazy
+    def compute(array, cancelled=None):
+        """Project ``array`` onto its first principal component."""
+        return component(array, 0, cancelled)
+
+class PC2:
+    """The second principal component."""
+    name = "PC2"
+    """Filter name"""
+
+    @staticmethod
+    @_lazy
+    def compute(array, cancelled=None):
+        """Project ``array`` onto its second principal component."""
+        return component(array, 1, cancelled)
+
+class PC3:
+    """The third principal component."""
+    name = "PC3"
+    """Filter name"""
+
+    @staticmethod
+    @_lazy
+    def compute(array, cancelled=None):
+        """Project ``array`` onto its third principal component."""
+        return component(array, 2, cancelled)
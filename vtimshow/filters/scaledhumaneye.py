@@ -24,7 +24,9 @@ import numpy
 import scipy.interpolate
 
 from .. import plugin_class
-from vitables.vtapp import translate as _translate
+from ..preferences import Preferences
+from ..utils import result_dtype
+from ..utils import translate as _translate
 
 def apply_spectrum(array, color):
     """Apply the ``color`` spectrum to ``array``.
@@ -35,7 +37,10 @@ def apply_spectrum(array, color):
 
     where :math:`\\overline{R}` is the red, green, or blue scaled
     spectrum specified by ``color`` and :math:`I_{n,m}` is the nth frame
-    of the mth image in ``array``.
+    of the mth image in ``array``.  The sum is accumulated in
+    ``float64`` one frame at a time and the image is returned in the
+    dtype the 'Precision' policy of the :class:`preferences.Preferences`
+    gives a quotient of ``array``.
 
     Parameters
     ----------
@@ -75,11 +80,17 @@ def apply_spectrum(array, color):
 
     xx = numpy.linspace(0, array.shape[0] -1, array.shape[0]) \
         /(array.shape[0] -1)
-    yy = scipy.interpolate.splev(xx, _spectrum[color]).reshape(
-        (array.shape[0], 1, 1)
+    yy = scipy.interpolate.splev(xx, _spectrum[color])
+    # Only (H,W) temporaries are created, whatever the dtype of the
+    # cube, since the frames are converted one at a time.
+    ret = numpy.zeros(array.shape[1:], dtype=numpy.float64)
+    for weight, frame in zip(yy, array):
+        ret += weight *frame
+
+    dtype = result_dtype(
+        "divide", array.dtype, precision=Preferences()["Math"]["Precision"]
     )
-    ret = numpy.sum(yy *array, axis=0)
-    return ret
+    return ret.astype(dtype, copy=False)
 
 def load_spline_data(csvfile="stockman_spectral_2000-table-3.csv"):
     """Read the given CSV file and compute the spline parameters.
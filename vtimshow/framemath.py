@@ -12,7 +12,13 @@ import vitables
 from vitables.vtapp import translate as _translate
 
 from . import plugin_class
-from .utils import divide as _divide
+from .background import STATISTICS, background
+from .core import Cancelled
+from .core import compute as _compute
+from .memory import RGBBuffer, budget
+from .preferences import Preferences
+from .utils import subtract
+from .utils import timed as _timed
 
 class FrameMath:
     """The class to hold the parameters for frame math.
@@ -28,7 +34,13 @@ class FrameMath:
     with the connected spin boxes.  The bottom of the frame has radio
     buttons that will perform simple arithmetic on the frames and
     display the monochrome results, or it will display the RGB
-    combination of the bands.
+    combination of the bands.  The arithmetic follows the precision
+    policy in the :class:`preferences.Preferences`.  Below them, a
+    background frame computed by :func:`background.background` over a
+    range of frames may be subtracted from the frames before any
+    operation.  Each background is computed once per image in blocks
+    of the displayed array and kept in the :data:`memory.budget` of the
+    parent until it is released.
 
     """
 
@@ -45,6 +57,8 @@ class FrameMath:
         logger = logging.getLogger(__name__ +".FrameMath")
         #imageItem = parent.image.getImageItem()
         self.parent = parent
+        self._precision = Preferences()["Math"]["Precision"]
+        self._rgb = RGBBuffer(parent)
 
         image = parent.image.image
         if len(image.shape) != 3 or image.shape[0] < 2:
@@ -150,6 +164,57 @@ class FrameMath:
         self.bSpin.valueChanged.connect(self._b_spin_changed)
         self.bSpin.setValue(min(2, image.shape[0]))
 
+        # Add the background subtraction
+        self._backgrounds = {}
+        self._background_image = None
+        self.bgCheck = QtGui.QCheckBox(
+            _translate(plugin_class, "Subtract background", "Check box"),
+            self.group
+        )
+        self.layout.addWidget(self.bgCheck, 2, 0, 1, 1)
+
+        self.bgStatistic = QtGui.QComboBox(self.group)
+        for statistic in STATISTICS:
+            self.bgStatistic.addItem(
+                _translate(plugin_class, statistic, "Combo box"), statistic
+            )
+
+        self.layout.addWidget(self.bgStatistic, 2, 1, 1, 1)
+
+        self.bgPercentile = QtGui.QDoubleSpinBox(self.group)
+        self.bgPercentile.setRange(0, 100)
+        self.bgPercentile.setValue(50)
+        self.bgPercentile.setSuffix(" %")
+        self.bgPercentile.setEnabled(False)
+        self.layout.addWidget(self.bgPercentile, 2, 2, 1, 1)
+
+        self.bgStart = QtGui.QSpinBox(self.group)
+        self.bgStart.setRange(0, image.shape[0] -1)
+        self.bgStart.setPrefix(_translate(plugin_class, "from ", "Prefix"))
+        self.layout.addWidget(self.bgStart, 2, 3, 1, 1)
+
+        self.bgStop = QtGui.QSpinBox(self.group)
+        self.bgStop.setRange(1, image.shape[0])
+        self.bgStop.setValue(image.shape[0])
+        self.bgStop.setPrefix(_translate(plugin_class, "to ", "Prefix"))
+        self.layout.addWidget(self.bgStop, 2, 4, 1, 1)
+
+        self.bgApproximate = QtGui.QCheckBox(
+            _translate(plugin_class, "Approximate", "Check box"),
+            self.group
+        )
+        self.layout.addWidget(self.bgApproximate, 2, 5, 1, 1)
+
+        self.bgCheck.toggled.connect(self._update_image)
+        self.bgStatistic.currentIndexChanged.connect(
+            self._background_changed
+        )
+        self.bgPercentile.valueChanged.connect(self._background_changed)
+        self.bgStart.valueChanged.connect(self._background_changed)
+        self.bgStop.valueChanged.connect(self._background_changed)
+        self.bgApproximate.toggled.connect(self._background_changed)
+        self._background_changed()
+
         # Add the group to the bottom of the third grid layout in the
         # image view.
         self.parent.image.ui.gridLayout_3.addWidget(
@@ -219,40 +284,177 @@ class FrameMath:
         self.parent.image.timeLine.setVisible(not b)
 
     def _rgb_frames(self):
-        """Programmatically get the frames."""
+        """Programmatically get the frames.
+
+        The background is subtracted if it is selected.
+
+        """
         image = self.parent.image.image
         R = image[self.rSpin.value(), :, :]
         G = image[self.gSpin.value(), :, :]
         B = image[self.bSpin.value(), :, :]
-        return R, G, B
+        if not self.bgCheck.isChecked():
+            return R, G, B
+
+        frame = self._background()
+        if frame is None:
+            return R, G, B
+
+        return tuple(
+            subtract(channel, frame, precision=self._precision)
+            for channel in (R, G, B)
+        )
+
+    def _background_changed(self):
+        """Refresh the image after a background setting changed."""
+        statistic = self.bgStatistic.itemData(
+            self.bgStatistic.currentIndex()
+        )
+        self.bgPercentile.setEnabled(statistic == "Percentile")
+        self.bgApproximate.setEnabled(statistic != "Mean")
+        if self.bgCheck.isChecked():
+            self._update_image()
+
+    def _background(self):
+        """Compute or look up the selected background frame.
+
+        Returns
+        -------
+
+        ret : :class:`numpy.ndarray` or ``None``
+            The background or ``None`` if the computation was
+            cancelled or the range of frames is empty.
+
+        """
+        logger = logging.getLogger(__name__ +".FrameMath._background")
+        image = self.parent.image.image
+        if image is not self._background_image:
+            # The image was reshaped.
+            for key in list(self._backgrounds):
+                budget.unregister(self._background_key(key))
+
+            self._backgrounds.clear()
+            self._background_image = image
+
+        statistic = self.bgStatistic.itemData(
+            self.bgStatistic.currentIndex()
+        )
+        start = self.bgStart.value()
+        stop = self.bgStop.value()
+        key = (
+            statistic,
+            self.bgPercentile.value() if statistic == "Percentile" else None,
+            start, stop,
+            statistic == "Mean" or not self.bgApproximate.isChecked()
+        )
+        if key in self._backgrounds:
+            budget.touch(self._background_key(key))
+            return self._backgrounds[key]
+
+        if start >= stop:
+            logger.error(_translate(
+                plugin_class,
+                "The background needs at least one frame!",
+                "Plugin error message"
+            ))
+            self._uncheck_background()
+            return None
+
+        progress = QtGui.QProgressDialog(
+            _translate(plugin_class, "Computing the background", "Title"),
+            _translate(plugin_class, "Cancel", "Button"), 0, 100,
+            self.group
+        )
+        progress.setWindowModality(QtCore.Qt.WindowModal)
+        try:
+            with _timed(self.parent.timings, "background"):
+                frame = background(
+                    self._background_frames(image), statistic,
+                    self.bgPercentile.value(), start, stop,
+                    exact=key[-1],
+                    progress=lambda done, total: progress.setValue(
+                        100 *done //total
+                    ),
+                    cancelled=progress.wasCanceled
+                )
+        except Cancelled:
+            self._uncheck_background()
+            return None
+        finally:
+            progress.close()
+
+        self._backgrounds[key] = frame
+        budget.register(
+            self._background_key(key), frame.nbytes,
+            lambda: self._backgrounds.pop(key, None)
+        )
+        return frame
+
+    def _background_key(self, key):
+        """The budget key of the background of the settings ``key``."""
+        return (id(self.parent), "background", key)
+
+    def _background_frames(self, image):
+        """Select the cube the background is computed from.
+
+        Banded slices of an array in memory, or memory mapped, are
+        already bounded copies, so the displayed array is used whenever
+        it is one, including the loaded :attr:`ImageWindow.data`.  The
+        lazy cube of the parent, which decompresses the frames again,
+        is only read if the image is not an array of the same shape.
+
+        """
+        cube = self.parent.cube
+        if isinstance(image, numpy.ndarray) \
+                or tuple(cube.shape) != tuple(image.shape):
+            return image
+
+        return cube
+
+    def _uncheck_background(self):
+        """Clear the background check box without refreshing the image.
+
+        This is called while the frames for the current image are being
+        prepared, so :meth:`_update_image` must not run again.
+
+        """
+        self.bgCheck.blockSignals(True)
+        try:
+            self.bgCheck.setChecked(False)
+        finally:
+            self.bgCheck.blockSignals(False)
+
+    def _display(self, image):
+        """Push the computed ``image`` to the image item."""
+        with _timed(self.parent.timings, "render"):
+            imageItem = self.parent.image.getImageItem()
+            imageItem.updateImage(image)
+
+    def _show(self, label):
+        """Compute the operation ``label`` and show the result."""
+        R, G, B = self._rgb_frames()
+        with _timed(self.parent.timings, "math"):
+            image = _compute(
+                label, R, G, B, precision=self._precision, rgb=self._rgb
+            )
+
+        self._display(image)
 
     def _show_rgb(self):
         """Show the RGB image."""
-        R, G, B = self._rgb_frames()
-        image = numpy.dstack((R, G, B))
-        imageItem = self.parent.image.getImageItem()
-        imageItem.updateImage(image)
+        self._show("RGB")
 
     def _show_r_minus_g(self):
         """Compute and show :math:`R - G`."""
-        R, G, B = self._rgb_frames()
-        image = R - G
-        imageItem = self.parent.image.getImageItem()
-        imageItem.updateImage(image)
+        self._show("R - G")
 
     def _show_r_minus_g_by_b(self):
         """Compute and show :math:`(R - G) / B`."""
-        R, G, B = self._rgb_frames()
-        image = _divide((R - G), B)
-        imageItem = self.parent.image.getImageItem()
-        imageItem.updateImage(image)
+        self._show("(R - G) / B")
 
     def _show_r_by_g(self):
         """Compute and show :math:`R / G`."""
-        R, G, B = self._rgb_frames()
-        image = _divide(R, G)
-        imageItem = self.parent.image.getImageItem()
-        imageItem.updateImage(image)
+        self._show("R / G")
 
     def _update_image(self):
         """Determine which button is pressed and refresh the image."""
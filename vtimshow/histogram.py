@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+__doc__="""The module defining :class:`FrameHistogram`.
+
+A histogram of every frame, drawn as a frame by intensity heat map in
+the time series plot of the :class:`pyqtgraph.ImageView`, shows
+saturated, dark, or dropped frames of a long acquisition at a glance.
+:class:`HistogramMatrix` computes the rows of the map a block of frames
+at a time with a single :func:`numpy.bincount` per block.  Integer data
+is binned with integer arithmetic only.  The frames are visited coarse
+to fine, first every ``S``-th frame, then the frames halfway between
+those, and so on, so a long cube shows a complete but blocky map almost
+at once that is refined while it is displayed.
+
+"""
+import logging
+
+import numpy
+
+from PyQt4 import QtCore
+from PyQt4 import QtGui
+
+import pyqtgraph
+
+from vitables.vtapp import translate as _translate
+
+from . import plugin_class
+from .memory import budget
+
+def histogram_block(frames, low, high, bins):
+    """Count the values of each frame in ``bins`` equal bins.
+
+    Values outside of ``[low, high]`` are counted in the first and last
+    bins, so saturation stays visible.  NaNs are not counted.
+
+    >>> frames = numpy.array([[0, 1, 2, 3], [3, 3, 3, 3]], dtype="uint8")
+    >>> histogram_block(frames, 0, 3, 2)
+    array([[2, 2],
+           [0, 4]])
+
+    Parameters
+    ----------
+
+    frames : :class:`numpy.ndarray`
+        The (k,...) block of frames.
+    low, high : number
+        The range of the bins.  Both ends are included for integers.
+    bins : int
+        The number of bins.
+
+    Returns
+    -------
+
+    ret : :class:`numpy.ndarray`
+        The (k,bins) counts.
+
+    """
+    count = len(frames)
+    flat = numpy.asarray(frames).reshape(count, -1)
+    if flat.dtype.kind in "biu":
+        index = flat.astype(numpy.int64)
+        index -= int(low)
+        numpy.clip(index, 0, int(high) -int(low), out=index)
+        span = int(high) -int(low) +1
+        if span != bins:
+            index *= bins
+            index //= span
+
+        keep = None
+    else:
+        keep = numpy.isfinite(flat)
+        scale = bins /(high -low) if high > low else 0.0
+        index = numpy.floor((flat -low) *scale)
+        numpy.clip(index, 0, bins -1, out=index)
+        index = index.astype(numpy.int64)
+
+    index += bins *numpy.arange(count)[:, None]
+    if keep is not None:
+        index = index[keep]
+
+    return numpy.bincount(
+        index.ravel(), minlength=count *bins
+    ).reshape(count, bins)
+
+class HistogramMatrix:
+    """The progressively refined histograms of every frame of a cube.
+
+    The range of the bins is taken from the frames of the coarsest
+    level, read one block at a time.  Each call to :meth:`refine` bins
+    the next block of frames of the coarse to fine order.
+
+    """
+
+    SAMPLE = 64
+    """The number of frames of the first, coarsest level."""
+
+    def __init__(self, frames, bins=256, block=2**24):
+        """Prepare the matrix.
+
+        Parameters
+        ----------
+
+        frames : array_like
+            The (N,...) cube.  Any object sliced like a
+            :class:`numpy.ndarray`, such as a :class:`lazy.LazyCube`,
+            is read one block at a time.
+        bins : int, optional
+            The number of intensity bins.  Integer data uses fewer
+            bins if its range is narrower.
+        block : int, optional
+            The number of bytes read by each call to :meth:`refine`.
+
+        """
+        self.frames = frames
+        count = len(frames)
+        coarse = 1
+        while coarse *2 *self.SAMPLE <= count:
+            coarse *= 2
+
+        self.levels = [range(0, count, coarse)]
+        while coarse > 1:
+            self.levels.append(range(coarse //2, count, coarse))
+            coarse //= 2
+
+        shape = tuple(frames.shape[1:])
+        dtype = numpy.dtype(frames.dtype)
+        framebytes = int(numpy.prod(shape)) *dtype.itemsize
+        self.batch = max(1, block //max(framebytes, 1))
+        low, high = self._range(self.levels[0])
+        if dtype.kind in "biu":
+            self.low = 0 if low is None else int(low)
+            self.high = 0 if high is None else int(high)
+            self.bins = min(bins, self.high -self.low +1)
+        else:
+            self.low = 0.0 if low is None else float(low)
+            self.high = 1.0 if high is None else float(high)
+            if self.high <= self.low:
+                self.high = self.low +1.0
+
+            self.bins = bins
+
+        self.counts = numpy.zeros((count, self.bins), dtype=numpy.int64)
+        self.done = numpy.zeros(count, dtype=bool)
+        self._level = 0
+        self._position = 0
+
+    def _range(self, indexes):
+        """Find the extremes of the finite values of the frames.
+
+        The frames are read :attr:`batch` at a time, so the sample is
+        never held in memory at once.
+
+        Parameters
+        ----------
+
+        indexes : range
+            The frames to sample.
+
+        Returns
+        -------
+
+        low, high : number or ``None``
+            The minimum and maximum or ``None`` if there are no finite
+            values.
+
+        """
+        low = high = None
+        for first in range(0, len(indexes), self.batch):
+            part = indexes[first:first +self.batch]
+            values = numpy.asarray(
+                self.frames[part.start:part[-1] +1:part.step]
+            )
+            if values.dtype.kind not in "biu":
+                values = values[numpy.isfinite(values)]
+
+            if values.size == 0:
+                continue
+
+            low = values.min() if low is None else min(low, values.min())
+            high = values.max() if high is None else max(high, values.max())
+
+        return low, high
+
+    @property
+    def bin_width(self):
+        """The width of a bin in units of the data."""
+        if isinstance(self.low, int):
+            return (self.high -self.low +1) /self.bins
+
+        return (self.high -self.low) /self.bins
+
+    @property
+    def complete(self):
+        """``True`` once every frame has been binned."""
+        return self._level >= len(self.levels)
+
+    def refine(self):
+        """Bin the next block of frames.
+
+        Returns
+        -------
+
+        ret : bool
+            ``True`` if frames remain.
+
+        """
+        if self.complete:
+            return False
+
+        level = self.levels[self._level]
+        indexes = level[self._position:self._position +self.batch]
+        if len(indexes) > 0:
+            frames = numpy.asarray(self.frames[
+                indexes.start:indexes[-1] +1:indexes.step
+            ])
+            self.counts[indexes.start:indexes[-1] +1:indexes.step] = \
+                histogram_block(frames, self.low, self.high, self.bins)
+            self.done[indexes.start:indexes[-1] +1:indexes.step] = True
+
+        self._position += self.batch
+        if self._position >= len(level):
+            self._level += 1
+            self._position = 0
+
+        return not self.complete
+
+    def filled(self):
+        """The counts with missing frames copied from the last binned."""
+        binned = numpy.where(self.done, numpy.arange(len(self.done)), 0)
+        return self.counts[numpy.maximum.accumulate(binned)]
+
+class FrameHistogram:
+    """The class to draw the histogram of every frame.
+
+    This takes a reference to the parent :class:`ImageWindow` and adds
+    a menu option to its :class:`pyqtgraph.ImageView`, like
+    :class:`playback.Playback`.  When it is checked, the logarithm of
+    the counts of a :class:`HistogramMatrix` is drawn behind the time
+    series plot with the frames along the horizontal axis and the
+    intensity along the vertical axis.  The matrix is refined by a
+    timer between events, so the window stays responsive, and it is
+    kept in the :data:`memory.budget` of the parent until the image is
+    reshaped or the matrix is released.
+
+    """
+
+    def __init__(self, parent):
+        """Initialize the histogram.
+
+        Parameters
+        ----------
+
+        parent : :class:`imagewindow.ImageWindow`
+            The window holding the image.
+
+        """
+        self.parent = parent
+        self._key = (id(parent), "histogram")
+        self.matrix = None
+        self.timer = None
+        self._image = None
+        image = parent.image.image
+        if image is None or image.ndim < 3 or image.shape[0] < 2:
+            return
+
+        self.item = pyqtgraph.ImageItem()
+        self.item.setZValue(-10)
+        self.item.hide()
+        self.parent.image.ui.roiPlot.addItem(self.item)
+
+        self.timer = QtCore.QTimer(self.parent)
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self._refine)
+
+        self.menuAction = QtGui.QAction(
+            _translate(plugin_class, "Frame histogram", "Menu"),
+            self.parent.image.menu
+        )
+        self.menuAction.setCheckable(True)
+        self.menuAction.toggled.connect(self.toggled)
+        self.parent.image.menu.addAction(self.menuAction)
+
+    def toggled(self, b):
+        """Show or hide the histogram.
+
+        Parameters
+        ----------
+
+        b : bool
+            Passed by the menu signal.
+
+        """
+        self.item.setVisible(b)
+        if b:
+            self.refresh()
+        else:
+            self.timer.stop()
+
+    def refresh(self):
+        """Start over if the image was reshaped and resume refining."""
+        logger = logging.getLogger(__name__ +".FrameHistogram.refresh")
+        if self.timer is None or not self.menuAction.isChecked():
+            return
+
+        image = self.parent.image.image
+        if image is not self._image or image.ndim < 3:
+            self.matrix = None
+            budget.unregister(self._key)
+            self._image = image
+            if image.ndim < 3:
+                self.item.hide()
+                return
+
+            self.matrix = HistogramMatrix(image)
+            budget.register(
+                self._key,
+                self.matrix.counts.nbytes +self.matrix.done.nbytes,
+                self.release
+            )
+            logger.debug("Binning {0:d} frames in [{1!s}, {2!s}]".format(
+                len(image), self.matrix.low, self.matrix.high
+            ))
+            transform = QtGui.QTransform()
+            transform.translate(0, self.matrix.low)
+            transform.scale(1, self.matrix.bin_width)
+            self.item.setTransform(transform)
+
+        self.item.show()
+        self._draw()
+        if not self.matrix.complete:
+            self.timer.start()
+
+    def stop(self):
+        """Stop refining."""
+        if self.timer is not None:
+            self.timer.stop()
+
+    def release(self):
+        """Drop the matrix so it is binned again when next shown."""
+        self.stop()
+        self.matrix = None
+        self._image = None
+        if self.timer is not None:
+            self.item.clear()
+            self.menuAction.setChecked(False)
+
+    def _refine(self):
+        """Bin the next block of frames and redraw."""
+        if not self.matrix.refine():
+            self.timer.stop()
+
+        self._draw()
+
+    def _draw(self):
+        """Show the current counts."""
+        budget.touch(self._key)
+        self.item.setImage(numpy.log1p(self.matrix.filled()))
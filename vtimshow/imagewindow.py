@@ -12,9 +12,19 @@ import vitables
 from vitables.vtapp import translate as _translate
 
 from . import plugin_class
+from .chunks import chunk_reader
+from .core import read_node, resolve_axes
 from .setdims import SetDims
 from .framemath import FrameMath
+from .histogram import FrameHistogram
+from .lazy import LazyCube
+from .memmap import memmap_node
+from .loader import Loader
+from .memory import budget, usage_report
+from .playback import Playback
 from .preferences import Preferences
+from .utils import add_profiling_actions as _add_profiling_actions
+from .utils import timed as _timed
 
 class ImageWindow(QtGui.QMdiSubWindow):
     """The window to hold the image in the workspace of ViTables
@@ -25,7 +35,19 @@ class ImageWindow(QtGui.QMdiSubWindow):
     order specified by :class:`preferences.Preferences`.  This also adds
     a menu item to launch a :class:`setdims.SetDims` window to reshape
     the array if the underlying order of the dataset is not what is
-    specified in the preferences.
+    specified in the preferences.  The dataset is read by a
+    :class:`loader.Loader` on a worker thread while a progress bar and a
+    cancel button are shown below the first frame.  The node is also
+    available as the :class:`lazy.LazyCube` :attr:`cube` that only
+    reads the regions it is sliced to.  The displayed array is pinned
+    in the :data:`memory.budget` so the caches of other windows are
+    released to make room for it.  A contiguous uncompressed node is
+    memory mapped by :func:`memmap.memmap_node` instead of being read.
+    Cubes can be played at a fixed frame rate with
+    :class:`playback.Playback` and the histogram of every frame can be
+    drawn with :class:`histogram.FrameHistogram`.  The caches these
+    build are registered under the window and freed by
+    :meth:`release_caches`.
 
     """
 
@@ -42,9 +64,7 @@ class ImageWindow(QtGui.QMdiSubWindow):
 
         """
         logger = logging.getLogger(__name__ +".ImageWindow")
-        if leaf.node.ndim in (2,3,4):
-            data = leaf.node.read()
-        else:
+        if leaf.node.ndim not in (2,3,4):
             msg = _translate(
                     plugin_class,
                     "Array must be 2D, 3D, or 4D",
@@ -54,37 +74,38 @@ class ImageWindow(QtGui.QMdiSubWindow):
             raise RuntimeError(msg)
 
         super(ImageWindow, self).__init__(parent)
+        self.timings = {}
+        self.data = None
+        self.framemath = None
+        self.playback = None
+        self.histogram = None
+        self._order = Preferences()
+        self._axes, self._has_depth = resolve_axes(
+            leaf.node.shape, self._order
+        )
+        self.cube = LazyCube(chunk_reader(leaf.node)).transpose(
+            self._axes
+        )
 
-        config = Preferences()
-        if leaf.node.ndim == 2:
-            self.data = data.transpose((
-                int(config["2D"]["Height"]),
-                int(config["2D"]["Width"])
-            ))
-        elif leaf.node.ndim == 3:
-            if data.shape[int(config["2D"]["RGB(A)"])] in (3,4):
-                self.data = data.transpose((
-                    int(config["2D"]["Height"]),
-                    int(config["2D"]["Width"]),
-                    int(config["2D"]["RGB(A)"])
-                ))
-            else:
-                self.data = data.transpose((
-                    int(config["3D"]["Depth"]),
-                    int(config["3D"]["Height"]),
-                    int(config["3D"]["Width"])
-                ))
-        else:
-            self.data = data.transpose((
-                int(config["4D"]["Depth"]),
-                int(config["4D"]["Height"]),
-                int(config["4D"]["Width"]),
-                int(config["4D"]["RGB(A)"])
-            ))
-
-        self.image = pyqtgraph.ImageView()
-        self.image.setImage(self.data)
-        self.setWidget(self.image)
+        widget = QtGui.QWidget(self)
+        layout = QtGui.QGridLayout(widget)
+        layout.setMargin(0)
+        layout.setSpacing(0)
+
+        self.image = pyqtgraph.ImageView(parent=widget)
+        layout.addWidget(self.image, 0, 0, 1, 2)
+        layout.setRowStretch(0, 10)
+
+        self._progress = QtGui.QProgressBar(widget)
+        self._progress.setRange(0, 100)
+        layout.addWidget(self._progress, 1, 0, 1, 1)
+        self._cancel = QtGui.QPushButton(
+            _translate(plugin_class, "Cancel", "Button"), widget
+        )
+        self._cancel.clicked.connect(self.close)
+        layout.addWidget(self._cancel, 1, 1, 1, 1)
+
+        self.setWidget(widget)
         self.image.show()
 
         self.pindex = None
@@ -100,15 +121,119 @@ class ImageWindow(QtGui.QMdiSubWindow):
         vitables.utils.addToMenu(self.image.menu, action)
         action.triggered.connect(self.reshape)
 
+        action = QtGui.QAction("Memory usage", self.image.menu)
+        vitables.utils.addToMenu(self.image.menu, action)
+        action.triggered.connect(self.show_usage)
+
+        action = QtGui.QAction("Release caches", self.image.menu)
+        vitables.utils.addToMenu(self.image.menu, action)
+        action.triggered.connect(self.release_caches)
+
+        _add_profiling_actions(self.image.menu)
+
+        # Read the node on a worker thread.  The first frame of a cube
+        # is shown while the rest is read.
+        self._loader = Loader(self._read, self)
+        self._loader.progress.connect(self._progress.setValue)
+        self._loader.partial.connect(self._show_first_frame)
+        self._loader.loaded.connect(self._loaded)
+        self._loader.failed.connect(self._failed)
+        self._mapped = memmap_node(leaf.node)
+        if self._mapped is None:
+            self._loader.start()
+        else:
+            self._loaded(self._mapped.transpose(self._axes))
+
+    def _read(self, progress, cancelled):
+        """Read the node on the worker thread."""
+        node = self.dbt_leaf.node
+        if self._has_depth:
+            self._loader.partial.emit(self.cube[0].read())
+
+        with _timed(self.timings, "read"):
+            data = read_node(node, progress, cancelled)
+
+        with _timed(self.timings, "transpose"):
+            return data.transpose(self._axes)
+
+    def _show_first_frame(self, frame):
+        """Display the first frame while the rest is loaded."""
+        if self.data is None:
+            self.image.setImage(frame)
+
+    def _loaded(self, data):
+        """Display the full dataset once it has been read."""
+        self.data = data
+        if self._mapped is None:
+            # The displayed array cannot be reloaded while it is shown,
+            # so it is pinned.  The backgrounds and the histogram built
+            # from it are released instead.
+            budget.register((id(self), "data"), self.data.nbytes)
+
+        with _timed(self.timings, "render"):
+            self.image.setImage(self.data)
+
+        self._progress.hide()
+        self._cancel.hide()
         self.framemath = FrameMath(self)
+        self.playback = Playback(self)
+        self.histogram = FrameHistogram(self)
+
+    def _failed(self, message):
+        """Report a failed read and close the window."""
+        logger = logging.getLogger(__name__ +".ImageWindow._failed")
+        logger.error(_translate(
+            plugin_class,
+            "Unable to read {0:s}.  {1:s}".format(
+                self.dbt_leaf.name, message
+            ),
+            "Plugin error message"
+        ))
+        self.close()
+
+    def show_usage(self):
+        """Report the memory held and the last stage timings."""
+        QtGui.QMessageBox.information(
+            self,
+            _translate(plugin_class, "Memory usage", "Title"),
+            usage_report([self], self.timings)
+        )
+
+    def release_caches(self):
+        """Release every cache of the window that can be rebuilt."""
+        budget.release_owner(self)
+
+    def closeEvent(self, event):
+        """Stop loading and return the memory held to the budget."""
+        if self.playback is not None:
+            self.playback.stop()
+
+        if self.histogram is not None:
+            self.histogram.stop()
+
+        if self._loader.isRunning():
+            self._loader.cancel()
+            self._loader.wait()
+
+        budget.unregister_owner(self)
+        super(ImageWindow, self).closeEvent(event)
 
     def reshape(self):
         """Select different axis for displaying the image."""
         logger = logging.getLogger(__name__ +".ImageWindow.reshape")
-        dims = SetDims(self.data)
+        if self._loader.isRunning():
+            return
+
+        # Slicing and transposing either array only creates a view.  The
+        # lazy cube then reads just the selected region from the node.
+        array = self.cube if self.data is None else self.data
+        dims = SetDims(self.cube)
         if dims.exec() == dims.Rejected:
             return
 
+        if self.playback is not None:
+            self.playback.stop()
+
         # Prepare the image array
         W = dims.get_width()
         logger.debug("Width  : {0!s}".format(W))
@@ -119,12 +244,12 @@ class ImageWindow(QtGui.QMdiSubWindow):
         R = dims.get_rgba()
         logger.debug("RGBA   : {0!s}".format(R))
         if D is None and R is None:
-            data = self.data.transpose((W.dim, H.dim))[
+            data = array.transpose((W.dim, H.dim))[
                 W.start:W.end:W.stride,
                 H.start:H.end:H.stride
              ]
         elif D is not None and R is None:
-            if len(self.data.shape) != 3:
+            if len(array.shape) != 3:
                 msg = _translate(
                     plugin_class,
                     "Either Depth or RGBA can be set!  Not both.",
@@ -133,13 +258,13 @@ class ImageWindow(QtGui.QMdiSubWindow):
                 logger.error(msg)
                 return
 
-            data = self.data.transpose((D.dim, W.dim, H.dim))[
+            data = array.transpose((D.dim, W.dim, H.dim))[
                 D.start:D.end:D.stride,
                 W.start:W.end:W.stride,
                 H.start:H.end:H.stride
             ]
         elif D is None and R is not None:
-            if len(self.data.shape) != 3:
+            if len(array.shape) != 3:
                 msg = _translate(
                     plugin_class,
                     "Either Depth or RGBA can be set!  Not both.",
@@ -148,13 +273,13 @@ class ImageWindow(QtGui.QMdiSubWindow):
                 logger.error(msg)
                 return
 
-            data = self.data.transpose((W.dim, H.dim, R.dim))[
+            data = array.transpose((W.dim, H.dim, R.dim))[
                 W.start:W.end:W.stride,
                 H.start:H.end:H.stride,
                 :
             ]
         elif D is not None and R is not None:
-            data = self.data.transpose((D.dim, W.dim, H.dim, R.dim))[
+            data = array.transpose((D.dim, W.dim, H.dim, R.dim))[
                 D.start:D.end:D.stride,
                 W.start:W.end:W.stride,
                 H.start:H.end:H.stride,
@@ -163,7 +288,15 @@ class ImageWindow(QtGui.QMdiSubWindow):
         else:
             raise RuntimeError("This should never be possible")
 
-        self.image.setImage(data)
+        with _timed(self.timings, "read"):
+            data = numpy.asarray(data)
+
+        with _timed(self.timings, "render"):
+            self.image.setImage(data)
+
+        if self.histogram is not None:
+            self.histogram.refresh()
+
         self.image.show()
         return
 
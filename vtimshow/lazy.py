@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+__doc__="""The module defining :class:`LazyCube`.
+
+A :class:`LazyCube` stands in for a node wherever only its shape, a
+transpose, or a region is needed.  Transposing and slicing only update
+the bookkeeping of the view.  Nothing is read from the file until
+:meth:`LazyCube.read` is called, and then only the selected region.
+
+"""
+import numpy
+import tables
+
+from .utils import hdf5_lock
+
+class LazyCube:
+    """A transposed and sliced view of a :class:`tables.Array`.
+
+    The view supports ``shape``, ``ndim``, ``dtype``, ``transpose``,
+    and basic indexing with integers, slices, and ``Ellipsis`` like a
+    :class:`numpy.ndarray`.  Any object indexable like a
+    :class:`numpy.ndarray` with positive strides may be wrapped.
+
+    >>> cube = LazyCube(numpy.arange(24).reshape(2, 3, 4))
+    >>> view = cube.transpose((0, 2, 1))[1, ::-2]
+    >>> view.shape
+    (2, 3)
+    >>> view.read()
+    array([[15, 19, 23],
+           [13, 17, 21]])
+
+    """
+
+    def __init__(self, node, axes=None, ranges=None):
+        """Wrap a node.
+
+        Parameters
+        ----------
+
+        node : :class:`tables.Array`
+            The node to read from.
+        axes : tuple, optional
+            The axes of the node in the order of the view.  Axes
+            removed by integer indexing are not listed.
+        ranges : list, optional
+            A ``range`` of the selected indexes or an ``int`` for each
+            axis of the node.
+
+        """
+        self.node = node
+        if ranges is None:
+            ranges = [range(length) for length in node.shape]
+
+        if axes is None:
+            axes = tuple(range(len(node.shape)))
+
+        self._ranges = list(ranges)
+        self._axes = tuple(axes)
+
+    @property
+    def shape(self):
+        """The shape of the view."""
+        return tuple(len(self._ranges[axis]) for axis in self._axes)
+
+    @property
+    def ndim(self):
+        """The number of dimensions of the view."""
+        return len(self._axes)
+
+    @property
+    def dtype(self):
+        """The dtype of the node."""
+        return self.node.dtype
+
+    @property
+    def size(self):
+        """The number of elements in the view."""
+        return int(numpy.prod(self.shape))
+
+    @property
+    def nbytes(self):
+        """The number of bytes :meth:`read` will return."""
+        return self.size *self.dtype.itemsize
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __repr__(self):
+        return "LazyCube({0!s}, shape={1!s})".format(self.node, self.shape)
+
+    def transpose(self, *axes):
+        """Permute the dimensions of the view.
+
+        Parameters
+        ----------
+
+        axes : tuple or ints, optional
+            The permutation as for :meth:`numpy.ndarray.transpose`.
+            The default reverses the dimensions.
+
+        """
+        if len(axes) == 1 and not isinstance(axes[0], int):
+            axes = axes[0]
+
+        if not axes:
+            axes = tuple(range(self.ndim))[::-1]
+
+        if sorted(axes) != list(range(self.ndim)):
+            raise ValueError("axes don't match the view")
+
+        return LazyCube(
+            self.node, [self._axes[axis] for axis in axes], self._ranges
+        )
+
+    @property
+    def T(self):
+        """The view with the dimensions reversed."""
+        return self.transpose()
+
+    def __getitem__(self, key):
+        """Select a region with basic indexing.
+
+        Returns a new :class:`LazyCube` unless every dimension is
+        indexed by an integer, in which case the element is read.
+
+        """
+        if not isinstance(key, tuple):
+            key = (key,)
+
+        if any(item is Ellipsis for item in key):
+            idx = key.index(Ellipsis)
+            fill = (slice(None),) *(self.ndim -len(key) +1)
+            key = key[:idx] +fill +key[idx +1:]
+
+        if len(key) > self.ndim:
+            raise IndexError("too many indices for the view")
+
+        ranges = list(self._ranges)
+        axes = []
+        for dim, axis in enumerate(self._axes):
+            item = key[dim] if dim < len(key) else slice(None)
+            if isinstance(item, slice):
+                ranges[axis] = ranges[axis][item]
+                axes.append(axis)
+            elif isinstance(item, (int, numpy.integer)):
+                # Indexing a ``range`` checks the bounds.
+                ranges[axis] = ranges[axis][int(item)]
+            else:
+                raise TypeError(
+                    "Only integers, slices, and Ellipsis are supported"
+                )
+
+        view = LazyCube(self.node, axes, ranges)
+        return view if axes else view.read()[()]
+
+    def read(self):
+        """Read the selected region into memory.
+
+        Returns
+        -------
+
+        ret : :class:`numpy.ndarray`
+            The region in the order of the view.
+
+        """
+        select = []
+        flip = []
+        for axis, indexes in enumerate(self._ranges):
+            if isinstance(indexes, int):
+                select.append(indexes)
+                continue
+
+            if indexes.step < 0:
+                # Read forward and reverse in memory.
+                indexes = indexes[::-1]
+                flip.append(axis)
+
+            if len(indexes) == 0:
+                select.append(slice(0, 0))
+            else:
+                select.append(slice(
+                    indexes.start, indexes[-1] +1, indexes.step
+                ))
+
+        if isinstance(self.node, tables.Leaf):
+            with hdf5_lock:
+                ret = numpy.asarray(self.node[tuple(select)])
+        else:
+            # A :class:`chunks.ChunkReader` takes the lock itself.
+            ret = numpy.asarray(self.node[tuple(select)])
+
+        kept = [
+            axis for axis, indexes in enumerate(self._ranges)
+            if not isinstance(indexes, int)
+        ]
+        if flip:
+            ret = ret[tuple(
+                slice(None, None, -1) if axis in flip else slice(None)
+                for axis in kept
+            )]
+
+        return ret.transpose([kept.index(axis) for axis in self._axes])
+
+    def __array__(self, dtype=None):
+        ret = self.read()
+        return ret if dtype is None else ret.astype(dtype)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+__doc__="""The module defining the background :class:`Loader`."""
+import logging
+
+from PyQt4 import QtCore
+
+from .core import Cancelled
+
+class Loader(QtCore.QThread):
+    """Run a blocking read on a worker thread.
+
+    The ``function`` is called on the worker thread as
+    ``function(progress, cancelled)`` where ``progress(done, total)``
+    reports the bytes read and ``cancelled()`` returns ``True`` once
+    :meth:`cancel` has been called.  Both follow the conventions of
+    :func:`core.read_node`.  The result is delivered to the GUI thread
+    through the :attr:`loaded` signal.  A cancelled load emits nothing
+    but :attr:`finished`.
+
+    ..  note::  HDF5 is not thread safe, for any pair of nodes or
+                files.  The ``function`` must only touch PyTables while
+                holding :data:`utils.hdf5_lock`, as the readers of
+                :mod:`core` do.  Several loaders may then run at once.
+
+    """
+    progress = QtCore.Signal(int)
+    """The percent of the bytes read."""
+    partial = QtCore.Signal(object)
+    """An early result, such as the first frame, from ``function``."""
+    loaded = QtCore.Signal(object)
+    """The value returned by ``function``."""
+    failed = QtCore.Signal(str)
+    """The message of an exception raised by ``function``."""
+
+    def __init__(self, function, parent=None):
+        """Prepare the loader.
+
+        Parameters
+        ----------
+
+        function : callable
+            The blocking work to run.
+        parent : :class:`PyQt4.QtCore.QObject`, optional
+            The parent object.
+
+        """
+        super(Loader, self).__init__(parent)
+        self._function = function
+        self._cancelled = False
+        self._percent = -1
+
+    def cancel(self):
+        """Ask the worker to stop at the next block."""
+        self._cancelled = True
+
+    def is_cancelled(self):
+        """Check if :meth:`cancel` has been called."""
+        return self._cancelled
+
+    def _progress(self, done, total):
+        """Emit :attr:`progress` only when the percent changes."""
+        percent = 100 *done //total if total > 0 else 100
+        if percent != self._percent:
+            self._percent = percent
+            self.progress.emit(percent)
+
+    def run(self):
+        """Call the function on the worker thread."""
+        logger = logging.getLogger(__name__ +".Loader.run")
+        try:
+            result = self._function(self._progress, self.is_cancelled)
+        except Cancelled:
+            logger.debug("Load cancelled")
+            return
+        except Exception as err:
+            logger.debug("Load failed", exc_info=True)
+            self.failed.emit(str(err))
+            return
+
+        if not self._cancelled:
+            self.loaded.emit(result)
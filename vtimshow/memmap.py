@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+__doc__="""Memory map contiguous nodes instead of reading them.
+
+An uncompressed node with the contiguous HDF5 layout is stored as one
+block of raw bytes in the file.  Such a node can be exposed as a
+read-only :class:`numpy.memmap` so the frames are served by the page
+cache of the operating system and nothing is copied up front.  PyTables
+does not report where the block starts, so the offset is looked up
+with h5py_ when it is installed.  Nodes that are chunked, compressed,
+not yet allocated, or in a file that cannot be mapped are read as
+usual.
+
+.. _h5py: http://www.h5py.org
+
+"""
+import logging
+
+import numpy
+import tables
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+from .utils import hdf5_lock
+
+def data_offset(node):
+    """Find the byte offset of the raw data of a contiguous node.
+
+    Parameters
+    ----------
+
+    node : :class:`tables.Array`
+        The node to locate.
+
+    Returns
+    -------
+
+    ret : int or ``None``
+        The offset in the file or ``None`` if it is unknown.
+
+    """
+    logger = logging.getLogger(__name__ +".data_offset")
+    if h5py is None:
+        return None
+
+    try:
+        # h5py may be linked to the same HDF5 library as PyTables.
+        with hdf5_lock, h5py.File(node._v_file.filename, "r") as h5:
+            return h5[node._v_pathname].id.get_offset()
+    except (OSError, KeyError) as err:
+        # The file may be locked by a writer or the node may not exist
+        # on disk yet.
+        logger.debug("No offset for {0!s}.  {1!s}".format(node, err))
+        return None
+
+def memmap_node(node):
+    """Map a node into memory if it is eligible.
+
+    Parameters
+    ----------
+
+    node : :class:`tables.Array`
+        The node to map.
+
+    Returns
+    -------
+
+    ret : :class:`numpy.memmap` or ``None``
+        A read-only map with the shape of the node or ``None`` if the
+        node has to be read.
+
+    """
+    logger = logging.getLogger(__name__ +".memmap_node")
+    if not isinstance(node, tables.Array) or node.chunkshape is not None:
+        return None
+    elif node.filters.complevel > 0 or node.dtype.kind not in "iuf":
+        return None
+    elif node._v_file.driver not in (None, "H5FD_SEC2"):
+        return None
+
+    offset = data_offset(node)
+    if offset is None:
+        return None
+
+    dtype = node.dtype
+    if node.byteorder == "little":
+        dtype = dtype.newbyteorder("<")
+    elif node.byteorder == "big":
+        dtype = dtype.newbyteorder(">")
+
+    try:
+        ret = numpy.memmap(
+            node._v_file.filename, dtype=dtype, mode="r", offset=offset,
+            shape=node.shape
+        )
+    except (OSError, ValueError) as err:
+        logger.debug("Unable to map {0!s}.  {1!s}".format(node, err))
+        return None
+
+    logger.debug("Mapped {0!s} at offset {1:d}".format(node, offset))
+    return ret
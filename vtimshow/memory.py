@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+__doc__="""The module defining the plugin wide memory budget.
+
+Every window in the plugin keeps some arrays resident in memory.  To
+keep several windows on large nodes from exhausting the workstation,
+each cached array is registered with the single :data:`budget` defined
+here.  When a new array would push the total over the limit set in the
+:class:`preferences.Preferences`, the least recently used arrays are
+released through the callback provided at registration.  The owner of
+the array is then responsible for reloading it on demand.
+
+"""
+import collections
+import logging
+import numpy
+
+from .preferences import Preferences
+
+class MemoryBudget:
+    """Track the bytes held by the registered caches.
+
+    Entries are kept in least recently used order.  Each entry is
+    identified by a hashable ``key`` chosen by the owner and holds the
+    number of bytes and a ``release`` callable.  An entry registered
+    with ``release=None`` is pinned; it counts against the budget but
+    is never evicted.
+
+    >>> budget = MemoryBudget(limit=100)
+    >>> freed = []
+    >>> budget.register("a", 60, lambda: freed.append("a"))
+    True
+    >>> budget.register("b", 60, lambda: freed.append("b"))
+    True
+    >>> freed
+    ['a']
+    >>> budget.used
+    60
+
+    """
+
+    def __init__(self, limit=0):
+        """Initialize an empty budget.
+
+        Parameters
+        ----------
+
+        limit : int, optional
+            The maximum number of bytes.  A value of 0 means the budget
+            is unlimited.
+
+        """
+        self.limit = limit
+        self._entries = collections.OrderedDict()
+        self._stats = collections.defaultdict(lambda: [0, 0])
+
+    @property
+    def used(self):
+        """The total number of registered bytes."""
+        return sum(nbytes for nbytes, _ in self._entries.values())
+
+    def fits(self, nbytes):
+        """Check if ``nbytes`` could ever fit within the budget.
+
+        Parameters
+        ----------
+
+        nbytes : int
+            The size of the candidate array.
+
+        Returns
+        -------
+
+        ret : bool
+            ``True`` if the budget is unlimited or evicting every
+            releasable entry would leave room for ``nbytes``.
+
+        """
+        if self.limit <= 0:
+            return True
+
+        pinned = sum(
+            size for size, release in self._entries.values()
+            if release is None
+        )
+        return pinned +nbytes <= self.limit
+
+    def register(self, key, nbytes, release=None):
+        """Register an array and evict older entries to make room.
+
+        Parameters
+        ----------
+
+        key : hashable
+            The identifier of the entry.  Registering an existing key
+            replaces the old entry.
+        nbytes : int
+            The size of the array in bytes.
+        release : callable or ``None``
+            Called with no arguments when the entry is evicted.  If
+            ``None``, the entry is pinned.
+
+        Returns
+        -------
+
+        ret : bool
+            ``False`` if the entry does not fit even after evicting
+            everything else.  The entry is registered regardless.
+
+        """
+        logger = logging.getLogger(__name__ +".MemoryBudget.register")
+        self._entries.pop(key, None)
+        self._evict(nbytes)
+        self._entries[key] = (nbytes, release)
+        self._stats[key][1] += 1
+        ok = self.limit <= 0 or self.used <= self.limit
+        if not ok:
+            logger.warning(
+                "Memory budget exceeded: {0:d} of {1:d} bytes".format(
+                    self.used, self.limit
+                )
+            )
+
+        return ok
+
+    def touch(self, key):
+        """Mark ``key`` as the most recently used entry."""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self._stats[key][0] += 1
+
+    def unregister(self, key):
+        """Forget ``key`` without calling its release callback."""
+        self._entries.pop(key, None)
+        self._stats.pop(key, None)
+
+    def entries(self, owner):
+        """List the entries belonging to ``owner``.
+
+        Keys are expected to be tuples with the ``id`` of the owning
+        object as the first item.
+
+        Parameters
+        ----------
+
+        owner : object
+            The object that registered the entries.
+
+        Returns
+        -------
+
+        ret : list
+            A ``(key, nbytes, hits, misses)`` tuple for each entry.
+
+        """
+        ret = []
+        for key, (nbytes, _) in self._entries.items():
+            if isinstance(key, tuple) and key[0] == id(owner):
+                hits, misses = self._stats[key]
+                ret.append((key, nbytes, hits, misses))
+
+        return ret
+
+    def unregister_owner(self, owner):
+        """Forget every entry belonging to ``owner``."""
+        for key, _, _, _ in self.entries(owner):
+            self.unregister(key)
+
+    def release_owner(self, owner):
+        """Evict every releasable entry belonging to ``owner``."""
+        for key, _, _, _ in self.entries(owner):
+            self.release(key)
+
+    def release(self, key):
+        """Evict ``key`` immediately if it is releasable."""
+        nbytes, release = self._entries.get(key, (0, None))
+        if release is not None:
+            del self._entries[key]
+            release()
+
+    def _evict(self, nbytes):
+        """Release least recently used entries until ``nbytes`` fit."""
+        logger = logging.getLogger(__name__ +".MemoryBudget._evict")
+        if self.limit <= 0:
+            return
+
+        for key in list(self._entries):
+            if self.used +nbytes <= self.limit:
+                break
+
+            size, release = self._entries[key]
+            if release is None:
+                continue
+
+            logger.debug("Evicting {0!s} ({1:d} bytes)".format(key, size))
+            del self._entries[key]
+            release()
+
+class RGBBuffer:
+    """A persistent (H,W,3) array to compose color channels into.
+
+    Writing the channels into the same array on every update avoids
+    allocating a new image each time a frame selector moves.  The array
+    is only reallocated when the shape or dtype of the channels change,
+    and it is registered with the :data:`budget` under the ``owner``.
+
+    """
+
+    def __init__(self, owner):
+        """Initialize an empty buffer.
+
+        Parameters
+        ----------
+
+        owner : object
+            The window the buffer is accounted to.
+
+        """
+        self.array = None
+        self._key = (id(owner), "rgb")
+
+    def release(self):
+        """Drop the array so it is reallocated on the next update."""
+        self.array = None
+
+    def compose(self, R, G, B, changed=(True, True, True)):
+        """Write the channels into the buffer.
+
+        Parameters
+        ----------
+
+        R, G, B : :class:`numpy.ndarray`
+            Broadcast compatible monochrome frames.
+        changed : tuple of bool, optional
+            Flags for the channels that differ from the previous call.
+            The others are only written if the buffer is reallocated.
+
+        Returns
+        -------
+
+        ret : :class:`numpy.ndarray`
+            The C ordered (H,W,3) buffer holding the channels.
+
+        """
+        shape = numpy.broadcast(R, G, B).shape +(3,)
+        dtype = numpy.result_type(R, G, B)
+        if self.array is None or self.array.shape != shape \
+                or self.array.dtype != dtype:
+            self.array = numpy.empty(shape, dtype)
+            budget.register(self._key, self.array.nbytes, self.release)
+            changed = (True, True, True)
+        else:
+            budget.touch(self._key)
+
+        for channel, frame in enumerate((R, G, B)):
+            if changed[channel]:
+                self.array[..., channel] = frame
+
+        return self.array
+
+def usage_report(owners, timings):
+    """Summarize the memory and timings of a window.
+
+    Parameters
+    ----------
+
+    owners : iterable
+        The objects whose budget entries belong to the window.
+    timings : dict
+        The duration in seconds of the last call of each stage.
+
+    Returns
+    -------
+
+    ret : string
+        A human readable report.
+
+    """
+    lines = []
+    total = 0
+    for owner in owners:
+        for key, nbytes, hits, misses in budget.entries(owner):
+            total += nbytes
+            calls = hits +misses
+            rate = 100.0 *hits /calls if calls > 0 else 0.0
+            lines.append(
+                "{0:s}: {1:.1f} MB, {2:.0f}% hits of {3:d}".format(
+                    str(key[1]), nbytes /1024**2, rate, calls
+                )
+            )
+
+    lines.insert(0, "Resident: {0:.1f} MB".format(total /1024**2))
+    for stage in sorted(timings):
+        lines.append("Last {0:s}: {1:.1f} ms".format(
+            stage, 1000 *timings[stage]
+        ))
+
+    return "\n".join(lines)
+
+def _load_limit():
+    """Read the budget from the preferences in bytes."""
+    try:
+        megabytes = int(Preferences()["Memory"]["Budget"])
+    except ValueError:
+        megabytes = 0
+
+    return max(megabytes, 0) *1024**2
+
+budget = MemoryBudget(_load_limit())
+"""The budget shared by every window of the plugin."""
@@ -14,7 +14,14 @@ from vitables.vtapp import translate as _translate
 
 from . import plugin_class
 from .colorrow import ColorRow
-from .utils import divide
+from .core import CHANNELS, Cancelled, FramePipeline, frame_metrics
+from .core import iter_cube
+from .core import compute as _compute
+from .export import export_frames
+from .memory import budget, usage_report, RGBBuffer
+from .preferences import Preferences
+from .utils import add_profiling_actions as _add_profiling_actions
+from .utils import timed as _timed
 
 class MultiCubeMath(QtGui.QMdiSubWindow):
     """The class to perform cross data set frame math.
@@ -25,7 +32,17 @@ class MultiCubeMath(QtGui.QMdiSubWindow):
     dataset that has been revealed in the tree viewer and then selects
     the mathematical operation to perform on the datasets.  If the user
     selects datasets that cannot be used in a valid equation, the
-    corresponding buttons are disabled.
+    corresponding buttons are disabled.  When a frame selector moves,
+    only that channel is fetched again and the terms of the operation
+    that depend on the other channels are reused by a
+    :class:`core.FramePipeline`.  The result, or the operation
+    applied to every frame, can be exported to an HDF5 file.  With
+    "All frames" checked, the operation is applied to every frame of
+    the cubes and the result can be scrubbed in the image view.  The
+    cubes are streamed in depth blocks by :func:`core.iter_cube`, so
+    only the result has to fit in the memory budget.  With "Compare R
+    and G" checked, the curves of :func:`core.frame_metrics` are drawn
+    in the plots of the red and green rows.
 
     ..  note::  The ability to work with 4D arrays is included; however,
                 this functionality is considered experimental because a
@@ -67,6 +84,13 @@ class MultiCubeMath(QtGui.QMdiSubWindow):
         self._layout.addWidget(self.image_view, 0, 0, 1, 1)
         self._layout.setRowStretch(0, 10)
         self._layout.setColumnStretch(0, 10)
+        self.timings = {}
+        self._precision = Preferences()["Math"]["Precision"]
+        self._rgb = RGBBuffer(self)
+        self._pipeline = FramePipeline(self._precision, self._rgb)
+        self._shown = None
+        self._cube_key = None
+        self._metrics_key = None
 
         self._add_color_panels(indexes)
         self._add_math_group()
@@ -80,6 +104,209 @@ class MultiCubeMath(QtGui.QMdiSubWindow):
         self._update_dbt_leaf()
         self.pindex = None
 
+        if self.image_view.menu is None:
+            self.image_view.buildMenu()
+
+        action = QtGui.QAction("Memory usage", self.image_view.menu)
+        vitables.utils.addToMenu(self.image_view.menu, action)
+        action.triggered.connect(self.show_usage)
+
+        action = QtGui.QAction("Release caches", self.image_view.menu)
+        vitables.utils.addToMenu(self.image_view.menu, action)
+        action.triggered.connect(self.release_caches)
+
+        action = QtGui.QAction("Export result", self.image_view.menu)
+        vitables.utils.addToMenu(self.image_view.menu, action)
+        action.triggered.connect(self.export)
+        _add_profiling_actions(self.image_view.menu)
+
+    def _frame_count(self):
+        """The number of frames shared by all of the cubes.
+
+        Returns ``None`` if no channel is a cube.  Channels that are a
+        single image are used unchanged with every frame.
+
+        """
+        counts = [
+            row.frame_count() for row in self._colors.values()
+            if row.frame_count() is not None
+        ]
+        return min(counts) if counts else None
+
+    def _channels(self, label):
+        """The channels used by ``label`` for :func:`core.iter_cube`.
+
+        Rows holding a cube pass their :class:`core.FrameSource` and
+        rows holding a single image pass that image.
+
+        """
+        channels = [None, None, None]
+        for idx, color in enumerate(("Red", "Green", "Blue")):
+            if idx >= CHANNELS[label]:
+                break
+
+            row = self._colors[color]
+            if row.frame_count() is None:
+                channels[idx] = row.get_frame(block=True)
+            else:
+                channels[idx] = row.source
+
+        return channels
+
+    def _iter_cube(self, label, count, progress):
+        """Compute ``label`` over the first ``count`` frames by block.
+
+        Parameters
+        ----------
+
+        label : string
+            The operation.
+        count : int
+            The number of frames.
+        progress : :class:`PyQt4.QtGui.QProgressDialog`
+            The dialog updated after each block.  Cancelling it raises
+            :class:`core.Cancelled`.
+
+        """
+        return iter_cube(
+            label, self._channels(label), count,
+            precision=self._precision,
+            progress=lambda done, total: progress.setValue(done),
+            cancelled=progress.wasCanceled
+        )
+
+    def _iter_result(self, label, count, progress):
+        """Compute ``label`` over the first ``count`` frames.
+
+        Cancelling the ``progress`` dialog raises :class:`core.Cancelled`
+        so the partial export is discarded.
+
+        """
+        for _, result in self._iter_cube(label, count, progress):
+            for frame in result:
+                yield frame
+
+    def export(self):
+        """Export the current result to a node in an HDF5 file.
+
+        The user selects the file and node path.  If the channels are
+        cubes, the user may export the operation applied to every
+        frame instead of only the displayed frame.  The frames are
+        streamed to the file so the result never has to fit in memory.
+
+        """
+        logger = logging.getLogger(__name__ +".MultiCubeMath.export")
+        button = self._math_buttons.checkedButton()
+        if button is None or not button.isEnabled():
+            logger.error(_translate(
+                plugin_class,
+                "Select an operation before exporting!",
+                "Plugin error message"
+            ))
+            return
+
+        if any(row.loading for row in self._colors.values()):
+            logger.error(_translate(
+                plugin_class,
+                "Wait for the datasets to load before exporting!",
+                "Plugin error message"
+            ))
+            return
+
+        title = _translate(plugin_class, "Export result", "Title")
+        filename = QtGui.QFileDialog.getSaveFileName(
+            self, title, "", "HDF5 (*.h5 *.hdf5 *.hdf)"
+        )
+        if not filename:
+            return
+
+        nodepath, ok = QtGui.QInputDialog.getText(
+            self, title, _translate(plugin_class, "Node path", "Label"),
+            text="/result"
+        )
+        if not ok or not nodepath.startswith("/"):
+            return
+
+        count = self._frame_count()
+        if count is not None:
+            answer = QtGui.QMessageBox.question(
+                self, title,
+                _translate(
+                    plugin_class,
+                    "Export all {0:d} frames?",
+                    "Plugin question"
+                ).format(count),
+                QtGui.QMessageBox.Yes|QtGui.QMessageBox.No
+            )
+            if answer != QtGui.QMessageBox.Yes:
+                count = None
+
+        progress = QtGui.QProgressDialog(
+            title, _translate(plugin_class, "Cancel", "Button"), 0,
+            count or 1, self
+        )
+        progress.setWindowModality(QtCore.Qt.WindowModal)
+        label = button.text()
+        try:
+            if count is None:
+                R, G, B = self._get_frames(block=True)
+                frames = [_compute(label, R, G, B, self._precision)]
+                written = export_frames(filename, nodepath, frames, 1)
+            else:
+                written = export_frames(
+                    filename, nodepath,
+                    self._iter_result(label, count, progress), count
+                )
+        except Cancelled:
+            logger.info("Export to {0:s}:{1:s} cancelled".format(
+                filename, nodepath
+            ))
+            return
+        except (ValueError, OSError, tables.NodeError,
+                tables.HDF5ExtError) as err:
+            logger.error(_translate(
+                plugin_class,
+                "Unable to export to {0:s}:{1:s}.  {2!s}".format(
+                    filename, nodepath, err
+                ),
+                "Plugin error message"
+            ))
+            return
+        finally:
+            progress.close()
+
+        logger.info("Exported {0:d} frame(s) to {1:s}:{2:s}".format(
+            written, filename, nodepath
+        ))
+
+    def show_usage(self):
+        """Report the memory held and the last stage timings."""
+        timings = dict(self.timings)
+        for color, row in self._colors.items():
+            for stage, value in row.timings.items():
+                timings["{0:s} {1:s}".format(color, stage)] = value
+
+        QtGui.QMessageBox.information(
+            self,
+            _translate(plugin_class, "Memory usage", "Title"),
+            usage_report([self] +list(self._colors.values()), timings)
+        )
+
+    def release_caches(self):
+        """Release every cache of the window that can be reloaded."""
+        budget.release_owner(self)
+        for row in self._colors.values():
+            budget.release_owner(row)
+
+    def closeEvent(self, event):
+        """Return the memory held by the color rows to the budget."""
+        budget.unregister_owner(self)
+        for row in self._colors.values():
+            row.close_source()
+            budget.unregister_owner(row)
+
+        super(MultiCubeMath, self).closeEvent(event)
+
     def _add_color_panels(self, indexes):
         """Add the color channels to the window.
 
@@ -139,44 +366,170 @@ class MultiCubeMath(QtGui.QMdiSubWindow):
             button.clicked.connect(function)
             self._math_layout.addWidget(button, row, 0, 1, 1)
 
+        row += 1
+        self._all_frames = QtGui.QCheckBox(
+            _translate(plugin_class, "All frames", "Check box"),
+            self._math_group
+        )
+        self._all_frames.toggled.connect(self._update_image)
+        self._math_layout.addWidget(self._all_frames, row, 0, 1, 1)
+
+        row += 1
+        self._compare = QtGui.QCheckBox(
+            _translate(plugin_class, "Compare R and G", "Check box"),
+            self._math_group
+        )
+        self._compare.toggled.connect(self._update_metrics)
+        self._math_layout.addWidget(self._compare, row, 0, 1, 1)
+
         self._layout.addWidget(self._math_group, 1, 1, 3, 1)
         self._update_math_group()
 
-    def _get_frames(self):
-        """Programmatically get the frames."""
-        R = self._colors["Red"].get_frame()
-        G = self._colors["Green"].get_frame()
-        B = self._colors["Blue"].get_frame()
+    def _get_frames(self, block=False):
+        """Programmatically get the frames.
+
+        A channel still being read returns ``None`` unless ``block`` is
+        set.  See :meth:`ColorRow.get_frame`.
+
+        """
+        R = self._colors["Red"].get_frame(block=block)
+        G = self._colors["Green"].get_frame(block=block)
+        B = self._colors["Blue"].get_frame(block=block)
         return R, G, B
 
-    def _show_r(self):
-        """Show the R band image in monochrome."""
-        R, G, B = self._get_frames()
-        #self.image_view.getImageItem().updateImage(R)
+    def _display(self, image):
+        """Set the computed ``image`` on the image view."""
+        with _timed(self.timings, "render"):
+            self.image_view.setImage(image)
+
+    def _drop_cube(self):
+        """Forget the result of :meth:`_show_cube`.
+
+        This is also the release callback of the result in the
+        :data:`memory.budget`, so it is computed again when shown next.
+
+        """
+        self._cube_key = None
+        budget.unregister((id(self), "cube"))
+
+    def _show_cube(self, label):
+        """Compute ``label`` over every frame and show the result.
+
+        The result is only recomputed when the operation, a node, or a
+        filter changes, so moving the frame selectors of the rows does
+        not trigger a new pass over the cubes.
+
+        """
+        logger = logging.getLogger(__name__ +".MultiCubeMath._show_cube")
+        rows = [
+            self._colors[color] for color in ("Red", "Green", "Blue")
+        ][:CHANNELS[label]]
+        if any(row.loading for row in rows):
+            # Never read a node while a loader is reading it.  The row
+            # emits ``frame_changed`` once it is done.
+            return
+
+        # The generation of a row changes with its node, filter, and
+        # window, unlike the id of a source that may be reused.
+        key = (label,) +tuple(row.frame_key()[0] for row in rows)
+        if key == self._cube_key:
+            return
+
+        self._drop_cube()
+        count = self._frame_count()
+        if not count:
+            return
+
+        progress = QtGui.QProgressDialog(
+            _translate(plugin_class, "Computing all frames", "Title"),
+            _translate(plugin_class, "Cancel", "Button"), 0, count, self
+        )
+        progress.setWindowModality(QtCore.Qt.WindowModal)
+        cube = None
+        try:
+            with _timed(self.timings, "math"):
+                blocks = self._iter_cube(label, count, progress)
+                for start, result in blocks:
+                    if cube is None:
+                        nbytes = count *(result.nbytes //len(result))
+                        if not budget.fits(nbytes):
+                            logger.error(_translate(
+                                plugin_class,
+                                "The result of {0:d} frames does not fit "
+                                "in the memory budget!".format(count),
+                                "Plugin error message"
+                            ))
+                            self._all_frames.setChecked(False)
+                            return
+
+                        cube = numpy.empty(
+                            (count,) +result.shape[1:], dtype=result.dtype
+                        )
+
+                    cube[start:start +len(result)] = result
+        except Cancelled:
+            self._all_frames.setChecked(False)
+            return
+        finally:
+            progress.close()
+
+        budget.register((id(self), "cube"), cube.nbytes, self._drop_cube)
+        self._cube_key = key
+        self._shown = None
+        self._display(cube)
+
+    def _show(self, label):
+        """Compute the operation ``label`` and show the result."""
+        if self._all_frames.isChecked() and self._all_frames.isEnabled():
+            self._show_cube(label)
+            return
+
+        self._drop_cube()
+        rows = [
+            self._colors[color] for color in ("Red", "Green", "Blue")
+        ][:CHANNELS[label]]
+        for channel, row in enumerate(rows):
+            # Only the channels whose frame changed are fetched again.
+            self._pipeline.update(channel, row.frame_key(), row.get_frame)
+
+        if any(frame is None for frame in self._pipeline.frames[:len(rows)]):
+            # A channel is still loading.  The row emits
+            # ``frame_changed`` once it is done.
+            return
+
+        shown = (label, tuple(self._pipeline.keys[:len(rows)]))
+        if shown == self._shown:
+            return
+
+        with _timed(self.timings, "math"):
+            image = self._pipeline.compute(label)
+
+        self._shown = shown
+
+        #self.image_view.getImageItem().updateImage(image)
         # Calling ``updateImage`` also works, but the brightness range
         # is not automatically updated.  So, just set the image for now.
-        self.image_view.setImage(R)
+        self._display(image)
+
+    def _show_r(self):
+        """Show the R band image in monochrome."""
+        self._show("R")
 
     def _show_rgb(self):
         """Show the RGB image."""
-        R, G, B = self._get_frames()
-        image = numpy.dstack((R, G, B))
-        self.image_view.setImage(image)
+        self._show("RGB")
 
     def _show_r_minus_g(self):
         """Show :math:`R - G`."""
-        R, G, B = self._get_frames()
-        self.image_view.setImage(R - G)
+        self._show("R - G")
 
     def _show_r_by_g(self):
         """Show :math:`R / G`."""
-        R, G, B = self._get_frames()
-        self.image_view.setImage(divide(R, G))
+        self._show("R / G")
 
     def _show_r_minus_g_by_b(self):
         """Show :math:`(R - G) / B`."""
-        R, G, B = self._get_frames()
-        self.image_view.setImage(divide(R - G, B))
+        self._show("(R - G) / B")
 
     def _update_dbt_leaf(self):
         """Have the ``dbt_leaf`` mirror one of the leaves.
@@ -198,11 +551,88 @@ class MultiCubeMath(QtGui.QMdiSubWindow):
     def _update_image(self):
         """Call all update routines after updating the image."""
         self._update_math_group()
+        self._update_metrics()
         button = self._math_buttons.checkedButton()
         if button is not None and button.isEnabled():
             button.click()
 
 
+    def _clear_metrics(self):
+        """Remove the comparison curves from the rows."""
+        if self._metrics_key is not None:
+            self._metrics_key = None
+            for color in ("Red", "Green"):
+                self._colors[color].show_curves({})
+
+    def _update_metrics(self):
+        """Draw the frame by frame comparison of the R and G cubes.
+
+        The RMSE and the largest absolute difference are drawn in the
+        plot of the red row and the correlation in the plot of the
+        green row.  The metrics are only recomputed when a node, a
+        filter, or a window of the two rows changes.
+
+        """
+        logger = logging.getLogger(
+            __name__ +".MultiCubeMath._update_metrics"
+        )
+        red = self._colors["Red"]
+        green = self._colors["Green"]
+        counts = [
+            row.frame_count() for row in (red, green)
+            if row.frame_count() is not None
+        ]
+        count = min(counts) if counts else None
+        if not self._compare.isChecked() or count is None \
+                or red.source is None or green.source is None:
+            self._clear_metrics()
+            return
+        elif red.loading or green.loading:
+            # The rows emit ``frame_changed`` once they are done.
+            return
+
+        key = tuple(row.frame_key()[0] for row in (red, green))
+        if key == self._metrics_key:
+            return
+
+        progress = QtGui.QProgressDialog(
+            _translate(plugin_class, "Comparing R and G", "Title"),
+            _translate(plugin_class, "Cancel", "Button"), 0, count, self
+        )
+        progress.setWindowModality(QtCore.Qt.WindowModal)
+        channels = [
+            row.source if row.frame_count() is not None
+            else row.get_frame(block=True)
+            for row in (red, green)
+        ]
+        try:
+            with _timed(self.timings, "compare"):
+                metrics = frame_metrics(
+                    channels[0], channels[1], count,
+                    progress=lambda done, total: progress.setValue(done),
+                    cancelled=progress.wasCanceled
+                )
+        except Cancelled:
+            self._compare.setChecked(False)
+            return
+        except ValueError as err:
+            logger.error(_translate(
+                plugin_class,
+                "Unable to compare the datasets.  {0!s}".format(err),
+                "Plugin error message"
+            ))
+            self._compare.setChecked(False)
+            return
+        finally:
+            progress.close()
+
+        self._metrics_key = key
+        red.show_curves({
+            name: metrics[name]
+            for name in ("RMSE", "Max abs difference")
+        })
+        green.show_curves({"Correlation": metrics["Correlation"]})
+
     def _update_math_group(self):
         """Ensure only reasonable math can be performed.
 
@@ -218,14 +648,15 @@ class MultiCubeMath(QtGui.QMdiSubWindow):
         for button in self._math_buttons.buttons():
             button.setEnabled(True)
 
-        if self._colors["Red"].index is None:
+        self._all_frames.setEnabled(self._frame_count() is not None)
+        if self._colors["Red"].data is None:
             for button in self._math_buttons.buttons():
                 button.setEnabled(False)
 
             return
 
         for key in ("Green", "Blue"):
-            if self._colors[key].index is None:
+            if self._colors[key].data is None:
                 for button in self._math_buttons.buttons():
                     if key[0] in button.text():
                         button.setEnabled(False)
@@ -234,7 +665,7 @@ class MultiCubeMath(QtGui.QMdiSubWindow):
         compatible = True
         dims = self._colors["Red"].data.shape
         for key, val in self._colors.items():
-            if key == "Red" or val.index is None:
+            if key == "Red" or val.data is None:
                 continue
 
             rgb |= (val.data.ndim == 4) | (
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+__doc__="""The module defining :class:`Playback`.
+
+Playing a cube with the :class:`pyqtgraph.ImageView` reads and levels
+every frame on the GUI thread when it is due, so a slow frame stalls
+the display.  :class:`Playback` instead plays at a target frame rate
+from a :class:`DecodeAhead` pipeline.  A worker thread reads the
+frames, converts them to ``uint8`` with fixed levels, and keeps a
+bounded queue filled ahead of the display.  A frame that is not ready
+when it is due is dropped instead of waiting for it.  If too many are
+dropped, the frames are decimated spatially until the reads keep up,
+and the decimation is relaxed again once nothing has been dropped for
+a few seconds.
+
+"""
+import collections
+import logging
+import queue
+import threading
+import time
+
+import numpy
+
+from PyQt4 import QtCore
+from PyQt4 import QtGui
+
+from vitables.vtapp import translate as _translate
+
+from . import plugin_class
+
+def to_uint8(frame, levels):
+    """Scale ``frame`` to ``uint8`` with fixed ``levels``.
+
+    Parameters
+    ----------
+
+    frame : :class:`numpy.ndarray`
+        The (H,W) or (H,W,3) frame.
+    levels : tuple
+        The values mapped to 0 and 255.
+
+    Returns
+    -------
+
+    ret : :class:`numpy.ndarray`
+        The display ready frame.
+
+    """
+    low, high = levels
+    scale = 255.0 /(high -low) if high > low else 0.0
+    ret = numpy.subtract(frame, low, dtype=numpy.float32)
+    ret *= scale
+    numpy.clip(ret, 0, 255, out=ret)
+    return ret.astype(numpy.uint8)
+
+class DecodeAhead:
+    """Prepare frames for display on a worker thread.
+
+    Frames are numbered by the display tick, so tick ``n`` shows frame
+    ``n % len(frames)``.  The worker always prepares the first tick that
+    has not been shown yet, so it skips ahead when the display drops
+    frames instead of falling further behind.
+
+    """
+
+    def __init__(self, frames, levels, depth=8):
+        """Prepare the pipeline.
+
+        Parameters
+        ----------
+
+        frames : array_like
+            The (N,H,W) or (N,H,W,3) cube.  It must be safe to index
+            from another thread.
+        levels : tuple
+            The fixed levels passed to :func:`to_uint8`.
+        depth : int, optional
+            The maximum number of prepared frames.
+
+        """
+        self.frames = frames
+        self.levels = levels
+        self.step = 1
+        self.tick = 0
+        self._queue = queue.Queue(depth)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, tick=0):
+        """Start preparing frames from ``tick``."""
+        self.stop()
+        self.tick = tick
+        self._queue = queue.Queue(self._queue.maxsize)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the worker and wait for it."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        """Fill the queue until stopped."""
+        tick = self.tick
+        count = len(self.frames)
+        while not self._stop.is_set():
+            tick = max(tick, self.tick)
+            step = self.step
+            frame = to_uint8(
+                self.frames[tick %count][::step, ::step], self.levels
+            )
+            while not self._stop.is_set():
+                try:
+                    self._queue.put((tick, step, frame), timeout=0.05)
+                    break
+                except queue.Full:
+                    continue
+
+            tick += 1
+
+    def next(self):
+        """Take the frame of the current tick and advance the tick.
+
+        Returns
+        -------
+
+        ret : tuple or ``None``
+            The frame index, decimation step, and ``uint8`` frame or
+            ``None`` if the frame was not ready and is dropped.
+
+        """
+        tick = self.tick
+        self.tick += 1
+        while True:
+            try:
+                shown, step, frame = self._queue.get_nowait()
+            except queue.Empty:
+                return None
+
+            if shown == tick:
+                return shown %len(self.frames), step, frame
+            elif shown > tick:
+                # The worker has already moved past this tick.
+                return None
+
+class Playback:
+    """The class to play a cube at a fixed frame rate.
+
+    This takes a reference to the parent :class:`ImageWindow` and adds a
+    hidden frame with the controls to the bottom of its
+    :class:`pyqtgraph.ImageView`, like :class:`framemath.FrameMath`.  A
+    menu option toggles the frame.  The frame holds a play button, the
+    target frame rate, and a label with the achieved frame rate, the
+    dropped frames, and the decimation.  The levels are fixed to those
+    of the histogram when play is pressed.
+
+    """
+
+    DROP_LIMIT = 0.1
+    """The fraction of dropped frames that triggers decimation."""
+    MAX_STEP = 8
+    """The largest spatial decimation."""
+    RECOVER = 3.0
+    """The seconds without a dropped frame before the decimation is
+    reduced again."""
+
+    def __init__(self, parent):
+        """Initialize the playback frame.
+
+        Parameters
+        ----------
+
+        parent : :class:`imagewindow.ImageWindow`
+            The window holding the image.
+
+        """
+        self.parent = parent
+        self.pipeline = None
+        image = parent.image.image
+        if image is None or image.ndim < 3 or image.shape[0] < 2:
+            return
+
+        self.group = QtGui.QGroupBox()
+        self.layout = QtGui.QGridLayout(self.group)
+        self.layout.setMargin(0)
+        self.layout.setSpacing(0)
+
+        self.playButton = QtGui.QPushButton(
+            _translate(plugin_class, "Play", "Button"), self.group
+        )
+        self.playButton.setCheckable(True)
+        self.playButton.toggled.connect(self._play_toggled)
+        self.layout.addWidget(self.playButton, 0, 0, 1, 1)
+
+        self.fpsSpin = QtGui.QSpinBox(self.group)
+        self.fpsSpin.setRange(1, 120)
+        self.fpsSpin.setValue(25)
+        self.fpsSpin.setSuffix(" fps")
+        self.fpsSpin.valueChanged.connect(self._fps_changed)
+        self.layout.addWidget(self.fpsSpin, 0, 1, 1, 1)
+
+        self.status = QtGui.QLabel(self.group)
+        self.layout.addWidget(self.status, 0, 2, 1, 1)
+        self.layout.setColumnStretch(2, 1)
+
+        self.timer = QtCore.QTimer(self.group)
+        self.timer.timeout.connect(self._tick)
+
+        self.parent.image.ui.gridLayout_3.addWidget(
+            self.group, 3, 0, 1, 1
+        )
+        self.group.setTitle(_translate(plugin_class, "Playback", "Layout"))
+        self.group.hide()
+
+        self.menuAction = QtGui.QAction(
+            "Playback", self.parent.image.menu
+        )
+        self.menuAction.setCheckable(True)
+        self.menuAction.toggled.connect(self.toggled)
+        self.parent.image.menu.addAction(self.menuAction)
+
+    def toggled(self, b):
+        """Toggle the frame on and off.
+
+        Parameters
+        ----------
+
+        b : bool
+            Passed by the menu signal.
+
+        """
+        self.group.setVisible(b)
+        if not b:
+            self.playButton.setChecked(False)
+
+    def _fps_changed(self, fps):
+        """Apply a new target frame rate."""
+        self.timer.setInterval(int(round(1000.0 /fps)))
+
+    def _play_toggled(self, play):
+        """Start or stop playing."""
+        if play:
+            self.start()
+        else:
+            self.stop()
+
+    def start(self):
+        """Start playing from the current frame."""
+        logger = logging.getLogger(__name__ +".Playback.start")
+        view = self.parent.image
+        levels = view.ui.histogram.getLevels()
+        logger.debug("Playing with levels {0!s}".format(levels))
+        self.pipeline = DecodeAhead(view.image, levels)
+        self._levels = levels
+        self._steady = time.perf_counter()
+        self._shown = collections.deque()
+        self._dropped = collections.deque()
+        self.dropped = 0
+        self._last = view.currentIndex
+        self.pipeline.start(view.currentIndex)
+        self._fps_changed(self.fpsSpin.value())
+        self.timer.start()
+
+    def stop(self):
+        """Stop playing and leave the view on the last frame shown.
+
+        The levels of the image are restored from the ``uint8`` range
+        of the played frames to those of the histogram.
+
+        """
+        if self.pipeline is None:
+            return
+
+        self.timer.stop()
+        self.pipeline.stop()
+        self.pipeline = None
+        item = self.parent.image.getImageItem()
+        item.setScale(1)
+        item.setLevels(self._levels)
+        self.parent.image.setCurrentIndex(self._last)
+        self.playButton.setChecked(False)
+
+    def _tick(self):
+        """Show the next frame or count it as dropped."""
+        now = time.perf_counter()
+        ready = self.pipeline.next()
+        if ready is None:
+            self.dropped += 1
+            self._dropped.append(now)
+        else:
+            self._last, step, frame = ready
+            item = self.parent.image.getImageItem()
+            item.setImage(frame, autoLevels=False, levels=(0, 255))
+            item.setScale(step)
+            self._shown.append(now)
+
+        # Keep the last second of history.
+        for history in (self._shown, self._dropped):
+            while history and history[0] < now -1.0:
+                history.popleft()
+
+        self._adapt(now)
+        self.status.setText(
+            "{0:.1f} fps, {1:d} dropped, 1/{2:d}".format(
+                len(self._shown), self.dropped, self.pipeline.step
+            )
+        )
+
+    def _adapt(self, now):
+        """Decimate the frames if the reads cannot keep up.
+
+        The decimation is halved again once no frame has been dropped
+        for :attr:`RECOVER` seconds.
+
+        """
+        logger = logging.getLogger(__name__ +".Playback._adapt")
+        total = len(self._shown) +len(self._dropped)
+        if total < self.fpsSpin.value():
+            # Wait for a full second of history.
+            return
+
+        if self._dropped:
+            self._steady = now
+
+        if len(self._dropped) > self.DROP_LIMIT *total \
+                and self.pipeline.step < self.MAX_STEP:
+            self.pipeline.step *= 2
+            logger.info("Decimating playback by {0:d}".format(
+                self.pipeline.step
+            ))
+        elif self.pipeline.step > 1 and now -self._steady > self.RECOVER:
+            self.pipeline.step //= 2
+            self._steady = now
+            logger.info("Reducing the playback decimation to {0:d}".format(
+                self.pipeline.step
+            ))
+        else:
+            return
+
+        self._shown.clear()
+        self._dropped.clear()
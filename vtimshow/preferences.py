@@ -13,9 +13,16 @@ class Preferences(configparser.ConfigParser):
     from :class:`configparser.ConfigParser`, we simply add the sections
     '2D', '3D', and '4D' to the parser to define the three possible
     scenarios.  The options in each section are 'Depth', 'Height',
-    'Width', and 'RGB(A)' as appropriate.  Reading and writing the
-    preferences file is left to the base class; however, if the INI file
-    is not provided on construction, a row-major ordering is assumed.
+    'Width', and 'RGB(A)' as appropriate.  The section 'Memory' holds
+    the 'Budget' in megabytes shared by all of the windows where 0
+    means unlimited and the size of the 'DiskCache' of filter results
+    in megabytes where 0 disables it.  The section 'Math' holds the
+    'Precision' policy passed to :func:`utils.result_dtype`.  The
+    section 'Filters' holds the 'Timeout' in seconds after which a
+    filter plugin is stopped where 0 means no limit.  Reading and
+    writing the preferences file is left to the base class; however,
+    if the INI file is not provided on construction, a row-major
+    ordering is assumed.
 
     >>> pref = Preferences()
     >>> for dim in ('Height', 'Width', 'RGB(A)'):
@@ -34,6 +41,14 @@ class Preferences(configparser.ConfigParser):
     Height 1
     Width 2
     RGB(A) 3
+    >>> print(pref['Memory']['Budget'])
+    0
+    >>> print(pref['Memory']['DiskCache'])
+    1024
+    >>> print(pref['Math']['Precision'])
+    native
+    >>> print(pref['Filters']['Timeout'])
+    600
 
     """
     _inifile = pkg_resources.resource_filename(
@@ -78,3 +93,24 @@ class Preferences(configparser.ConfigParser):
                 if opt not in self[dim]:
                     self[dim][opt] = val
 
+        if "Memory" not in self:
+            self["Memory"] = {}
+
+        if "Budget" not in self["Memory"]:
+            self["Memory"]["Budget"] = "0"
+
+        if "DiskCache" not in self["Memory"]:
+            self["Memory"]["DiskCache"] = "1024"
+
+        if "Math" not in self:
+            self["Math"] = {}
+
+        if "Precision" not in self["Math"]:
+            self["Math"]["Precision"] = "native"
+
+        if "Filters" not in self:
+            self["Filters"] = {}
+
+        if "Timeout" not in self["Filters"]:
+            self["Filters"]["Timeout"] = "600"
+
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+__doc__="""Lightweight timing of the hot paths.
+
+The read, transpose, filter, math, and render stages are wrapped with
+:func:`utils.timed`.  In addition to the last duration kept by each
+window, the durations are passed to the shared :data:`profiler` when it
+is enabled.  The profiler keeps the call count, total time, and a
+histogram of latencies in power of two microsecond buckets for each
+stage.  When disabled, the cost is a single attribute check per call.
+
+Profiling starts enabled if the ``VTIMSHOW_PROFILE`` environment
+variable is set to anything but an empty string or 0.  If its value is
+a path other than 1, the summary is written there as JSON when the
+interpreter exits.
+
+"""
+import atexit
+import collections
+import json
+import logging
+import os
+
+class StageStats:
+    """The statistics of one stage."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+        self.buckets = collections.Counter()
+
+    def add(self, seconds):
+        """Record one call that took ``seconds``."""
+        self.count += 1
+        self.total += seconds
+        self.maximum = max(self.maximum, seconds)
+        # Bucket k holds durations in [2**(k-1), 2**k) microseconds.
+        self.buckets[int(seconds *1e6).bit_length()] += 1
+
+    def as_dict(self):
+        """The statistics as plain types for JSON."""
+        return {
+            "count": self.count,
+            "total_s": self.total,
+            "mean_s": self.total /self.count if self.count else 0.0,
+            "max_s": self.maximum,
+            "histogram_us": {
+                str(2**k if k else 0): n
+                for k, n in sorted(self.buckets.items())
+            },
+        }
+
+class Profiler:
+    """Collect :class:`StageStats` by stage name.
+
+    >>> prof = Profiler(enabled=True)
+    >>> prof.record("read", 0.002)
+    >>> prof.summary()["read"]["count"]
+    1
+
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.stages = collections.defaultdict(StageStats)
+
+    def record(self, stage, seconds):
+        """Add a duration to ``stage`` if enabled."""
+        if self.enabled:
+            self.stages[stage].add(seconds)
+
+    def reset(self):
+        """Forget all of the recorded stages."""
+        self.stages.clear()
+
+    def summary(self):
+        """The statistics of every stage as a dictionary."""
+        return {
+            stage: stats.as_dict()
+            for stage, stats in sorted(self.stages.items())
+        }
+
+    def log_summary(self, logger=None):
+        """Write a one line summary per stage to ``logger``.
+
+        Parameters
+        ----------
+
+        logger : :class:`logging.Logger`, optional
+            Defaults to the logger of this module which is shown in the
+            ViTables logging window.
+
+        """
+        if logger is None:
+            logger = logging.getLogger(__name__)
+
+        if not self.stages:
+            logger.info("No stages profiled")
+
+        for stage, stats in sorted(self.stages.items()):
+            logger.info(
+                "{0:s}: {1:d} calls, mean {2:.2f} ms, "
+                "max {3:.2f} ms".format(
+                    stage, stats.count, 1000 *stats.total /stats.count,
+                    1000 *stats.maximum
+                )
+            )
+
+    def dump_json(self, path):
+        """Write :meth:`summary` to the JSON file ``path``."""
+        with open(path, "w") as fid:
+            json.dump(self.summary(), fid, indent=2, sort_keys=True)
+
+_setting = os.environ.get("VTIMSHOW_PROFILE", "")
+
+profiler = Profiler(enabled=_setting not in ("", "0"))
+"""The profiler shared by the plugin."""
+
+if _setting not in ("", "0", "1"):
+    atexit.register(profiler.dump_json, _setting)
@@ -38,7 +38,8 @@ class SetDims(QtGui.QDialog):
         Given a :class:`numpy.ndarray` compatible array, let the user
         decide which dimensions are the width, height, depth, and
         possibly RGB(A).  The given array must have a ``shape``
-        attribute analogous to the :class:`numpy.ndarray` attribute.
+        attribute analogous to the :class:`numpy.ndarray` attribute,
+        such as a :class:`lazy.LazyCube` that has not been read.
 
         Parameters
         ----------
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+__doc__="""Sliding window filters along the depth of a cube.
+
+The ``vtimshow.filters`` plugins reduce a (N,H,W) cube to one image.
+The filters here keep the depth instead: frame ``i`` of the result is a
+statistic of the ``k`` frames centred on frame ``i`` of the source, with
+the first and last frames repeated at the ends.  A
+:class:`SlidingWindow` is evaluated lazily, one frame at a time, and
+keeps the state of the last window so stepping to the next frame only
+folds in the frame entering the window and the one leaving it:
+
+* the moving mean keeps a running sum, so each frame costs the same
+  regardless of ``k``, and
+* the moving median, minimum, and maximum keep the window sorted along
+  the depth, so each frame costs one insertion and one removal instead
+  of sorting the full window again.
+
+"""
+import collections
+import threading
+
+import numpy
+
+STATISTICS = ("Mean", "Median", "Min", "Max")
+"""The statistics a :class:`SlidingWindow` can compute."""
+
+def replace_sorted(ordered, old, new):
+    """Swap one value in every column of a sorted window.
+
+    Parameters
+    ----------
+
+    ordered : :class:`numpy.ndarray`
+        The (k,...) window sorted along the first axis.
+    old : :class:`numpy.ndarray`
+        The frame leaving the window.  Each of its values must appear
+        in the matching column of ``ordered``.
+    new : :class:`numpy.ndarray`
+        The frame entering the window.
+
+    Returns
+    -------
+
+    ret : :class:`numpy.ndarray`
+        The updated window, still sorted along the first axis.
+
+    >>> ordered = numpy.array([[1, 5], [3, 6], [4, 9]])
+    >>> replace_sorted(ordered, numpy.array([3, 9]), numpy.array([0, 7]))
+    array([[0, 5],
+           [1, 6],
+           [4, 7]])
+
+    """
+    size = ordered.shape[0]
+    old = numpy.asarray(old)
+    new = numpy.asarray(new)
+    match = ordered == old
+    below = ordered < new
+    if ordered.dtype.kind == "f":
+        # NaN is sorted last and never equal to itself.
+        match |= numpy.isnan(ordered) & numpy.isnan(old)
+
+    # The position of the leaving value and the insertion point of the
+    # entering value once the leaving value is removed.
+    removed = match.argmax(axis=0)
+    inserted = below.sum(axis=0) -(old < new)
+    if ordered.dtype.kind == "f":
+        inserted = numpy.where(numpy.isnan(new), size -1, inserted)
+
+    rows = numpy.arange(size).reshape((size,) +(1,) *(ordered.ndim -1))
+    shifted = rows -(rows > inserted)
+    source = shifted +(shifted >= removed)
+    ret = numpy.take_along_axis(
+        ordered, numpy.minimum(source, size -1), axis=0
+    )
+    numpy.copyto(
+        ret, numpy.broadcast_to(new, ret.shape), where=rows == inserted
+    )
+    return ret
+
+class SlidingWindow:
+    """A lazily evaluated cube of sliding window statistics.
+
+    The window is indexed by frame and read in blocks like a
+    :class:`core.FrameSource`.  Reading frames in increasing order,
+    such as a playback or a block by block pass over the cube, updates
+    the state of the previous window.  Any other access rebuilds the
+    window from ``k`` frames of the source.
+
+    """
+
+    RESUM = 1024
+    """The number of updates after which the running sum is rebuilt to
+    bound the rounding errors of floating point data."""
+
+    def __init__(self, read, count, statistic, size):
+        """Prepare the window.
+
+        Parameters
+        ----------
+
+        read : callable
+            Called with ``start`` and ``stop`` to return those frames
+            of the source as a :class:`numpy.ndarray`.
+        count : int
+            The number of frames of the source.
+        statistic : string
+            One of :data:`STATISTICS`.
+        size : int
+            The number of frames ``k`` in the window.
+
+        """
+        if statistic not in STATISTICS:
+            raise ValueError("Unknown statistic {0!s}".format(statistic))
+        elif size < 1:
+            raise ValueError("The window must hold at least one frame")
+
+        self._read = read
+        self.count = count
+        self.statistic = statistic
+        self.size = size
+        self._position = None
+        self._frames = None
+        self._state = None
+        self._updates = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def __repr__(self):
+        return "SlidingWindow({0:s}, size={1:d})".format(
+            self.statistic, self.size
+        )
+
+    def _indexes(self, idx):
+        """The source frames in the window of frame ``idx``."""
+        first = idx -self.size //2
+        return [
+            min(max(j, 0), self.count -1)
+            for j in range(first, first +self.size)
+        ]
+
+    def _reset(self, idx, fetch):
+        """Build the window of frame ``idx`` from scratch."""
+        self._frames = collections.deque(
+            fetch(j) for j in self._indexes(idx)
+        )
+        if self.statistic == "Mean":
+            self._state = numpy.sum(
+                numpy.stack(self._frames), axis=0, dtype=numpy.float64
+            )
+        else:
+            self._state = numpy.sort(numpy.stack(self._frames), axis=0)
+
+        self._position = idx
+        self._updates = 0
+
+    def _advance(self, fetch):
+        """Slide the window forward by one frame."""
+        idx = self._position +1
+        new = fetch(self._indexes(idx)[-1])
+        old = self._frames.popleft()
+        self._frames.append(new)
+        if self.statistic != "Mean":
+            self._state = replace_sorted(self._state, old, new)
+        elif self._updates >= self.RESUM:
+            self._state = numpy.sum(
+                numpy.stack(self._frames), axis=0, dtype=numpy.float64
+            )
+            self._updates = 0
+        else:
+            self._state += new
+            self._state -= old
+            self._updates += 1
+
+        self._position = idx
+
+    def _value(self):
+        """The statistic of the current window."""
+        middle = self.size //2
+        if self.statistic == "Mean":
+            return self._state /self.size
+        elif self.statistic == "Min":
+            return self._state[0].copy()
+        elif self.statistic == "Max":
+            return self._state[-1].copy()
+        elif self.size %2 == 1:
+            return self._state[middle].copy()
+
+        ret = numpy.add(
+            self._state[middle -1], self._state[middle], dtype=numpy.float64
+        )
+        ret /= 2
+        return ret
+
+    def _at(self, idx, fetch):
+        """Move the window to frame ``idx`` and evaluate it."""
+        if self._position is not None \
+                and self._position < idx <= self._position +self.size:
+            while self._position < idx:
+                self._advance(fetch)
+        elif self._position != idx:
+            self._reset(idx, fetch)
+
+        return self._value()
+
+    def __getitem__(self, idx):
+        """Evaluate frame ``idx``."""
+        idx = range(self.count)[idx]
+        if not isinstance(idx, int):
+            raise TypeError("Use read to evaluate several frames")
+
+        def fetch(j):
+            return numpy.asarray(self._read(j, j +1))[0]
+
+        with self._lock:
+            return self._at(idx, fetch)
+
+    def read(self, start=0, stop=None):
+        """Evaluate frames ``start`` to ``stop``.
+
+        The source frames covering all of the windows are read at once.
+
+        Returns
+        -------
+
+        ret : :class:`numpy.ndarray`
+            The (stop -start,...) frames.
+
+        """
+        indexes = range(self.count)[start:stop]
+        if len(indexes) == 0:
+            frame = self[0]
+            return numpy.empty((0,) +frame.shape, dtype=frame.dtype)
+
+        low = self._indexes(indexes[0])[0]
+        high = self._indexes(indexes[-1])[-1] +1
+        block = numpy.asarray(self._read(low, high))
+
+        def fetch(j):
+            return block[j -low]
+
+        with self._lock:
+            return numpy.stack([self._at(idx, fetch) for idx in indexes])
+
+    def __array__(self, dtype=None):
+        ret = self.read()
+        return ret if dtype is None else ret.astype(dtype)
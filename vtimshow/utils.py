@@ -1,18 +1,136 @@
 #!/usr/bin/env python3
 __doc__="""A collection of utility functions."""
 
+import contextlib
 import logging
 import numpy
+import threading
+import time
 
-import vitables
+from .profiling import profiler
 
-def divide(A, B, rep=0.0):
+hdf5_lock = threading.RLock()
+"""The lock held around every call into the HDF5 library.
+
+The stock HDF5 builds are not thread safe and PyTables releases the GIL
+while it reads, so two threads must never be inside HDF5 at once, even
+on different nodes or files.  Every read, write, and open of a file by
+the plugin holds this lock.  It is reentrant so a locked read may call
+another.
+"""
+
+PRECISIONS = ("native", "float32", "float64")
+"""The valid compute precision policies."""
+
+def result_dtype(operation, *dtypes, precision="native", sources=None):
+    """Select the dtype to compute ``operation`` on ``dtypes``.
+
+    With ``precision`` set to 'float32' or 'float64', that dtype is
+    always used.  The 'native' policy picks the smallest dtype that is
+    correct.  A difference of integers is widened to the next larger
+    signed integer so it cannot wrap around, and a quotient uses
+    ``float32`` unless an input needs ``float64`` to be exact.  The
+    widened difference of 16-bit channels still fits in ``float32``,
+    so a quotient of it is judged by the ``sources`` of the operands.
+
+    >>> result_dtype("subtract", "uint16", "uint16")
+    dtype('int32')
+    >>> result_dtype("divide", "uint16", "uint16")
+    dtype('float32')
+    >>> result_dtype("divide", "int32", "uint16")
+    dtype('float64')
+    >>> result_dtype("divide", "int32", "uint16",
+    ...              sources=("uint16", "uint16", "uint16"))
+    dtype('float32')
+    >>> result_dtype("subtract", "uint16", "uint16", precision="float32")
+    dtype('float32')
+
+    Parameters
+    ----------
+
+    operation : string
+        Either 'subtract' or 'divide'.
+    dtypes : :class:`numpy.dtype`
+        The dtypes of the operands.
+    precision : string, optional
+        One of :data:`PRECISIONS`.
+    sources : sequence, optional
+        The dtypes of the channels the operands were computed from,
+        such as R, G, and B for :math:`(R - G) / B`.  They replace
+        ``dtypes`` when choosing the dtype of a quotient.
+
+    Returns
+    -------
+
+    ret : :class:`numpy.dtype`
+        The dtype of the result.
+
+    Raises
+    ------
+
+    ValueError
+        If ``precision`` or ``operation`` is unknown.
+
+    """
+    if precision not in PRECISIONS:
+        raise ValueError("Unknown precision {0!s}".format(precision))
+
+    if precision != "native":
+        return numpy.dtype(precision)
+
+    if operation == "divide" and sources is not None:
+        dtypes = sources
+
+    dtypes = [numpy.dtype(dtype) for dtype in dtypes]
+    if operation == "divide":
+        return numpy.result_type(numpy.float32, *dtypes)
+    elif operation != "subtract":
+        raise ValueError("Unknown operation {0!s}".format(operation))
+
+    widened = []
+    for dtype in dtypes:
+        if dtype.kind not in "iu":
+            widened.append(dtype)
+        elif dtype.itemsize >= 8:
+            widened.append(numpy.dtype(numpy.float64))
+        else:
+            widened.append(numpy.dtype("i{0:d}".format(2 *dtype.itemsize)))
+
+    return numpy.result_type(*widened)
+
+def subtract(A, B, precision="native"):
+    """Compute :math:`A - B` without integer wrap around.
+
+    Parameters
+    ----------
+
+    A : :class:`numpy.ndarray`
+        The minuend.
+    B : :class:`numpy.ndarray`
+        The subtrahend.
+    precision : string, optional
+        One of :data:`PRECISIONS` passed to :func:`result_dtype`.
+
+    Returns
+    -------
+
+    C : :class:`numpy.ndarray`
+        ``A - B`` in the dtype chosen by :func:`result_dtype`.
+
+    """
+    dtype = result_dtype(
+        "subtract", A.dtype, B.dtype, precision=precision
+    )
+    return numpy.subtract(A, B, dtype=dtype)
+
+def divide(A, B, rep=0.0, precision="native", sources=None):
     """Compute :math:`A / B` silencing warnings.
 
     Given two :class:`numpy.ndarray`, compute the element wise division
     suppressing divide by zero warnings and invalid entries.  All
     resulting NaNs, Infs, and places where ``B`` is essentially 0 are
-    replaced by ``rep``.
+    replaced by ``rep``.  The quotient is computed in the dtype chosen
+    by :func:`result_dtype` for ``precision``.
 
     Parameters
     ----------
@@ -23,6 +141,11 @@ def divide(A, B, rep=0.0):
         The denominator.
     rep : scalar, optional
         The value to replace bad values.
+    precision : string, optional
+        One of :data:`PRECISIONS`.
+    sources : sequence, optional
+        The dtypes of the channels ``A`` and ``B`` were computed from,
+        passed to :func:`result_dtype`.
 
     Returns
     -------
@@ -30,15 +153,121 @@ def divide(A, B, rep=0.0):
     C : :class:`numpy.ndarray`
         ``A / B`` with bad values set to ``rep``.
 
+    """
+    dtype = result_dtype(
+        "divide", A.dtype, B.dtype, precision=precision, sources=sources
+    )
+    with numpy.errstate(invalid="ignore", divide="ignore"):
+        C = numpy.true_divide(A, B, dtype=dtype)
+
+    C[numpy.broadcast_to(numpy.isclose(B, 0), C.shape)] = rep
+    C[~numpy.isfinite(C)] = rep
+    return C
+
+def reciprocal(B, dtype, rep=0.0):
+    """Compute :math:`1 / B` for repeated division by ``B``.
+
+    The places where ``B`` is essentially 0 are set to ``rep``, so with
+    the default ``A *reciprocal(B, dtype)`` matches :func:`divide` for
+    finite ``A`` up to rounding.
+
+    Parameters
+    ----------
+
+    B : :class:`numpy.ndarray`
+        The denominator.
+    dtype : :class:`numpy.dtype`
+        The dtype of the quotient from :func:`result_dtype`.
+    rep : scalar, optional
+        The value to replace bad values.
+
+    Returns
+    -------
+
+    C : :class:`numpy.ndarray`
+        ``1 / B`` with bad values set to ``rep``.
+
     """
     with numpy.errstate(invalid="ignore", divide="ignore"):
-        C = A / B
+        C = numpy.true_divide(1, B, dtype=dtype)
 
     C[numpy.isclose(B, 0)] = rep
-    C[numpy.isnan(C)] = rep
-    C[numpy.isinf(C)] = rep
+    C[~numpy.isfinite(C)] = rep
     return C
 
+def translate(context, text, disambiguation=None):
+    """Translate a message with ViTables when it is available.
+
+    The filter plugins and the compute core report errors through this
+    so they can be imported by the headless tools, which run without
+    ViTables.  The message is then returned as is.
+
+    Parameters
+    ----------
+
+    context : string
+        The translation context, usually :data:`plugin_class`.
+    text : string
+        The message.
+    disambiguation : string, optional
+        The comment identifying the use of the message.
+
+    """
+    try:
+        from vitables.vtapp import translate as _translate
+    except ImportError:
+        return text
+
+    return _translate(context, text, disambiguation)
+
+@contextlib.contextmanager
+def timed(timings, stage):
+    """Record the duration of a block in ``timings[stage]``.
+
+    The duration is also passed to :data:`profiling.profiler` which
+    keeps the statistics of every stage when it is enabled.
+
+    Parameters
+    ----------
+
+    timings : dict
+        The dictionary holding the last duration of each stage.
+    stage : string
+        The name of the timed stage.
+
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = time.perf_counter() -start
+        profiler.record(stage, timings[stage])
+
+def add_profiling_actions(menu):
+    """Add actions to toggle and report the profiler to ``menu``.
+
+    Parameters
+    ----------
+
+    menu : :class:`PyQt4.QtGui.QMenu`
+        The menu of a :class:`pyqtgraph.ImageView`.
+
+    """
+    from PyQt4 import QtGui
+    import vitables
+
+    action = QtGui.QAction("Profile stages", menu)
+    action.setCheckable(True)
+    action.setChecked(profiler.enabled)
+    vitables.utils.addToMenu(menu, action)
+    action.toggled.connect(
+        lambda checked: setattr(profiler, "enabled", checked)
+    )
+
+    action = QtGui.QAction("Log stage profile", menu)
+    vitables.utils.addToMenu(menu, action)
+    action.triggered.connect(lambda: profiler.log_summary())
+
 def setup_logger(name, stderr=False):
     """Add the GUI's logging window as a stream handler.
 
@@ -46,8 +275,9 @@ def setup_logger(name, stderr=False):
     ViTables.  The logging window in the GUI is a stream handler for the
     ViTables logger *only*.  This method will add the logging window in
     the GUI as a stream handler for the named logger.  The method checks
-    to see if ViTables is an active application.  If it is not, nothing
-    is done.
+    to see if ViTables is an active application.  If it is not, or if
+    ViTables is not installed as for the headless tools, nothing is
+    done.
 
     Parameters
     ----------
@@ -58,6 +288,11 @@ def setup_logger(name, stderr=False):
         Add the standard error as a stream handler too.
 
     """
+    try:
+        import vitables
+    except ImportError:
+        return
+
     logger = logging.getLogger(name)
     app = vitables.utils.getApp()
     if app is not None:
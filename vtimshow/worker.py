@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+__doc__="""Run filter plugins in a worker process.
+
+A filter plugin is third party code that may run for minutes, hang, or
+crash.  A thread running it cannot be stopped, so a stale computation
+would keep a core and the cube busy after the user has moved on.
+:func:`run_filter` instead runs the plugin in a child process that is
+terminated as soon as the computation is cancelled or times out.  The
+cube is copied once into a :class:`multiprocessing.shared_memory.
+SharedMemory` block that the child wraps without copying, and the
+result is streamed back over a pipe straight into its final array.
+The copy is registered with the :data:`memory.budget` while the child
+runs.  The child is started from a forkserver, or spawned where that is
+not available, rather than forked.  A forked child would inherit the
+Qt event loop, the open HDF5 files, and any lock held by another thread
+of the plugin at the time.  Lazy filters read the cube in blocks on the
+calling thread instead, and :func:`run_lazy_filter` stops them through
+the ``cancelled`` hook they are passed.
+
+"""
+import functools
+import logging
+import multiprocessing
+import pickle
+import time
+
+from multiprocessing import shared_memory
+
+import numpy
+
+from .memory import budget
+from .preferences import Preferences
+
+POLL = 0.05
+"""The seconds between checks for cancellation."""
+
+def _context():
+    """The :mod:`multiprocessing` context used to start the workers."""
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+
+    return multiprocessing.get_context("spawn")
+
+def _load_timeout():
+    """Read the time limit of a filter from the preferences."""
+    try:
+        seconds = float(Preferences()["Filters"]["Timeout"])
+    except ValueError:
+        seconds = 0.0
+
+    return seconds if seconds > 0 else None
+
+TIMEOUT = _load_timeout()
+"""The seconds a filter may run or ``None`` for no limit."""
+
+def _child(conn, compute, name, shape, dtype):
+    """Apply ``compute`` to the shared cube and send back the result.
+
+    Every exception of the plugin is reported to the parent because
+    the child has no other way to tell it what went wrong.
+
+    """
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        array = numpy.ndarray(shape, dtype=dtype, buffer=block.buf)
+        try:
+            # Copy so nothing refers to the block when it is closed.
+            result = compute(array)
+            result = None if result is None else numpy.array(result)
+        except Exception as err:
+            conn.send(("error", "{0:s}: {1!s}".format(
+                type(err).__name__, err
+            )))
+            return
+        finally:
+            del array
+
+        if result is None:
+            conn.send(("done", None))
+            return
+
+        conn.send(("done", (result.shape, result.dtype.str)))
+        conn.send_bytes(result.reshape(-1).view(numpy.uint8))
+    finally:
+        conn.close()
+        block.close()
+
+def _stop(process):
+    """Terminate ``process`` and wait for it."""
+    process.terminate()
+    process.join()
+
+def run_filter(name, compute, array, cancelled=None, timeout=TIMEOUT):
+    """Apply a filter plugin to a (N,H,W) array in a worker process.
+
+    Any exception raised by the plugin, a crash of the worker, or a
+    timeout is reported to the logger as a warning and ``None`` is
+    returned like :func:`core.apply_filter`.  The ``compute`` is
+    pickled by reference to the worker, so it must be importable from
+    the module of the plugin.  If it cannot be sent to a worker, the
+    filter is applied on the calling thread.
+
+    Parameters
+    ----------
+
+    name : string
+        The name of the filter for the log.
+    compute : callable
+        The ``compute`` method of the plugin.
+    array : :class:`numpy.ndarray`
+        The 3D image array to pass to the filter.
+    cancelled : callable, optional
+        Checked while the filter runs.  The worker is terminated and
+        :class:`core.Cancelled` raised once it returns ``True``.
+    timeout : float, optional
+        The seconds after which the worker is terminated.  It defaults
+        to the 'Timeout' in the 'Filters' section of the
+        :class:`preferences.Preferences`.
+
+    Returns
+    -------
+
+    ret : :class:`numpy.ndarray` or ``None``
+        The filtered array or ``None``
+
+    """
+    from .core import Cancelled, apply_filter
+    logger = logging.getLogger(__name__ +".run_filter")
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    key = (id(block), "shared")
+    budget.register(key, block.size)
+    try:
+        shared = numpy.ndarray(
+            array.shape, dtype=array.dtype, buffer=block.buf
+        )
+        shared[...] = array
+        del shared
+
+        context = _context()
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(
+            target=_child, daemon=True, args=(
+                sender, compute, block.name, array.shape, array.dtype.str
+            )
+        )
+        try:
+            process.start()
+        except (pickle.PicklingError, AttributeError, TypeError) as err:
+            logger.debug("Applying {0:s} in this thread.  {1!s}".format(
+                name, err
+            ))
+            return apply_filter(name, compute, array)
+        finally:
+            sender.close()
+
+        start = time.perf_counter()
+        while not receiver.poll(POLL):
+            if cancelled is not None and cancelled():
+                logger.debug("Cancelling {0:s}".format(name))
+                _stop(process)
+                raise Cancelled()
+            elif timeout is not None \
+                    and time.perf_counter() -start > timeout:
+                _stop(process)
+                logger.warning("{0:s} timed out after {1:g} s".format(
+                    name, timeout
+                ))
+                return None
+
+        try:
+            status, value = receiver.recv()
+            if status == "error":
+                logger.warning("Error applying {0:s}.  Message {1!s}".format(
+                    name, value
+                ))
+                return None
+            elif value is None:
+                return None
+
+            shape, dtype = value
+            ret = numpy.empty(shape, dtype=dtype)
+            receiver.recv_bytes_into(ret.reshape(-1).view(numpy.uint8))
+        except EOFError:
+            process.join()
+            logger.warning("{0:s} stopped with exit code {1!s}".format(
+                name, process.exitcode
+            ))
+            return None
+        finally:
+            receiver.close()
+
+        process.join()
+        return ret
+    finally:
+        budget.unregister(key)
+        block.close()
+        block.unlink()
+
+def run_lazy_filter(name, compute, array, cancelled=None,
+                    timeout=TIMEOUT):
+    """Apply a lazy filter plugin on the calling thread.
+
+    A lazy ``compute`` reads the cube in blocks itself, so it is not
+    copied to a worker process.  It is called as ``compute(array,
+    cancelled=check)`` and must raise :class:`core.Cancelled` once
+    ``check()`` returns ``True``, which happens when ``cancelled`` does
+    or the time is up.
+
+    Parameters
+    ----------
+
+    name : string
+        The name of the filter for the log.
+    compute : callable
+        The ``compute`` method of the plugin.
+    array : array_like
+        The (N,H,W) cube, such as a :class:`lazy.LazyCube`.
+    cancelled : callable, optional
+        Checked by the filter between blocks.  :class:`core.Cancelled`
+        is raised once it returns ``True``.
+    timeout : float, optional
+        The seconds after which the filter is stopped like in
+        :func:`run_filter`.
+
+    Returns
+    -------
+
+    ret : :class:`numpy.ndarray` or ``None``
+        The filtered array or ``None``
+
+    """
+    from .core import Cancelled, apply_filter
+    logger = logging.getLogger(__name__ +".run_lazy_filter")
+    start = time.perf_counter()
+
+    def check():
+        """Check if the filter should stop."""
+        if cancelled is not None and cancelled():
+            return True
+
+        return timeout is not None and time.perf_counter() -start > timeout
+
+    try:
+        return apply_filter(
+            name, functools.partial(compute, cancelled=check), array
+        )
+    except Cancelled:
+        if cancelled is not None and cancelled():
+            logger.debug("Cancelling {0:s}".format(name))
+            raise
+
+        logger.warning("{0:s} timed out after {1:g} s".format(
+            name, timeout
+        ))
+        return None